@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding:UTF-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Ingest MUSC output files into chunked columnar stores (see atlas1d.ingest),
+which are then read by atlas runs instead of the files themselves.
+Files are given directly or as the simulations of an atlas config file.
+Stores are written next to the files, or in $ATLAS1D_STORE_DIR if defined.
+"""
+
+import os
+import argparse
+import importlib.util
+
+import warnings
+warnings.filterwarnings("ignore")
+import logging
+logger = logging.getLogger(__name__)
+
+import atlas1d
+import atlas1d.ingest as ingest
+
+if __name__ == '__main__':
+
+    # Definition of arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ncfiles", help="MUSC output files", nargs='*')
+    parser.add_argument("-config", help="config file, whose simulations are ingested", type=str, default=None)
+    parser.add_argument("--variables", help="variables to keep (default: those used by atlas)", nargs='+', default=None)
+    parser.add_argument("--force", help="Ingest again files whose store is up to date", dest='force', action="store_true")
+    parser.add_argument("--debug", help="Active debug mode", dest='debug', action="store_true")
+
+    # Getting arguments
+    args = parser.parse_args()
+
+    # Activate debug mode
+    if args.debug:
+        logging.basicConfig(format='%(asctime)s - %(name)30s - %(levelname)s - %(message)s', level=logging.DEBUG)
+    else:
+        logging.basicConfig(format='%(asctime)s - %(name)30s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    ncfiles = list(args.ncfiles)
+
+    if args.config is not None:
+        if not(os.path.isfile(args.config)):
+            raise ValueError("The configuration file {0} does not exist".format(args.config))
+        spec = importlib.util.spec_from_file_location('atlas_config', args.config)
+        CM = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(CM)
+        for case in CM.simulations:
+            for subcase in CM.simulations[case]:
+                for sim in CM.simulations[case][subcase]:
+                    if sim.is_valid() and not(sim.ncfile in ncfiles):
+                        ncfiles.append(sim.ncfile)
+                    elif not(sim.is_valid()):
+                        logger.warning('Simulation {0} has no output file'.format(sim.id))
+
+    if len(ncfiles) == 0:
+        parser.error('no file to ingest: give files or a config file')
+
+    for ncfile in ncfiles:
+        ingest.ingest(ncfile,variables=args.variables,lforce=args.force)
@@ -18,6 +18,7 @@ from collections import OrderedDict
 import atlas1d
 from atlas1d.Simulation import Simulation
 from atlas1d.MultiAtlas import MultiAtlas
+import atlas1d.instrument as instrument
 
 if __name__ == '__main__':
 
@@ -26,6 +27,10 @@ if __name__ == '__main__':
     parser.add_argument("-config", help="config file", type=str, required=True)
     parser.add_argument("--pdf", help="PDF files for each case/subcase is produced", dest='pdf', action="store_true")
     parser.add_argument("--no-run", help="No run of the atlas. Suppose it has already been run", dest='norun', action="store_true")
+    parser.add_argument("--jobs", help="Number of processes used to run the atlas of the different cases/subcases (0 for all cores)", dest='jobs', type=int, default=1)
+    parser.add_argument("--diag-jobs", help="Number of processes used to render the diagnostics of each atlas (0 for all cores)", dest='diag_jobs', type=int, default=1)
+    parser.add_argument("--force", help="Render again all diagnostics, even those whose inputs did not change", dest='force', action="store_true")
+    parser.add_argument("--trace-memory", help="Measure the peak memory allocated by each diagnostic in the run report (slower)", dest='trace_memory', action="store_true")
     parser.add_argument("-v", help="Active verbosity", dest='verbose', action="store_true")
     parser.add_argument("--debug", help="Active debug mode", dest='debug', action="store_true")
 
@@ -35,6 +40,10 @@ if __name__ == '__main__':
 
     lpdf = args.pdf
     lrun = not(args.norun)
+    jobs = args.jobs
+    diag_jobs = args.diag_jobs
+    lforce = args.force
+    ltrace_memory = args.trace_memory
     lverbose = args.verbose
     ldebug = args.debug
 
@@ -78,7 +87,9 @@ if __name__ == '__main__':
     #atlas.run(cases=['GABLS1',])
     # Run atlas for all cases
     if lrun:
-        atlas.run()
+        if ltrace_memory:
+            instrument.trace_memory()
+        atlas.run(jobs=jobs,diag_jobs=diag_jobs,lforce=lforce)
 
     # Prepare pdf files assembling atlas diagnostics
     if lpdf:
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding:UTF-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Precompute the derived variables of the references of the default atlas
+and store them in a persistent cache (see atlas1d.derivedcache).
+By default, the shared cache in $SCM_REFERENCES is filled.
+"""
+
+import os
+import glob
+import argparse
+import importlib
+
+import warnings
+warnings.filterwarnings("ignore")
+import logging
+logger = logging.getLogger(__name__)
+
+import atlas1d
+import atlas1d.datacache as datacache
+import atlas1d.derivedcache as derivedcache
+import atlas1d.new_variables as new_variables
+
+from variables_info import var2compute
+
+if __name__ == '__main__':
+
+    # Definition of arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache-dir", help="cache directory to fill (default: shared cache in $SCM_REFERENCES)", dest='cachedir', type=str, default=None)
+    parser.add_argument("--cases", help="cases whose references are considered (default: all default atlas)", nargs='+', default=None)
+    parser.add_argument("-v", help="Active verbosity", dest='verbose', action="store_true")
+    parser.add_argument("--debug", help="Active debug mode", dest='debug', action="store_true")
+
+    # Getting arguments
+    args = parser.parse_args()
+
+    # Activate debug mode
+    if args.debug:
+        logging.basicConfig(format='%(asctime)s - %(name)30s - %(levelname)s - %(message)s', level=logging.DEBUG)
+    else:
+        logging.basicConfig(format='%(asctime)s - %(name)30s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    cachedir = args.cachedir
+    if cachedir is None:
+        cachedir = derivedcache.shared_dir()
+    if cachedir is None:
+        raise ValueError("SCM_REFERENCES is not defined: give the cache directory with --cache-dir")
+
+    # Entries are only written in cachedir
+    cache = derivedcache.DerivedCache(cachedir=cachedir)
+
+    if args.cases is None:
+        configs = sorted([os.path.basename(f)[:-3] for f in glob.glob(os.path.join(atlas1d._dir_atlas_config_default, 'atlas_*.py'))])
+    else:
+        configs = ['atlas_{0}'.format(case) for case in args.cases]
+
+    ncfiles = []
+    for configname in configs:
+        try:
+            config = importlib.import_module(configname)
+        except Exception as e:
+            logger.warning('Cannot import {0}: {1}'.format(configname,e))
+            continue
+        # Some cases have no reference
+        for ref in getattr(config,'references',[]):
+            if ref.is_valid() and not(ref.ncfile in ncfiles):
+                ncfiles.append(ref.ncfile)
+            elif args.verbose and not(ref.is_valid()):
+                logger.info('{0}: file {1} not found'.format(ref.id,ref.ncfile))
+
+    logger.info('Computing derived variables of {0} reference files in {1}'.format(len(ncfiles),cachedir))
+
+    for ncfile in ncfiles:
+        ds = datacache.open_dataset(ncfile)
+        variables = [var for var in var2compute if cache.get(ncfile,var,ds) is None]
+        derived = new_variables.get_derived(ds,variables)
+        for var, tmp in derived.items():
+            cache.put(ncfile,var,tmp)
+        if args.verbose:
+            logger.info('{0}: {1} variables computed, {2} already in cache'.format(ncfile,len(derived),len(var2compute)-len(variables)))
+        datacache.evict(ncfile)
+
+    logger.info('Cache {0}: {1} entries'.format(cachedir,len(cache.entries())))
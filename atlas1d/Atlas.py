@@ -5,6 +5,7 @@
 # http://www.cecill.info
 
 import os
+import time
 
 import logging
 logger = logging.getLogger(__name__)
@@ -13,6 +14,10 @@ from collections import OrderedDict
 
 import atlas1d
 from atlas1d.DiagGroup import DiagGroup
+import atlas1d.workers as workers
+from atlas1d.manifest import Manifest
+import atlas1d.instrument as instrument
+import atlas1d.readplan as readplan
 
 class Atlas:
 
@@ -69,6 +74,12 @@ class Atlas:
         if not(os.path.exists(self.pdf_dir)):
             os.makedirs(self.pdf_dir)
 
+        # Build manifest of the atlas
+        self.manifest_file = '{0}/.manifest.json'.format(self.atlas_dir)
+
+        # Timings, I/O and memory of the last run (see atlas1d.instrument)
+        self.report_file = '{0}/run_report.json'.format(self.atlas_dir)
+
         # pdf filename
         self.pdfname = '{0}_{1}.pdf'.format(self.case,self.subcase)
 
@@ -135,17 +146,58 @@ class Atlas:
 
         return True
 
-    def run(self,printOutput=False,printError=False,lcompute=True):
+    def run(self,printOutput=False,printError=False,lcompute=True,jobs=1,lforce=False):
+        """
+        Run all diagnostic groups of the atlas.
+        Only diagnostics whose inputs changed since the last run are rendered, unless lforce is True.
+        """
 
         if not(self.is_valid()):
             raise ValueError('Atlas not valid')
 
+        t0 = time.perf_counter()
+        reads = OrderedDict()
         for group in self.grouplist:
-            if lcompute:
-                logger.info('Running diagnostic group {0} for {1} atlas'.format(group.name,self.name))
+            for diag in group.diaglist:
+                diag.report = None
+
+        if lcompute:
+            manifest = Manifest(self.manifest_file)
+            if lforce:
+                manifest.entries.clear()
+            store = self.read(manifest=manifest,reports=reads)
+        else:
+            manifest = None
+            store = None
+
+        try:
+            if lcompute and not(workers.get_jobs(jobs) == 1):
+                # Diagnostics of all groups are dispatched to the pool of rendering processes
+                # before waiting for the first of them
+                pool = workers.get_pool(jobs)
+                shared = workers.SharedStore(store)
+                try:
+                    futures = OrderedDict()
+                    for group in self.grouplist:
+                        logger.info('Submitting diagnostic group {0} for {1} atlas'.format(group.name,self.name))
+                        futures[group.name] = group.submit(pool,self.datasets,root_dir=self.diag_dir,manifest=manifest,store=shared)
+                    for group in self.grouplist:
+                        group.collect(futures[group.name],manifest=manifest)
+                        logger.info('Diagnostic group {0} done for {1} atlas'.format(group.name,self.name))
+                finally:
+                    shared.close()
             else:
-                logger.info('Initialize diagnostic group {0} for {1} atlas'.format(group.name,self.name))
-            group.run(self.datasets,root_dir=self.diag_dir,lcompute=lcompute)
+                for group in self.grouplist:
+                    if lcompute:
+                        logger.info('Running diagnostic group {0} for {1} atlas'.format(group.name,self.name))
+                    else:
+                        logger.info('Initialize diagnostic group {0} for {1} atlas'.format(group.name,self.name))
+                    group.run(self.datasets,root_dir=self.diag_dir,lcompute=lcompute,manifest=manifest,store=store)
+        finally:
+            # Keep track of what has been rendered, even if the run is interrupted
+            if manifest is not None:
+                manifest.save()
+                self.save_report(time.perf_counter()-t0,workers.get_jobs(jobs),reads)
 
         # synthesis of output
         if printOutput:
@@ -155,6 +207,42 @@ class Atlas:
         if printError:
             self.printError()
 
+    def read(self,manifest=None,reports=None):
+        """
+        Read once for all the data needed by the diagnostics to be rendered.
+        Return the in-memory datasets (see atlas1d.readplan).
+        Measures of the reading of each dataset are added to reports if given.
+        """
+
+        diaglist = []
+        for group in self.grouplist:
+            diaglist.extend(group.outdated(manifest,self.datasets))
+
+        if len(diaglist) == 0:
+            return OrderedDict()
+
+        logger.info('Reading data for {0} diagnostics of {1} atlas'.format(len(diaglist),self.name))
+
+        # Reference datasets do not change: their derived variables are kept from one run to the other
+        return readplan.load(self.datasets,readplan.plan(diaglist,self.datasets),reports=reports,
+                             cached=[ref.name for ref in self.references])
+
+    def save_report(self,wall,jobs,reads):
+        """
+        Write the run report of the atlas, with the measures of the diagnostics rendered by the last run
+        """
+
+        diagnostics = OrderedDict()
+        nuptodate = 0
+        for group in self.grouplist:
+            for diag in group.diaglist:
+                if diag.report is None:
+                    nuptodate += 1
+                else:
+                    diagnostics[group.key(diag)] = diag.report
+
+        instrument.save_report(instrument.run_report(self.name,wall,jobs,reads,diagnostics,nuptodate),self.report_file)
+
     def topdf(self,pdfname=None):
 
         from pylatex import Document, Figure, SubFigure, NoEscape, Command,\
@@ -278,6 +366,11 @@ class Atlas:
 
         f.close()
 
+        # Summary of the last run
+        report = instrument.load_report(self.report_file)
+        if report is not None:
+            instrument.report2html(report,'{0}/report.html'.format(self.html_dir))
+
 
 
         
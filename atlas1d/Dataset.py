@@ -23,7 +23,7 @@ class Dataset:
                  case=None,subcase=None,
                  ncfile=None,comment=None,
                  coefs={},varnames={},
-                 line=None):
+                 line=None,backend=None):
 
         if name  is None or\
            case  is None or subcase    is None:
@@ -39,6 +39,9 @@ class Dataset:
         self.varnames = varnames
         self.coefs = coefs
 
+        # Backend reading ncfile (see atlas1d.datacache), the default one if None
+        self.backend = backend
+
         if line is None:
             self.line = _lines.pop()
         else:
@@ -56,6 +59,8 @@ class Dataset:
         print('Comment:', self.comment)
         print('varnames:', self.varnames)
         print('coefs:', self.coefs)
+        if self.backend is not None:
+            print('backend:', self.backend)
         print("line for plots: '{0}'".format(self.line))
 
     def add2known(self,overwrite=False):
@@ -13,6 +13,8 @@ from collections import OrderedDict
 
 import atlas1d
 from atlas1d.Diagnostic import Diagnostic
+import atlas1d.workers as workers
+import atlas1d.instrument as instrument
 
 class DiagGroup:
 
@@ -79,7 +81,118 @@ class DiagGroup:
         for diag in self.diaglist:
             diag.printError()
 
-    def run(self,datasets,root_dir=None,lcompute=True):
+    def run(self,datasets,root_dir=None,lcompute=True,jobs=1,manifest=None,store=None):
+        """
+        Run all diagnostics of the group.
+        If jobs > 1, diagnostics are rendered by a pool of jobs processes (all available cores if jobs <= 0).
+        If a manifest is given, only diagnostics whose fingerprint changed are rendered.
+        If a store of in-memory datasets is given (see atlas1d.readplan), data are taken from it.
+        """
+
+        if lcompute and not(workers.get_jobs(jobs) == 1):
+            shared = None if store is None else workers.SharedStore(store)
+            try:
+                futures = self.submit(workers.get_pool(jobs),datasets,root_dir=root_dir,manifest=manifest,store=shared)
+                self.collect(futures,manifest=manifest)
+            finally:
+                if shared is not None:
+                    shared.close()
+            return
+
+        loc_dir = self._prepare(datasets,root_dir)
+
+        if lcompute:
+            diaglist = self.outdated(manifest,self.datasets,lverbose=True)
+        else:
+            diaglist = self.diaglist
+
+        for diag in diaglist:
+            if lcompute:
+                diag.output, diag.error, diag.report = _run_diag(diag,self.datasets,loc_dir,store)
+                self._record(diag,manifest)
+            else:
+                diag.run(self.datasets,root_dir=loc_dir,lcompute=lcompute,store=store)
+
+    def key(self,diag):
+        """
+        Key of diag in the atlas manifest
+        """
+
+        return '{0}/{1}/{2}'.format(self.name,diag.diag_type,diag.variable)
+
+    def outdated(self,manifest,datasets,lverbose=False):
+        """
+        List of diagnostics to be rendered. The output and error of the other ones
+        are taken from manifest.
+        """
+
+        if manifest is None:
+            return self.diaglist
+
+        diaglist = []
+        for diag in self.diaglist:
+            key = self.key(diag)
+            fprint = diag.fingerprint(datasets)
+            if manifest.is_uptodate(key,fprint):
+                diag.output, diag.error = manifest.get(key)
+            else:
+                diaglist.append(diag)
+
+        if lverbose:
+            logger.info('{0}/{1} diagnostics of group {2} to be rendered'.format(len(diaglist),len(self.diaglist),self.name))
+
+        return diaglist
+
+    def submit(self,pool,datasets,root_dir=None,manifest=None,store=None):
+        """
+        Dispatch the diagnostics of the group to be rendered to pool.
+        Data are taken from store if given, shared with the processes of pool (see atlas1d.workers.SharedStore).
+        Return the list of (diagnostic, future).
+        """
+
+        loc_dir = self._prepare(datasets,root_dir)
+
+        loglevel = logging.getLogger().getEffectiveLevel()
+
+        futures = []
+        for diag in self.outdated(manifest,self.datasets,lverbose=True):
+            futures.append((diag,pool.submit(workers.run_captured,_run_diag,loglevel,diag,self.datasets,loc_dir,store)))
+
+        return futures
+
+    def collect(self,futures,manifest=None):
+        """
+        Wait for the diagnostics dispatched by submit and get back their output and error
+        """
+
+        failed = []
+        for diag, future in futures:
+            try:
+                result, records, error = future.result()
+            except Exception as e: # e.g., the worker died
+                result, records, error = None, [], '{0}: {1}'.format(type(e).__name__,e)
+
+            workers.replay(records)
+
+            if error is None:
+                diag.output, diag.error, diag.report = result
+                self._record(diag,manifest)
+            else:
+                logger.error('Diagnostic {0}/{1} of group {2} failed'.format(diag.diag_type,diag.variable,self.name))
+                logger.error(error)
+                failed.append(diag.variable)
+                if manifest is not None:
+                    manifest.remove(self.key(diag))
+
+        if len(failed) > 0:
+            raise RuntimeError('Diagnostics of group {0} failed for variables: {1}'.format(self.name,', '.join(failed)))
+
+    def _record(self,diag,manifest):
+
+        if manifest is not None:
+            manifest.update(self.key(diag),diag.fingerprint(self.datasets),diag.output,diag.error)
+
+    def _prepare(self,datasets,root_dir):
 
         if root_dir is None:
             logger.error('root_dir is None for DiagGroup {0}'.format(self.name))
@@ -92,8 +205,7 @@ class DiagGroup:
         # Update datasets of the present DiagGroup object
         self.datasets = datasets
 
-        for diag in self.diaglist:
-            diag.run(self.datasets,root_dir=loc_dir,lcompute=lcompute)
+        return loc_dir
 
     def tohtml(self,index=None,root_dir=None):
 
@@ -159,3 +271,12 @@ class DiagGroup:
 
         f.close()
 
+def _run_diag(diag,datasets,root_dir,store):
+    """
+    Run diag, possibly in a rendering process, and send back its output, error and measures
+    """
+
+    with instrument.Recorder() as recorder:
+        diag.run(datasets,root_dir=root_dir,store=store)
+
+    return diag.output, diag.error, recorder.report(diag.error)
@@ -5,7 +5,6 @@
 # http://www.cecill.info
 
 import os
-import shutil
 
 import logging
 logger = logging.getLogger(__name__)
@@ -14,11 +13,9 @@ from collections import OrderedDict
 
 import json
 
-from matplotlib import cm # for colormaps
-
 import atlas1d
-import atlas1d.plotMUSC as plotMUSC
-from atlas1d.new_variables import compute
+import atlas1d.manifest as manifest
+import atlas1d.instrument as instrument
 
 from variables_info import variables_info, var2compute
 
@@ -54,6 +51,9 @@ class Diagnostic:
         # Error
         self.error = {}
 
+        # Measures of the last rendering (see atlas1d.instrument)
+        self.report = None
+
     def set_type(self,diag_type):
 
         if diag_type in know_diagnostics:
@@ -70,10 +70,12 @@ class Diagnostic:
         print('Diagnostic type: {0} ({1})'.format(self.diag_type,_diag_names[self.diag_type]))
         print('Diagnostic variable:', self.variable)
         print('Diagnostic plot details:')
-        for att in ['tmin','tmax','dtlabel','xname','ymin','ymax','yname','levunits','levels','extend','cmap']: 
+        for att in ['tmin','tmax','dtlabel','xname','ymin','ymax','yname','levunits','levels','extend','cmap','talign']: 
             if att in self.plot_details.keys():
                 if att == 'cmap':
-                    print(' '*5, '{0}:'.format(att), self.plot_details[att].name)
+                    # Colormaps may be given by name or as matplotlib colormaps
+                    cmap = self.plot_details[att]
+                    print(' '*5, '{0}:'.format(att), getattr(cmap,'name',cmap))
                 else:
                     print(' '*5, '{0}:'.format(att), self.plot_details[att])
 
@@ -97,7 +99,20 @@ class Diagnostic:
             print('Diagnostic {0}/{1}, error with the following datasets:'.format(self.diag_type,self.variable))
             print([key for key in self.error.keys()])
 
-    def run(self,datasets,root_dir=None,lcompute=True):
+    def fingerprint(self,datasets):
+        """
+        Fingerprint of everything the diagnostic output depends on
+        """
+
+        return manifest.fingerprint(self.diag_type,self.variable,self.plot_details,
+                                    variables_info[self.variable],manifest.code_version(),
+                                    [manifest.dataset_signature(dat,self.variable) for dat in datasets])
+
+    def run(self,datasets,root_dir=None,lcompute=True,store=None):
+        """
+        Run the diagnostic. Data are taken from store (dictionnary of in-memory
+        datasets, see atlas1d.readplan) if given, and read in the netCDF files otherwise.
+        """
 
         if root_dir is None:
             logger.error('root_dir is None for DiagGroup {0}'.format(self.name))
@@ -107,18 +122,29 @@ class Diagnostic:
             os.makedirs(root_dir)
 
         if lcompute:
+            # Plotting and reading modules (matplotlib, xarray) are only imported when rendering
+            import atlas1d.plotMUSC as plotMUSC
+            import atlas1d.datacache as datacache
+            from atlas1d.new_variables import add_to_dataset, required_variables
+
             ncfiles = OrderedDict()
 
-            if self.variable in var2compute:
-                tmp_dir = '{0}/tmp/'.format(root_dir)
-                if not(os.path.exists(tmp_dir)):
-                    os.makedirs(tmp_dir)
+            if store is not None:
+                for dat in datasets:
+                    if dat.name in store:
+                        ncfiles[dat.name] = store[dat.name]
+                    else:
+                        ncfiles[dat.name] = dat.ncfile
+            elif self.variable in var2compute:
+                # Derived variables are computed in memory and added to the dataset
                 for dat in datasets:
-                    fin = dat.ncfile
-                    fout = '{0}/{1}.nc'.format(tmp_dir,dat.name)
                     try:
-                        compute(fin, fout, self.variable)
-                        ncfiles[dat.name] = fout
+                        instrument.set_phase('read')
+                        ds = datacache.open_dataset(dat.ncfile, layout='time',
+                                                    variables=sorted(required_variables(self.variable))+plotMUSC._coordinates,
+                                                    backend=dat.backend)
+                        instrument.set_phase('compute')
+                        ncfiles[dat.name] = add_to_dataset(ds, self.variable)
                     except (KeyError, AttributeError, FileNotFoundError, IndexError) as e:
                         logger.debug(e)
                         ncfiles[dat.name] = dat.ncfile
@@ -153,7 +179,7 @@ class Diagnostic:
                                                      variables_info[self.variable]['units']),
                     'extend'    : 'neither'                                                 ,
                     'firstwhite': False                                                     ,
-                    'cmap'      : cm.RdBu.reversed()                                        ,
+                    'cmap'      : 'RdBu_r'                                                  ,
                     }
                 for key in self.plot_details.keys():
                     plotdico[key] = self.plot_details[key]
@@ -270,11 +296,6 @@ class Diagnostic:
             raise ValueError
 
 
-        if lcompute:
-            if self.variable in var2compute:
-                 if os.path.exists(tmp_dir):
-                      shutil.rmtree(tmp_dir)
-
 
 
 
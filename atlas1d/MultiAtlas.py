@@ -11,9 +11,11 @@ import logging
 logger = logging.getLogger(__name__)
 
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import atlas1d
 from atlas1d.Atlas import Atlas
+import atlas1d.workers as workers
 
 class MultiAtlas:
 
@@ -97,23 +99,89 @@ class MultiAtlas:
             a.info(references=True,simulations=True)
 
 
-    def run(self,cases=None,subcases=None,lcompute=True,lverbose=True):
+    def select(self,cases=None,subcases=None):
+        """
+        List of atlas for the given cases and subcases (all of them if None)
+        """
 
-        if cases is None:
-            for atlas in self.atlaslist:
+        atlaslist = []
+        for atlas in self.atlaslist:
+            if cases is None:
+                atlaslist.append(atlas)
+            elif atlas.case in cases:
+                if subcases is None:
+                    atlaslist.append(atlas)
+                elif atlas.subcase in subcases[atlas.case]:
+                    atlaslist.append(atlas)
+
+        return atlaslist
+
+    def run(self,cases=None,subcases=None,lcompute=True,lverbose=True,jobs=1,diag_jobs=1,lforce=False):
+        """
+        Run the atlas of the given cases and subcases.
+        If jobs > 1, atlas are run in a pool of jobs processes (all available cores if jobs <= 0).
+        If diag_jobs > 1, the diagnostics of each atlas are rendered by diag_jobs processes.
+        Both levels of parallelism are not nested: diag_jobs is ignored when atlas are run in parallel.
+        Only diagnostics whose inputs changed are rendered, unless lforce is True.
+        """
+
+        atlaslist = self.select(cases=cases,subcases=subcases)
+
+        jobs = workers.get_jobs(jobs)
+
+        if jobs == 1 or len(atlaslist) <= 1 or not(lcompute):
+            for atlas in atlaslist:
                 logger.debug(atlas.name)
-                atlas.run(lcompute=lcompute)
+                atlas.run(lcompute=lcompute,jobs=diag_jobs,lforce=lforce)
         else:
-            for atlas in self.atlaslist:
-                if atlas.case in cases:
-                    if subcases is None:
-                        logger.debug(atlas.name)
-                        atlas.run(lcompute=lcompute)
-                    else:
-                        if atlas.subcase in subcases[atlas.case]:
-                            logger.debug(atlas.name)
-                            atlas.run(lcompute=lcompute)
+            if not(workers.get_jobs(diag_jobs) == 1):
+                logger.warning('Atlas are run in parallel: diagnostics of each atlas are rendered serially (diag_jobs ignored)')
+            self._run_parallel(atlaslist,jobs,lcompute=lcompute,lforce=lforce)
+
+        if lcompute:
+            import atlas1d.datacache as datacache
+            logger.debug('Dataset cache: {0}'.format(datacache.stats()))
+
+    def _run_parallel(self,atlaslist,jobs,lcompute=True,lforce=False):
+
+        logger.info('Running {0} atlas with {1} processes'.format(len(atlaslist),jobs))
 
+        failed = OrderedDict()
+        with ProcessPoolExecutor(max_workers=min(jobs,len(atlaslist))) as executor:
+            futures = {}
+            for atlas in atlaslist:
+                future = executor.submit(workers.run_captured,_run_atlas,logging.getLogger().getEffectiveLevel(),
+                                         atlas,lcompute,lforce)
+                futures[future] = atlas
+
+            for future in as_completed(futures):
+                atlas = futures[future]
+                try:
+                    atlas_run, records, error = future.result()
+                except Exception as e: # e.g., the worker died
+                    atlas_run, records, error = None, [], '{0}: {1}'.format(type(e).__name__,e)
+
+                # Replay logs of the atlas run in the parent process
+                workers.replay(records)
+
+                if error is None:
+                    # Get back outputs and errors of the diagnostics
+                    self.atlaslist[self.atlaslist.index(atlas)] = atlas_run
+                    logger.info('Atlas {0} done'.format(atlas.name))
+                    for group in atlas_run.grouplist:
+                        for diag in group.diaglist:
+                            if not(diag.error == {}):
+                                logger.debug('Atlas {0}, diagnostic {1}/{2}: error with datasets {3}'.format(
+                                    atlas.name,diag.diag_type,diag.variable,list(diag.error.keys())))
+                else:
+                    logger.error('Atlas {0} failed'.format(atlas.name))
+                    failed[atlas.name] = error
+
+        if len(failed) > 0:
+            for name in failed.keys():
+                logger.error('--- Error for atlas {0}:'.format(name))
+                logger.error(failed[name])
+            raise RuntimeError('{0} atlas failed: {1}'.format(len(failed),', '.join(failed.keys())))
 
     def topdf(self,lverbose=True):
 
@@ -169,6 +237,9 @@ class MultiAtlas:
                 #    width_per_group,atlas.html_dir,group.name,group.head,))                
                 f.write('<td style="width: {0}; height: 18px;" align="center"><a href="../{1}/{2}/html/{3}.html">{4}</a></td>\n'.format(
                     width_per_group,atlas.case,atlas.subcase,group.name,group.head))
+            if os.path.exists('{0}/report.html'.format(atlas.html_dir)):
+                f.write('<td style="width: {0}; height: 18px;" align="center"><a href="../{1}/{2}/html/report.html"><em>Run report</em></a></td>\n'.format(
+                    width_per_group,atlas.case,atlas.subcase))
 
             f.write('</tr>\n')
             f.write('</tbody></table>\n')
@@ -179,5 +250,13 @@ class MultiAtlas:
                 
 
 
-        f.close()            
+        f.close()
+
+def _run_atlas(atlas,lcompute,lforce):
+    """
+    Run atlas in a worker process and send it back with the outputs of its diagnostics
+    """
+
+    atlas.run(lcompute=lcompute,lforce=lforce)
 
+    return atlas
@@ -28,7 +28,7 @@ class Simulation:
     def __init__(self,name=None,case=None,subcase=None,model=None,
             namATM=None,namSFX=None,
             ncfile=None,comment=None,
-            coefs={},varnames={},line=None):
+            coefs={},varnames={},line=None,backend=None):
 
         if name  is None or model   is None or\
            case  is None or subcase is None:
@@ -46,6 +46,9 @@ class Simulation:
         self.coefs = coefs
         self.varnames = varnames
 
+        # Backend reading ncfile (see atlas1d.datacache), the default one if None
+        self.backend = backend
+
         if ncfile is None:
             tmp = '{0}/simulations/{1}/{2}/{3}_{4}s/{5}/{6}/Output/netcdf/Out_klevel.nc'.format(_rep_MUSC,self.model.binVersion,name,self.model.levgrid,self.model.tstep,case,subcase)
             if os.path.exists(tmp):
@@ -97,6 +100,8 @@ class Simulation:
         print('Comment:', self.comment)
         print('varnames:', self.varnames)
         print('coefs:', self.coefs)
+        if self.backend is not None:
+            print('backend:', self.backend)
         print("line for plots: '{0}'".format(self.line))
 
     def add2known(self,overwrite=False):
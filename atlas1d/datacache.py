@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Process-wide cache of opened (and time-decoded) datasets.
+
+Datasets are keyed by (real path, mtime, size) so that a file rewritten
+during a run is transparently reopened. The cache is bounded and evicts
+the least recently used dataset first. Evicted datasets are only forgotten:
+they are closed when they are no longer used (e.g., by readers or lazy
+arrays of plots still running). Files ingested in a columnar store
+are read from the store when asked for a given layout.
+"""
+
+import os
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+import xarray as xr
+
+import atlas1d.ingest as ingest
+import atlas1d.mmapreader as mmapreader
+
+# Maximum number of datasets kept open at the same time
+_default_maxsize = int(os.getenv('ATLAS1D_CACHE_SIZE', 32))
+
+# Backends reading files:
+#   - xarray: xr.open_dataset
+#   - mmap: memory-mapped netCDF classic files, without copy (xarray for other files)
+#   - netcdf4: netCDF4-python, without xarray (see atlas1d.readers). Only for readers,
+#     xarray is used when a Dataset is needed
+#   - auto: mmap for netCDF classic files, netcdf4 (readers) or xarray (Datasets) otherwise
+backends = ['xarray','mmap','netcdf4','auto']
+_default_backend = os.getenv('ATLAS1D_BACKEND', 'xarray')
+
+def get_backend(filein,backend=None,lreader=False):
+    """
+    Backend actually used to read filein when backend (the default one if None) is asked for,
+    to get a reader if lreader (see atlas1d.readers), an xarray Dataset otherwise
+    """
+
+    if backend is None:
+        backend = _default_backend
+
+    if not(backend in backends):
+        logger.error('Unknown backend: {0}'.format(backend))
+        raise ValueError
+
+    if backend in ['mmap','auto'] and mmapreader.is_classic(filein):
+        return 'mmap'
+
+    if backend in ['netcdf4','auto'] and lreader:
+        return 'netcdf4'
+
+    return 'xarray'
+
+class DatasetCache:
+
+    def __init__(self,maxsize=_default_maxsize):
+
+        if maxsize < 1:
+            logger.error('maxsize must be at least 1, got {0}'.format(maxsize))
+            raise ValueError
+
+        self.maxsize = maxsize
+
+        # Opened datasets, the most recently used being last
+        self._datasets = OrderedDict()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.RLock()
+
+    def __len__(self):
+
+        return len(self._datasets)
+
+    def key(self,filein):
+        """
+        Key of filein in the cache. Raise FileNotFoundError if filein does not exist.
+        """
+
+        st = os.stat(filein)
+        return (os.path.realpath(filein), st.st_mtime_ns, st.st_size)
+
+    def open_dataset(self,filein,backend=None):
+        """
+        Return the dataset stored in filein, opening it with backend (see get_backend)
+        only if needed: a reader for the netcdf4 backend, an xarray Dataset otherwise.
+        The returned dataset is shared: it must neither be closed nor modified in place.
+        """
+
+        backend = get_backend(filein,backend,lreader=(backend == 'netcdf4'))
+        key = self.key(filein) + (backend,)
+
+        with self._lock:
+            if key in self._datasets:
+                self.hits += 1
+                self._datasets.move_to_end(key)
+                return self._datasets[key]
+
+            self.misses += 1
+
+            # The file may have changed since it was opened
+            for oldkey in [k for k in self._datasets.keys() if k[0] == key[0] and not(k[1:3] == key[1:3])]:
+                self._drop(oldkey)
+
+            logger.debug('Opening {0} ({1})'.format(filein,backend))
+            ds = None
+            if backend == 'mmap':
+                try:
+                    ds = mmapreader.open_dataset(filein)
+                except mmapreader.NotSupported as e:
+                    logger.debug('{0} cannot be memory-mapped: {1}'.format(filein,e))
+            elif backend == 'netcdf4':
+                from atlas1d.readers import NetCDF4Reader
+                ds = NetCDF4Reader(filein)
+            if ds is None:
+                ds = xr.open_dataset(filein, use_cftime=True)
+            self._datasets[key] = ds
+
+            while len(self._datasets) > self.maxsize:
+                oldkey = next(iter(self._datasets))
+                self._drop(oldkey)
+
+        return ds
+
+    def evict(self,filein=None):
+        """
+        Forget filein (and its store), or all datasets if filein is None.
+        They are closed when they are no longer used.
+        """
+
+        with self._lock:
+            if filein is None:
+                keys = list(self._datasets.keys())
+            else:
+                path = os.path.realpath(filein)
+                # Files of the store of filein as well
+                storedir = os.path.realpath(ingest.store_dir(filein))
+                keys = [k for k in self._datasets.keys() if k[0] == path or os.path.dirname(k[0]) == storedir]
+            for key in keys:
+                self._drop(key)
+
+    def stats(self):
+
+        return {'size':      len(self._datasets),
+                'maxsize':   self.maxsize       ,
+                'hits':      self.hits          ,
+                'misses':    self.misses        ,
+                'evictions': self.evictions     ,
+                }
+
+    def reset_stats(self):
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self,key):
+        # Datasets may still be used (e.g., by readers): they are not closed
+        # here but when they are garbage collected
+
+        self._datasets.pop(key)
+        logger.debug('Forgetting {0}'.format(key[0]))
+        self.evictions += 1
+
+
+# Cache shared by all plotMUSC readers
+_cache = DatasetCache()
+
+def get_cache():
+
+    return _cache
+
+def open_dataset(filein,layout=None,variables=None,backend=None):
+    """
+    Return the xarray Dataset stored in filein, read with backend (see get_backend).
+    If layout is given, the store of filein with this layout is opened instead
+    when it is up to date and has variables (see atlas1d.ingest).
+    """
+
+    if layout is not None:
+        storefile = ingest.find(filein,layout,variables)
+        if storefile is not None:
+            logger.debug('Reading {0} from {1}'.format(filein,storefile))
+            filein = storefile
+
+    return _cache.open_dataset(filein,get_backend(filein,backend))
+
+def evict(filein=None):
+
+    _cache.evict(filein)
+
+def stats():
+
+    return _cache.stats()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Persistent cache of derived variables.
+
+Derived variables computed from files which do not change (e.g. the LES
+references) are kept on disk, one netCDF file per source file and variable.
+Entries are keyed by the signature of the source file (path, size, mtime),
+the version of the code deriving variables and the variable name, so that
+they are never stale.
+
+Entries are looked for in a user cache, which is written to and bounded in
+size (least recently used entries are removed first), and then in a shared
+cache, only read, in the directory of the references ($SCM_REFERENCES). The
+shared cache can be filled with apptools/warm_cache.py.
+"""
+
+import os
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+import xarray as xr
+
+import atlas1d.manifest as manifest
+import atlas1d.new_variables as new_variables
+
+_cache_version = 1
+
+# Name of the shared cache directory in $SCM_REFERENCES
+shared_dirname = '.atlas1d_derived'
+
+# User cache directory ('' disables the persistent cache) and its size in megabytes
+_default_dir = os.getenv('ATLAS1D_DERIVED_CACHE',
+                         os.path.join(os.getenv('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'atlas1d', 'derived'))
+_default_maxsize = int(os.getenv('ATLAS1D_DERIVED_CACHE_SIZE', 1024))
+
+# Modules whose source defines how variables are derived
+_code_modules = ['new_variables.py','kernels.py','constants.py']
+
+def code_version():
+    """
+    Hash of the code deriving variables: entries computed by another version are not used
+    """
+
+    return '{0}/{1}'.format(_cache_version,manifest.source_version(_code_modules))
+
+def shared_dir():
+    """
+    Shared cache directory, None if SCM_REFERENCES is not defined
+    """
+
+    references = os.getenv('SCM_REFERENCES')
+    if references is None:
+        return None
+    return os.path.join(references, shared_dirname)
+
+class DerivedCache:
+
+    def __init__(self,cachedir=_default_dir,shared=None,maxsize=_default_maxsize):
+
+        # Directory written to (None if there is none)
+        if cachedir == '':
+            cachedir = None
+        self.cachedir = cachedir
+
+        # Directories only read
+        self.shared = [d for d in [shared,] if d is not None and not(d == cachedir)]
+
+        # Maximum size in bytes of cachedir
+        self.maxsize = maxsize*1024*1024
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self,filein,var):
+        """
+        Key of the derived variable var of filein, None if filein does not exist
+        """
+
+        signature = manifest.file_signature(filein)
+        if signature is None:
+            return None
+
+        return manifest.fingerprint(signature,code_version(),var)
+
+    def _path(self,cachedir,key):
+
+        return os.path.join(cachedir,key[:2],'{0}.nc'.format(key))
+
+    def get(self,filein,var,ds):
+        """
+        Derived variable var of filein (opened as ds, or given by the sizes of its
+        dimensions) if it is in the cache, None otherwise
+        """
+
+        sizes = getattr(ds,'sizes',ds)
+
+        key = self.key(filein,var)
+        if key is None:
+            return None
+
+        for cachedir in [self.cachedir,] + self.shared:
+            if cachedir is None:
+                continue
+            path = self._path(cachedir,key)
+            try:
+                with xr.open_dataset(path, decode_times=False, mask_and_scale=False) as tmp:
+                    cached = tmp[var].load()
+            except (FileNotFoundError, OSError, KeyError, ValueError):
+                continue
+
+            # Entries must match the present dataset
+            if not(all([dim in sizes and sizes[dim] == n for dim, n in cached.sizes.items()])):
+                logger.debug('Entry {0} does not match {1}'.format(path,filein))
+                continue
+
+            if cachedir == self.cachedir:
+                # Record the use of the entry for the eviction of the least recently used ones
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+
+            self.hits += 1
+            out = xr.DataArray(cached.values, dims=cached.dims, attrs=cached.attrs, name=var)
+            out.encoding = new_variables.encoding
+            return out
+
+        self.misses += 1
+        return None
+
+    def put(self,filein,var,tmp,cachedir=None):
+        """
+        Store the derived variable var of filein in cachedir (the user cache if None).
+        Nothing is done if it cannot be written.
+        """
+
+        if cachedir is None:
+            cachedir = self.cachedir
+        if cachedir is None:
+            return
+
+        key = self.key(filein,var)
+        if key is None:
+            return
+
+        path = self._path(cachedir,key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Coordinates are those of the source file: only the data and attributes are kept
+            out = xr.DataArray(tmp.values, dims=tmp.dims, attrs=tmp.attrs, name=var).to_dataset()
+            out.attrs['source'] = os.path.realpath(filein)
+            # Write in a temporary file first, so that concurrent runs never read a partial entry
+            tmpfile = '{0}.{1}.tmp'.format(path,os.getpid())
+            out.to_netcdf(tmpfile, encoding={var: {'_FillValue': None}})
+            os.replace(tmpfile, path)
+        except OSError as e:
+            logger.debug('Cannot write {0} in cache {1}: {2}'.format(var,cachedir,e))
+
+    def entries(self,cachedir=None):
+        """
+        List of (path, size, last use) of the entries of cachedir (the user cache if None)
+        """
+
+        if cachedir is None:
+            cachedir = self.cachedir
+        if cachedir is None or not(os.path.isdir(cachedir)):
+            return []
+
+        out = []
+        for root, _, files in os.walk(cachedir):
+            for f in files:
+                if f.endswith('.nc'):
+                    path = os.path.join(root,f)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    out.append((path, st.st_size, st.st_mtime))
+
+        return out
+
+    def shrink(self,cachedir=None):
+        """
+        Remove the least recently used entries of cachedir (the user cache if None)
+        until its size is below the maximum size
+        """
+
+        entries = sorted(self.entries(cachedir), key=lambda e: e[2])
+        size = sum([e[1] for e in entries])
+
+        for path, n, _ in entries:
+            if size <= self.maxsize:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            size -= n
+
+    def stats(self):
+
+        return {'cachedir':  self.cachedir,
+                'shared':    self.shared,
+                'hits':      self.hits,
+                'misses':    self.misses,
+                'evictions': self.evictions,
+                }
+
+_cache = None
+
+def get_cache():
+    """
+    Cache of the present process, created on first use
+    """
+
+    global _cache
+
+    if _cache is None:
+        _cache = DerivedCache(shared=shared_dir())
+
+    return _cache
+
+def lookup(ds,filein,variables):
+    """
+    Derived variables of filein (opened as ds, or given by the sizes of its
+    dimensions) found in the cache, and list of the variables missing in it
+    """
+
+    cache = get_cache()
+
+    found = OrderedDict()
+    missing = []
+    for var in variables:
+        tmp = cache.get(filein,var,ds)
+        if tmp is None:
+            missing.append(var)
+        else:
+            found[var] = tmp
+
+    return found, missing
+
+def derive(ds,filein,variables):
+    """
+    Derived variables of ds, read from filein, computed and stored in the cache
+    """
+
+    cache = get_cache()
+
+    derived = OrderedDict()
+    if len(variables) > 0:
+        derived = new_variables.get_derived(ds,variables)
+        for var, tmp in derived.items():
+            cache.put(filein,var,tmp)
+        cache.shrink()
+
+    return derived
+
+def add_to_dataset(ds,filein,variables):
+    """
+    Same as atlas1d.new_variables.add_to_dataset for a list of variables,
+    ds being read from filein: derived variables are taken from the cache
+    if possible, and stored in it otherwise.
+    """
+
+    derived, missing = lookup(ds,filein,variables)
+    derived.update(derive(ds,filein,missing))
+
+    logger.debug('Derived variables of {0}: {1} from cache, {2} computed'.format(filein,len(variables)-len(missing),len(missing)))
+
+    return ds.assign(derived)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Pixel-aware downsampling of data to be plotted.
+
+Long time series are reduced to the minimum and maximum of the samples
+falling in each pixel column of the axes, which preserves their extremes.
+Time-height fields are aggregated in blocks of time steps so that there
+is about one column of cells per pixel. Data which are not larger than
+the output resolution are left unchanged.
+"""
+
+import math
+
+import numpy as np
+import numpy.ma as ma
+
+import matplotlib
+
+def target_width(figsize=None, dpi=None):
+    """
+    Width in pixels of the axes of a figure of size figsize (inches)
+    saved with dpi (matplotlib defaults if None)
+    """
+
+    if figsize is None:
+        figsize = matplotlib.rcParams['figure.figsize']
+
+    if dpi is None:
+        dpi = matplotlib.rcParams['savefig.dpi']
+        if dpi == 'figure':
+            dpi = matplotlib.rcParams['figure.dpi']
+
+    fraction = matplotlib.rcParams['figure.subplot.right'] - matplotlib.rcParams['figure.subplot.left']
+
+    return max(int(math.ceil(figsize[0]*dpi*fraction)), 1)
+
+def _to_nan(a):
+    # float32 data are kept in float32
+
+    dtype = np.float32 if a.dtype == np.float32 else np.float64
+
+    return ma.filled(ma.masked_invalid(ma.asarray(a, dtype=dtype)), np.nan)
+
+def minmax_line(x, y, nbins):
+    """
+    Keep, in each of nbins groups of consecutive samples of the line (x,y),
+    the samples where y is minimum and maximum
+    """
+
+    n = len(y)
+    if nbins < 1 or n <= 2*nbins:
+        return x, y
+
+    size = int(math.ceil(n/nbins))
+    nb = int(math.ceil(n/size))
+
+    y0 = _to_nan(y)
+    yloc = np.full(nb*size, np.nan, dtype=y0.dtype)
+    yloc[:n] = y0
+    yloc = yloc.reshape((nb,size))
+
+    # Groups with missing values only keep their first sample, which preserves gaps
+    imin = np.argmin(np.where(np.isnan(yloc), np.inf, yloc), axis=1)
+    imax = np.argmax(np.where(np.isnan(yloc), -np.inf, yloc), axis=1)
+
+    base = np.arange(nb)*size
+    ind = np.unique(np.concatenate([base + imin, base + imax]))
+    ind = ind[ind < n]
+
+    return x[ind], y[ind]
+
+def block_mean(a, size, axis=-1):
+    """
+    Average of a over blocks of size consecutive elements along axis, NaN
+    where the block has missing values only
+    """
+
+    a = np.moveaxis(_to_nan(a), axis, -1)
+    n = a.shape[-1]
+    nb = int(math.ceil(n/size))
+
+    tmp = np.full(a.shape[:-1] + (nb*size,), np.nan, dtype=a.dtype)
+    tmp[...,:n] = a
+    tmp = tmp.reshape(a.shape[:-1] + (nb,size))
+
+    count = np.sum(~np.isnan(tmp), axis=-1)
+    total = np.nansum(tmp, axis=-1)
+    out = np.where(count > 0, total/np.maximum(count, 1).astype(a.dtype), np.nan)
+
+    return np.moveaxis(out, -1, axis)
+
+def block_mesh(x, y, data, ncol):
+    """
+    Aggregate the time-height field data (nlev,nt) on a mesh x, y given either
+    at cell centers (nlev,nt) or at cell edges along time (nlev,nt+1) so that
+    it has about ncol columns
+    """
+
+    nt = data.shape[-1]
+    if ncol < 1 or nt <= ncol:
+        return x, y, data
+
+    size = int(math.ceil(nt/ncol))
+
+    out = []
+    for coord in [x, y]:
+        if coord.shape[-1] == nt+1: # edges: edges of the blocks are kept
+            ind = list(range(0, nt, size)) + [nt,]
+            out.append(coord[...,ind])
+        else:
+            out.append(block_mean(coord, size, axis=-1))
+
+    return out[0], out[1], block_mean(data, size, axis=-1)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Ingestion of MUSC output files into a chunked columnar store.
+
+MUSC files contain many variables, of which an atlas reads a few dozen
+with different access patterns: full time series, profiles at a few time
+steps, time-height fields. The store of a file keeps only the variables
+used by atlas (in float32), each one written twice, in two netCDF4 files
+whose variables are chunked differently:
+  - time.nc: time-contiguous chunks (whole time series of a few levels)
+  - level.nc: level-contiguous chunks (whole profiles of a few time steps)
+A store.json file records the signature of the source file: the store is
+used instead of the source only if it is fresher than it.
+
+Stores are written next to their source file (<ncfile>.store), or in
+$ATLAS1D_STORE_DIR if defined.
+"""
+
+import os
+import json
+import hashlib
+
+import logging
+logger = logging.getLogger(__name__)
+
+import atlas1d
+import atlas1d.manifest as manifest
+
+_store_version = 1
+
+layouts = ['time','level']
+
+# Directory of stores (None: next to source files)
+_default_dir = os.getenv('ATLAS1D_STORE_DIR')
+
+# Target size of chunks in bytes
+_chunk_bytes = 256*1024
+
+# Vertical coordinates, always kept
+_coordinates = ['zfull','zhalf','pfull','phalf']
+
+def store_dir(ncfile,storedir=_default_dir):
+    """
+    Directory of the store of ncfile
+    """
+
+    if storedir is None:
+        return '{0}.store'.format(ncfile)
+
+    # MUSC output files all have the same name
+    h = hashlib.sha1(os.path.realpath(ncfile).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(storedir, '{0}_{1}.store'.format(h,os.path.basename(ncfile)))
+
+def atlas_variables():
+    """
+    Variables possibly read by an atlas: variables described in variables_info,
+    vertical coordinates and inputs of derived variables
+    """
+
+    import atlas1d.new_variables as new_variables
+    from variables_info import variables_info, var2compute
+
+    out = list(variables_info.keys()) + _coordinates
+    out.extend(sorted(new_variables.required_variables(var2compute)))
+
+    return [var for i, var in enumerate(out) if not(var in out[:i])]
+
+##################################################
+# Lookup of stores
+##################################################
+
+_info = {}
+
+def get_info(ncfile,storedir=_default_dir):
+    """
+    Content of store.json of the store of ncfile, None if there is none
+    """
+
+    filein = os.path.join(store_dir(ncfile,storedir), 'store.json')
+    try:
+        mtime = os.stat(filein).st_mtime_ns
+    except OSError:
+        return None
+
+    if filein in _info and _info[filein][0] == mtime:
+        return _info[filein][1]
+
+    try:
+        with open(filein, 'r') as f:
+            info = json.loads(f.read())
+    except (IOError, ValueError):
+        logger.debug('Store description {0} cannot be read'.format(filein))
+        return None
+
+    _info[filein] = (mtime, info)
+
+    return info
+
+def find(ncfile,layout,variables=None,storedir=_default_dir):
+    """
+    File of the store of ncfile with the given layout, if the store is fresher
+    than ncfile and has all the variables of ncfile among variables (all if None).
+    None otherwise.
+    """
+
+    if not(layout in layouts):
+        logger.error('Unknown store layout: {0}'.format(layout))
+        raise ValueError
+
+    info = get_info(ncfile,storedir)
+    if info is None or not(info['version'] == _store_version):
+        return None
+
+    if not(info['source'] == manifest.file_signature(ncfile)):
+        logger.debug('Store of {0} is older than its source'.format(ncfile))
+        return None
+
+    if variables is None:
+        variables = info['source_variables']
+    for var in variables:
+        if var in info['source_variables'] and not(var in info['variables']):
+            logger.debug('Variable {0} is not in the store of {1}'.format(var,ncfile))
+            return None
+
+    return os.path.join(store_dir(ncfile,storedir), '{0}.nc'.format(layout))
+
+##################################################
+# Ingestion
+##################################################
+
+def _chunks(dims,sizes,layout):
+    """
+    Chunk shape of a variable of dimensions dims, contiguous along time (layout 'time')
+    or along levels (layout 'level'), of about _chunk_bytes in float32
+    """
+
+    if len(dims) < 2 or not(dims[0] == 'time'):
+        return [sizes[dim] for dim in dims]
+
+    n = max(_chunk_bytes//4, 1)
+    nt = sizes[dims[0]]
+    nlev = 1
+    for dim in dims[1:]:
+        nlev = nlev*sizes[dim]
+
+    if layout == 'time':
+        # Whole time series of as many levels as possible
+        out = [nt,] + [sizes[dim] for dim in dims[1:]]
+        out[-1] = min(max(n//max(nt*nlev//sizes[dims[-1]],1), 1), sizes[dims[-1]])
+    else:
+        # Whole profiles of as many time steps as possible
+        out = [min(max(n//nlev, 1), nt),] + [sizes[dim] for dim in dims[1:]]
+
+    return out
+
+def _write(src,fileout,variables,layout):
+
+    import numpy as np
+    import netCDF4
+
+    sizes = {dim: len(src.dimensions[dim]) for dim in src.dimensions}
+
+    with netCDF4.Dataset(fileout, 'w', format='NETCDF4') as dst:
+        dst.setncatts({att: src.getncattr(att) for att in src.ncattrs()})
+        for dim in src.dimensions:
+            dst.createDimension(dim, sizes[dim])
+
+        for var in variables:
+            vin = src.variables[var]
+            attrs = {att: vin.getncattr(att) for att in vin.ncattrs()}
+            fill = attrs.pop('_FillValue', None)
+
+            # Data are stored in float32, dimension variables (e.g. time) keep their type
+            dtype = vin.dtype
+            if vin.dtype.kind == 'f' and not(var in src.dimensions):
+                dtype = np.float32
+                if fill is not None:
+                    fill = np.float32(fill)
+                if 'missing_value' in attrs:
+                    attrs['missing_value'] = np.float32(attrs['missing_value'])
+
+            if len(vin.dimensions) > 0:
+                vout = dst.createVariable(var, dtype, vin.dimensions, fill_value=fill,
+                                          chunksizes=_chunks(vin.dimensions,sizes,layout))
+            else:
+                vout = dst.createVariable(var, dtype, vin.dimensions, fill_value=fill)
+            vout.setncatts(attrs)
+            vout[...] = vin[...].astype(dtype)
+
+def ingest(ncfile,variables=None,storedir=_default_dir,lforce=False):
+    """
+    Write the store of ncfile, with variables (those used by atlas if None).
+    Return the store directory. Nothing is done if the store is already up to date,
+    unless lforce is True.
+    """
+
+    import netCDF4
+
+    if variables is None:
+        variables = atlas_variables()
+
+    signature = manifest.file_signature(ncfile)
+    if signature is None:
+        logger.error('File {0} does not exist'.format(ncfile))
+        raise ValueError
+
+    dirout = store_dir(ncfile,storedir)
+
+    with netCDF4.Dataset(ncfile, 'r') as src:
+        src.set_auto_maskandscale(False)
+
+        source_variables = list(src.variables.keys())
+        # Dimension variables are needed to decode and index the data
+        selected = [var for var in source_variables if var in src.dimensions or var in variables]
+
+        if not(lforce) and find(ncfile,layouts[0],selected,storedir) is not None:
+            logger.info('Store of {0} is up to date'.format(ncfile))
+            return dirout
+
+        if not(os.path.exists(dirout)):
+            os.makedirs(dirout)
+
+        # The store is not used while being written
+        try:
+            os.remove(os.path.join(dirout, 'store.json'))
+        except OSError:
+            pass
+
+        for layout in layouts:
+            fileout = os.path.join(dirout, '{0}.nc'.format(layout))
+            tmpfile = '{0}.{1}.tmp'.format(fileout,os.getpid())
+            logger.debug('Writing {0} ({1} variables)'.format(fileout,len(selected)))
+            _write(src,tmpfile,selected,layout)
+            os.replace(tmpfile, fileout)
+
+    info = {'version':          _store_version,
+            'atlas1d':          atlas1d.__version__,
+            'source':           signature,
+            'source_variables': source_variables,
+            'variables':        selected,
+            'layouts':          layouts,
+            }
+
+    tmpfile = os.path.join(dirout, 'store.json.{0}.tmp'.format(os.getpid()))
+    with open(tmpfile, 'w') as f:
+        f.write(json.dumps(info, indent=1))
+    os.replace(tmpfile, os.path.join(dirout, 'store.json'))
+
+    logger.info('Store of {0} written in {1} ({2}/{3} variables)'.format(ncfile,dirout,len(selected),len(source_variables)))
+
+    return dirout
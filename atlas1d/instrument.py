@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Instrumentation of atlas runs.
+
+A Recorder measures the wall time spent in each phase of a diagnostic
+(read and prepare data, compute derived variables, render the figure,
+save it as a PNG file), the bytes read by the process while reading and
+computing data, and the growth of the peak resident memory of the process.
+With trace_memory, the peak memory allocated by Python within each recorder
+is also measured (with tracemalloc, which slows down allocations).
+The code being measured declares the phase it enters with set_phase,
+which does nothing when no recorder is active. Reports of all diagnostics
+of an atlas are gathered in a run report, saved as JSON and summarized
+in an html page.
+"""
+
+import os
+import json
+import time
+import datetime
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+phases = ['read','compute','render','save','other']
+
+_local = threading.local()
+
+def _bytes_read():
+    """
+    Bytes read so far by the process (Linux only, None elsewhere)
+    """
+
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except (IOError, ValueError):
+        pass
+
+    return None
+
+def trace_memory(ltrace=True):
+    """
+    Measure (or not) the peak memory allocated within recorders. The option is set
+    in the environment, so that processes started afterwards (e.g., rendering
+    processes) measure it as well.
+    """
+
+    os.environ['ATLAS1D_TRACE_MEMORY'] = '1' if ltrace else '0'
+
+def _max_rss():
+    """
+    Peak resident memory of the process so far in bytes (None if unknown)
+    """
+
+    if resource is None:
+        return None
+
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.uname().sysname == 'Darwin':
+        return rss
+    return rss*1024
+
+class Recorder:
+    """
+    Measures of what happens between entering and exiting the recorder
+    in the present thread
+    """
+
+    def __init__(self):
+
+        self.times = OrderedDict([(p, 0.) for p in phases])
+        self.bytes = OrderedDict([(p, 0) for p in phases])
+        self.wall = None
+        self.bytes_read = None
+        self.rss_growth = None
+        self.peak_memory = None
+
+        self._phase = None
+        self._t = None
+        self._b = None
+
+    def __enter__(self):
+
+        self._previous = getattr(_local, 'recorder', None)
+        _local.recorder = self
+
+        if os.getenv('ATLAS1D_TRACE_MEMORY', '0') == '1' and not(tracemalloc.is_tracing()):
+            tracemalloc.start()
+        self._tracing = tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.reset_peak()
+            self._mem0 = tracemalloc.get_traced_memory()[0]
+
+        # Processes are long-lived: only the growth of their peak is charged to the recorder
+        self._rss0 = _max_rss()
+
+        self._t0 = time.perf_counter()
+        self.set_phase('other')
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.set_phase(None)
+        self.wall = time.perf_counter() - self._t0
+
+        if self._b is not None:
+            # Fonts are read while rendering: only data are counted
+            self.bytes_read = self.bytes['read'] + self.bytes['compute']
+        rss = _max_rss()
+        if rss is not None:
+            self.rss_growth = rss - self._rss0
+        if self._tracing and tracemalloc.is_tracing():
+            self.peak_memory = tracemalloc.get_traced_memory()[1] - self._mem0
+
+        _local.recorder = self._previous
+
+        return False
+
+    def set_phase(self, phase):
+        """
+        Charge the time from now on to phase
+        """
+
+        t = time.perf_counter()
+        b = _bytes_read()
+        if self._phase is not None:
+            self.times[self._phase] += t - self._t
+            if b is not None:
+                self.bytes[self._phase] += b - self._b
+
+        self._phase = phase
+        self._t = t
+        self._b = b
+
+    def report(self, error=None):
+        """
+        Measures as a dictionnary, with the errors by dataset if given
+        """
+
+        out = OrderedDict()
+        out['wall'] = self.wall
+        out['phases'] = OrderedDict(self.times)
+        out['bytes_read'] = self.bytes_read
+        out['rss_growth'] = self.rss_growth
+        out['peak_memory'] = self.peak_memory
+        if error is not None:
+            out['error'] = OrderedDict(error)
+
+        return out
+
+def set_phase(phase):
+    """
+    Declare that the present thread enters phase. Does nothing if no recorder is active.
+    """
+
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is not None:
+        recorder.set_phase(phase)
+
+def save_figure(fig, namefig):
+    """
+    Save the matplotlib figure fig in namefig, the drawing of the figure being
+    charged to the render phase and the encoding and writing of the file to the save phase
+    """
+
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is None:
+        fig.savefig(namefig)
+        return
+
+    recorder.set_phase('render')
+    # Figures are drawn by savefig, which emits a draw_event once done
+    cid = fig.canvas.mpl_connect('draw_event', lambda event: recorder.set_phase('save'))
+    try:
+        fig.savefig(namefig)
+    finally:
+        fig.canvas.mpl_disconnect(cid)
+    recorder.set_phase('render')
+
+##################################################
+# Run report of an atlas
+##################################################
+
+def run_report(name, wall, jobs, reads, diagnostics, nuptodate):
+    """
+    Run report of atlas name, run in wall seconds with jobs processes:
+    reports of the reading of datasets (reads, by dataset name) and of the rendered
+    diagnostics (by key), the slowest first. nuptodate diagnostics were up-to-date.
+    """
+
+    out = OrderedDict()
+    out['atlas'] = name
+    out['date'] = datetime.datetime.now().isoformat(timespec='seconds')
+    out['wall'] = wall
+    out['jobs'] = jobs
+    out['rendered'] = len(diagnostics)
+    out['uptodate'] = nuptodate
+    out['reads'] = reads
+    out['diagnostics'] = OrderedDict(sorted(diagnostics.items(), key=lambda item: -(item[1]['wall'] or 0.)))
+
+    return out
+
+def save_report(report, filename):
+
+    with open(filename, 'w') as f:
+        f.write(json.dumps(report, indent=1))
+
+def load_report(filename):
+    """
+    Run report saved in filename, None if it does not exist
+    """
+
+    try:
+        with open(filename, 'r') as f:
+            return json.loads(f.read(), object_pairs_hook=OrderedDict)
+    except IOError:
+        return None
+    except ValueError:
+        logger.warning('Run report {0} is corrupted and is ignored'.format(filename))
+        return None
+
+def _seconds(t):
+
+    if t is None:
+        return '-'
+    return '{0:.2f}'.format(t)
+
+def _megabytes(n):
+
+    if n is None:
+        return '-'
+    return '{0:.1f}'.format(n/1.e6)
+
+def report2html(report, filename):
+    """
+    html summary of a run report
+    """
+
+    head = ['Wall (s)',] + ['{0} (s)'.format(p) for p in phases] + ['Read (MB)','Peak RSS growth (MB)','Peak allocated (MB)']
+
+    def row(f, name, rep, errors=''):
+        f.write('<tr><td>{0}</td>'.format(name))
+        values = [_seconds(rep['wall']),] + [_seconds(rep['phases'][p]) for p in phases] +\
+                 [_megabytes(rep['bytes_read']), _megabytes(rep.get('rss_growth',None)), _megabytes(rep['peak_memory'])]
+        for v in values:
+            f.write('<td align="right">{0}</td>'.format(v))
+        f.write('<td>{0}</td></tr>\n'.format(errors))
+
+    with open(filename, 'w') as f:
+        f.write('<head><title>SCM Atlas - Run report</title></head>\n')
+        f.write('<h1 style="text-align: center;">Run report of atlas {0}</h1>\n'.format(report['atlas']))
+        f.write('<ul>\n')
+        f.write('<li>Run on {0} with {1} process(es) in {2} s</li>\n'.format(report['date'], report['jobs'], _seconds(report['wall'])))
+        f.write('<li>{0} diagnostics rendered, {1} up-to-date</li>\n'.format(report['rendered'], report['uptodate']))
+        f.write('</ul>\n')
+
+        f.write('<h2><span style="text-decoration: underline;"><strong>Reading of datasets</strong></span></h2>\n')
+        f.write('<table border="1" style="border-collapse: collapse;"><tbody>\n')
+        f.write('<tr><th>Dataset</th>' + ''.join(['<th>{0}</th>'.format(h) for h in head]) + '<th></th></tr>\n')
+        for name, rep in report['reads'].items():
+            row(f, name, rep)
+        f.write('</tbody></table>\n')
+
+        f.write('<h2><span style="text-decoration: underline;"><strong>Diagnostics (slowest first)</strong></span></h2>\n')
+        f.write('<table border="1" style="border-collapse: collapse;"><tbody>\n')
+        f.write('<tr><th>Diagnostic</th>' + ''.join(['<th>{0}</th>'.format(h) for h in head]) + '<th>Errors</th></tr>\n')
+        for key, rep in report['diagnostics'].items():
+            errors = ', '.join(['{0} ({1})'.format(dat, ', '.join(var)) for dat, var in rep.get('error',{}).items()])
+            row(f, key, rep, errors)
+        f.write('</tbody></table>\n')
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Vectorized column diagnostics.
+
+Kernels work on arrays whose last dimension is the vertical one, either
+NumPy arrays or chunked arrays implementing the NumPy API (e.g. dask).
+Vertical coordinates may be given with the same shape as the variable or
+as a single profile, which is then broadcast. Levels may be ordered
+upward or downward: no reversed copy is made.
+"""
+
+import numpy as np
+
+import atlas1d.constants as cc
+
+# Threshold on cloud fraction for a level to be cloudy
+cloud_threshold = 0.001
+
+def cloud_base(z, cf, threshold=cloud_threshold, missing=np.nan):
+    """
+    Height of the lowest level where cloud fraction cf >= threshold,
+    missing where there is no cloud
+    """
+
+    cloudy = cf >= threshold
+    zcb = np.min(np.where(cloudy, z, np.inf), axis=-1)
+
+    return np.where(np.isinf(zcb), missing, zcb)
+
+def cloud_top(z, cf, threshold=cloud_threshold, missing=np.nan):
+    """
+    Height of the highest level where cloud fraction cf >= threshold,
+    missing where there is no cloud
+    """
+
+    cloudy = cf >= threshold
+    zct = np.max(np.where(cloudy, z, -np.inf), axis=-1)
+
+    return np.where(np.isinf(zct), missing, zct)
+
+def column_integral(ph, var):
+    """
+    Mass-weighted vertical integral of var (kg m-2 for a mixing ratio in kg kg-1).
+    ph is the pressure at the nlev+1 half levels bounding the nlev levels of var.
+    """
+
+    if not(ph.shape[-1] == var.shape[-1]+1):
+        raise IndexError('{0} half levels given for {1} levels'.format(ph.shape[-1],var.shape[-1]))
+
+    dp = np.abs(np.diff(ph, axis=-1))
+
+    return np.sum(var*dp, axis=-1)/cc.g
+
+def layer_bounds(z):
+    """
+    Lower and upper bounds of the layers centered on levels z.
+    Layers are bounded by the mid-points between levels, the lowest one
+    starts at 0 and the highest one is unbounded.
+    """
+
+    zmid = (z[...,:-1] + z[...,1:])/2.
+
+    # Bounds below the first level and above the last one
+    lup = z[...,:1] < z[...,-1:]
+    first = np.where(lup, 0., np.inf)
+    last = np.where(lup, np.inf, 0.)
+
+    edges = np.concatenate([first, zmid, last], axis=-1)
+
+    return np.minimum(edges[...,:-1], edges[...,1:]), np.maximum(edges[...,:-1], edges[...,1:])
+
+def layer_mean(z, var, zmin, zmax):
+    """
+    Average of var between heights zmin and zmax, each level being weighted
+    by the thickness of the overlap between its layer and [zmin,zmax]
+    """
+
+    zdn, zup = layer_bounds(z)
+
+    dz = np.clip(np.minimum(zup, zmax) - np.maximum(zdn, zmin), 0., None)
+
+    return np.sum(var*dz, axis=-1)/np.sum(dz, axis=-1)
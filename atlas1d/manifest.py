@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Build manifest of an atlas.
+
+For each diagnostic, the manifest records a fingerprint of everything the
+diagnostic depends on (its plot details, the signature of the files read
+and the source of the code reading, deriving and rendering data), together
+with its output and errors. A diagnostic whose fingerprint did not change
+since the last run does not need to be rendered again.
+"""
+
+import os
+import json
+import hashlib
+import datetime
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+import atlas1d
+
+_manifest_version = 1
+
+# Modules whose source defines how diagnostics are read, derived and rendered
+_code_modules = ['Diagnostic.py','readplan.py','readers.py','mmapreader.py','ingest.py',
+                 'new_variables.py','kernels.py','constants.py',
+                 'plotMUSC.py','plotutils.py','downsample.py','timeaxis.py','timealign.py','vertical.py','regrid.py']
+
+_source_versions = {}
+
+def source_version(modules):
+    """
+    Hash of the version of atlas1d and of the source of its modules
+    """
+
+    key = tuple(modules)
+    if not(key in _source_versions):
+        h = hashlib.sha1(atlas1d.__version__.encode('utf-8'))
+        for mod in modules:
+            with open(os.path.join(atlas1d._dir_Atlas1D, mod), 'rb') as f:
+                h.update(f.read())
+        _source_versions[key] = h.hexdigest()
+
+    return _source_versions[key]
+
+def code_version():
+    """
+    Hash of the code diagnostics depend on: diagnostics rendered by another version are rendered again
+    """
+
+    return source_version(_code_modules)
+
+def _default(obj):
+    """
+    JSON representation of objects found in plot details.
+    Raise TypeError for objects without a stable representation (e.g., functions).
+    """
+
+    if hasattr(obj,'name') and hasattr(obj,'N'): # matplotlib colormap, by its colors
+        colors = obj(list(range(obj.N))).tobytes()
+        return 'colormap:{0}:{1}'.format(obj.name,hashlib.sha1(colors).hexdigest())
+    if hasattr(obj,'vmin') and hasattr(obj,'vmax') and hasattr(obj,'clip'): # matplotlib norm
+        return {'norm': type(obj).__name__, 'vmin': obj.vmin, 'vmax': obj.vmax, 'clip': obj.clip,
+                'boundaries': getattr(obj,'boundaries',None), 'ncolors': getattr(obj,'Ncmap',None)}
+    if isinstance(obj,(datetime.datetime,datetime.date,datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj,datetime.timedelta):
+        return obj.total_seconds()
+    if hasattr(obj,'tolist'): # numpy arrays and scalars
+        return obj.tolist()
+    if isinstance(obj,(set,frozenset)):
+        return sorted(obj)
+
+    logger.error('No fingerprint for {0} of type {1}'.format(obj,type(obj).__name__))
+    raise TypeError
+
+def file_signature(filein):
+    """
+    Signature (path, size, mtime) of filein, None if it does not exist
+    """
+
+    try:
+        st = os.stat(filein)
+    except (OSError, TypeError):
+        return None
+
+    return [os.path.realpath(filein), st.st_size, st.st_mtime_ns]
+
+def fingerprint(*args):
+    """
+    Hash of the JSON representation of args
+    """
+
+    s = json.dumps(args, default=_default, sort_keys=True)
+
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+def dataset_signature(dat,variable):
+    """
+    What a diagnostic of variable depends on for the dataset dat
+    """
+
+    return {'name':    dat.name,
+            'ncfile':  file_signature(dat.ncfile),
+            'varname': dat.varnames.get(variable,None),
+            'coef':    dat.coefs.get(variable,None),
+            'line':    dat.line,
+            }
+
+class Manifest:
+
+    def __init__(self,filename):
+
+        self.filename = filename
+
+        self.entries = OrderedDict()
+
+        self.load()
+
+    def load(self):
+
+        try:
+            with open(self.filename, 'r') as f:
+                tmp = json.loads(f.read(),object_pairs_hook=OrderedDict)
+        except IOError:
+            return
+        except ValueError:
+            logger.warning('Manifest {0} is corrupted and is ignored'.format(self.filename))
+            return
+
+        if tmp.get('version',None) == _manifest_version and tmp.get('atlas1d',None) == atlas1d.__version__:
+            self.entries = tmp['diagnostics']
+        else:
+            logger.info('Manifest {0} was written by another version and is ignored'.format(self.filename))
+
+    def save(self):
+
+        tmp = OrderedDict()
+        tmp['version'] = _manifest_version
+        tmp['atlas1d'] = atlas1d.__version__
+        tmp['diagnostics'] = self.entries
+
+        # Write in a temporary file first, so that an interrupted run does not corrupt the manifest
+        with open(self.filename + '.tmp', 'w') as f:
+            f.write(json.dumps(tmp, indent=1))
+        os.replace(self.filename + '.tmp', self.filename)
+
+    def is_uptodate(self,key,fprint):
+        """
+        True if the diagnostic key was rendered with the fingerprint fprint
+        and its output files still exist
+        """
+
+        if not(key in self.entries):
+            return False
+
+        entry = self.entries[key]
+        if not(entry['fingerprint'] == fprint):
+            return False
+
+        output = entry['output']
+        if output is None:
+            return False
+        if isinstance(output,dict):
+            files = list(output.values())
+        else:
+            files = [output,]
+
+        for f in files:
+            if not(os.path.exists(f)):
+                return False
+
+        return True
+
+    def get(self,key):
+        """
+        Output and error of the diagnostic key
+        """
+
+        entry = self.entries[key]
+        output = entry['output']
+        if isinstance(output,dict):
+            output = OrderedDict(output)
+
+        return output, OrderedDict(entry['error'])
+
+    def update(self,key,fprint,output,error):
+
+        self.entries[key] = OrderedDict([('fingerprint', fprint), ('output', output), ('error', error)])
+
+    def remove(self,key):
+
+        if key in self.entries:
+            del(self.entries[key])
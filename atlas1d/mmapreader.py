@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Memory-mapped reader of netCDF classic files (CDF-1, CDF-2 and CDF-5).
+
+The header of the file is parsed and variables are read lazily, as NumPy
+views on the memory-mapped file, without copy: fixed-size variables are
+contiguous and record variables are strided views over the records.
+Only the parts read that have missing values (_FillValue, missing_value)
+are copied, to replace them with NaN as xarray does. Datasets are returned
+as xarray Datasets decoded like xr.open_dataset(filein, use_cftime=True).
+Other formats (netCDF4/HDF5) are not handled: see is_classic.
+"""
+
+import os
+import mmap
+import struct
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+import numpy as np
+import xarray as xr
+
+from xarray.backends import BackendArray
+from xarray.core import indexing
+
+_magic = {b'CDF\x01': 1, b'CDF\x02': 2, b'CDF\x05': 5}
+
+# netCDF classic types (big-endian)
+_types = {1: '>i1', 2: 'S1', 3: '>i2', 4: '>i4', 5: '>f4', 6: '>f8',
+          7: '>u1', 8: '>u2', 9: '>u4', 10: '>i8', 11: '>u8'}
+
+_NC_DIMENSION = 10
+_NC_VARIABLE = 11
+_NC_ATTRIBUTE = 12
+
+# Attributes used to decode variables, kept in encoding by xarray
+_encoding_attrs = ['_FillValue','missing_value','coordinates']
+_time_attrs = ['units','calendar']
+
+class NotSupported(Exception):
+    """
+    The file uses a feature of netCDF not handled by this reader
+    """
+    pass
+
+def is_classic(filein):
+    """
+    Is filein a netCDF classic file?
+    """
+
+    try:
+        with open(filein, 'rb') as f:
+            return f.read(4) in _magic
+    except (IOError, TypeError):
+        return False
+
+class _Header:
+    """
+    Parser of the header of a netCDF classic file
+    """
+
+    def __init__(self,buf):
+
+        self.buf = buf
+        self.pos = 0
+
+        self.version = _magic.get(bytes(buf[0:4]), None)
+        if self.version is None:
+            raise NotSupported('Not a netCDF classic file')
+        self.pos = 4
+
+        self.numrecs = self._size()
+        self.dims = self._dims()
+        self.attrs = self._attrs()
+        self.variables = self._variables()
+
+    def _int(self,n=4):
+
+        fmt = '>i' if n == 4 else '>q'
+        out, = struct.unpack_from(fmt, self.buf, self.pos)
+        self.pos += n
+        return out
+
+    def _size(self):
+        # Sizes are 64-bit integers in CDF-5 only
+
+        return self._int(8 if self.version == 5 else 4)
+
+    def _offset(self):
+        # Offsets are 64-bit integers in CDF-2 and CDF-5
+
+        return self._int(4 if self.version == 1 else 8)
+
+    def _name(self):
+
+        n = self._size()
+        out = bytes(self.buf[self.pos:self.pos+n]).decode('utf-8')
+        self.pos += n + (-n % 4)
+        return out
+
+    def _list(self,tag):
+
+        t = self._int()
+        n = self._size()
+        if t == 0 and n == 0: # ABSENT
+            return 0
+        if not(t == tag):
+            raise NotSupported('Unexpected tag {0} in header'.format(t))
+        return n
+
+    def _dims(self):
+
+        out = OrderedDict()
+        for i in range(self._list(_NC_DIMENSION)):
+            name = self._name()
+            out[name] = self._size()
+
+        return out
+
+    def _attrs(self):
+
+        out = OrderedDict()
+        for i in range(self._list(_NC_ATTRIBUTE)):
+            name = self._name()
+            nctype = self._int()
+            n = self._size()
+            dtype = np.dtype(_types[nctype])
+            size = n*dtype.itemsize
+            raw = bytes(self.buf[self.pos:self.pos+size])
+            self.pos += size + (-size % 4)
+            if nctype == 2:
+                out[name] = raw.decode('utf-8', errors='replace').rstrip('\x00')
+            else:
+                # Same as netCDF4-python: native scalars for single values, arrays otherwise
+                value = np.frombuffer(raw, dtype=dtype).astype(dtype.newbyteorder('='))
+                out[name] = value[0] if n == 1 else value
+
+        return out
+
+    def _variables(self):
+
+        dimnames = list(self.dims.keys())
+
+        out = OrderedDict()
+        for i in range(self._list(_NC_VARIABLE)):
+            name = self._name()
+            ndims = self._size()
+            dims = [dimnames[self._size()] for k in range(ndims)]
+            attrs = self._attrs()
+            nctype = self._int()
+            vsize = self._size()
+            begin = self._offset()
+            if not(nctype in _types):
+                raise NotSupported('Unknown type {0} of variable {1}'.format(nctype,name))
+            out[name] = {'dims': dims, 'attrs': attrs, 'dtype': np.dtype(_types[nctype]),
+                         'vsize': vsize, 'begin': begin}
+
+        return out
+
+    def is_record(self,var):
+
+        dims = self.variables[var]['dims']
+        return len(dims) > 0 and self.dims[dims[0]] == 0
+
+    def recsize(self):
+        """
+        Size in bytes of a record
+        """
+
+        recvars = [var for var in self.variables if self.is_record(var)]
+        if len(recvars) == 1:
+            # A single record variable is not padded
+            v = self.variables[recvars[0]]
+            n = v['dtype'].itemsize
+            for dim in v['dims'][1:]:
+                n = n*self.dims[dim]
+            return n
+
+        return sum([self.variables[var]['vsize'] for var in recvars])
+
+class _File:
+    """
+    Memory map of a netCDF classic file and its header. Views of variables are
+    taken on buf, which holds an export of the map: it cannot be unmapped while
+    they are used.
+    """
+
+    def __init__(self,filein):
+
+        self.filein = filein
+        with open(filein, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self.header = _Header(self.mm)
+            if self.header.numrecs < 0: # streaming
+                raise NotSupported('Number of records unknown')
+            self.recsize = self.header.recsize()
+        except:
+            self.close()
+            raise
+
+        self.buf = np.frombuffer(self.mm, dtype=np.uint8)
+
+    def close(self):
+        """
+        Unmap the file. It stays mapped as long as views on it are used.
+        """
+
+        self.buf = None
+        try:
+            self.mm.close()
+        except BufferError:
+            # Views obtained from variables are still used: the file is unmapped
+            # when they are released
+            logger.warning('{0} closed while its data are still used'.format(self.filein))
+
+    def view(self,var):
+        """
+        Zero-copy view of var
+        """
+
+        if self.buf is None:
+            raise ValueError('{0} is closed'.format(self.filein))
+
+        v = self.header.variables[var]
+        dtype = v['dtype']
+        shape = [self.header.dims[dim] for dim in v['dims']]
+        strides = list(np.cumprod([dtype.itemsize,] + shape[:0:-1])[::-1]) if len(shape) > 0 else []
+        if self.header.is_record(var):
+            shape[0] = self.header.numrecs
+            strides[0] = self.recsize
+        if 0 in shape: # e.g., no record yet
+            return np.zeros(shape, dtype=dtype)
+
+        return np.ndarray(shape=tuple(shape), dtype=dtype, buffer=self.buf, offset=v['begin'],
+                          strides=tuple([int(s) for s in strides]))
+
+class _Variable(BackendArray):
+    """
+    Variable of a memory-mapped file, lazily indexed: only the indexed part is read,
+    as a view on the file, or as a copy with NaN for missing values (fills) if it has any.
+    Integer variables with missing values are converted to float64.
+    """
+
+    def __init__(self,f,var,fills):
+
+        self.file = f
+        self.var = var
+        self.fills = fills
+
+        v = f.header.variables[var]
+        if v['dtype'].kind == 'S':
+            raise NotSupported('Character variable {0}'.format(var))
+        self.shape = tuple([f.header.numrecs if f.header.is_record(var) and i == 0 else f.header.dims[dim]
+                            for i, dim in enumerate(v['dims'])])
+        if len(fills) == 0:
+            self.dtype = v['dtype']
+        elif v['dtype'].kind == 'f':
+            self.dtype = v['dtype'].newbyteorder('=')
+        else:
+            self.dtype = np.dtype(np.float64)
+
+    def __getitem__(self,key):
+
+        return indexing.explicit_indexing_adapter(key, self.shape, indexing.IndexingSupport.BASIC, self.read)
+
+    def read(self,key=Ellipsis):
+        """
+        Part key (a basic index) of the variable, with NaN for missing values
+        """
+
+        data = np.asarray(self.file.view(self.var)[key])
+        if len(self.fills) == 0:
+            return data
+
+        missing = np.zeros(data.shape, dtype=bool)
+        for fill in self.fills:
+            missing |= (data == fill)
+        if not(missing.any()) and data.dtype.kind == 'f':
+            return data
+
+        out = data.astype(self.dtype)
+        out[missing] = np.nan
+
+        return out
+
+def open_dataset(filein):
+    """
+    xarray Dataset of the netCDF classic file filein, whose variables are lazily
+    read from the memory-mapped file: opening it only reads the header and the
+    dimension variables (e.g., time), as xarray does.
+    Raise NotSupported for other files.
+    """
+
+    import cftime
+
+    f = _File(filein)
+
+    try:
+        header = f.header
+        coords = []
+        variables = OrderedDict()
+        for var, v in header.variables.items():
+            attrs = OrderedDict(v['attrs'])
+            encoding = OrderedDict([('dtype', v['dtype']), ('source', os.path.abspath(filein))])
+            for att in _encoding_attrs:
+                if att in attrs:
+                    encoding[att] = attrs.pop(att)
+
+            if 'coordinates' in encoding:
+                coords.extend([c for c in encoding['coordinates'].split() if not(c in coords)])
+
+            if 'scale_factor' in attrs or 'add_offset' in attrs:
+                raise NotSupported('Packed variable {0}'.format(var))
+
+            data = _Variable(f,var,[encoding[att] for att in ['_FillValue','missing_value'] if att in encoding])
+            if var == 'time' and 'units' in attrs and 'since' in attrs['units']:
+                for att in _time_attrs:
+                    if att in attrs:
+                        encoding[att] = attrs.pop(att)
+                data = cftime.num2date(np.asarray(data.read(), dtype=np.float64), encoding['units'],
+                                       calendar=encoding.get('calendar','standard'),
+                                       only_use_cftime_datetimes=True)
+            elif var in header.dims:
+                # Dimension variables are indexes, loaded by xarray: they are copied
+                # so that they do not hold the map
+                data = np.array(data.read())
+            else:
+                data = indexing.LazilyIndexedArray(data)
+
+            variables[var] = xr.Variable(v['dims'], data, attrs=attrs, encoding=encoding)
+
+        # Coordinates come after data variables, as with xarray
+        coords = [var for var in variables if var in header.dims or var in coords]
+        ordered = OrderedDict([(var, variables[var]) for var in variables if not(var in coords)])
+        ordered.update([(var, variables[var]) for var in coords])
+
+        ds = xr.Dataset(ordered, attrs=header.attrs)
+        ds = ds.set_coords([var for var in coords if not(var in header.dims)])
+    except:
+        f.close()
+        raise
+
+    ds.set_close(f.close)
+
+    return ds
@@ -4,70 +4,35 @@
 # This software is governed by the CeCILL-C license under French law.
 # http://www.cecill.info
 
+import weakref
+
 import logging
 logger = logging.getLogger(__name__)
 
+from collections import OrderedDict
+
 import numpy as np
 import xarray as xr
 
 import atlas1d
 import atlas1d.constants as cc
+import atlas1d.kernels as kernels
+import atlas1d.readers as readers
 
 encoding = {'dtype': 'float32', '_FillValue': np.float32(cc.missing)}
 
-def f_zcb_old(zf,zneb):
-
-    nt,nlev = zneb.shape
-
-    zcb = np.zeros(nt,dtype=np.float32) + cc.missing
-    if len(zf.shape) == 1:
-        zf = np.tile(zf.data,(nt,1))
-
-    if zf[0,0] > zf[0,1]:
-        lpos = False
-    else:
-        lpos = True
-
-    for it in range(0,nt):
-      lfound = False
-      ilev = nlev-1
-      if lpos: ilev = 0
-      while not(lfound) and not(ilev == -1) and not(ilev == nlev):
-        if zneb[it,ilev] >= 0.001:
-            lfound = True
-            zcb[it] = zf[it,ilev]
-        else:
-            if lpos: # zf is in increasing order
-                ilev = ilev + 1
-            else:    # zf is in decreasing order
-                ilev = ilev - 1
-
-    zcb = xr.DataArray(zcb, coords=[zneb.time,])
-    zcb.encoding = encoding
-    zcb.attrs["missing_value"] = np.float32(cc.missing)
-    zcb.attrs["long_name"] = 'Cloud base height'
-    zcb.attrs["units"] = 'm'
+def _values(var):
+    """
+    Array of var, without loading it if it is chunked
+    """
 
-    return zcb
+    if isinstance(var,xr.DataArray):
+        return var.data
+    return var
 
 def f_zcb(zf,zneb):
 
-    nt,nlev = zneb.shape
-
-    if len(zf.shape) == 1:
-        zf = np.tile(zf.data,(nt,1))
-
-    if zf[0,0] > zf[0,1]:
-        zf_loc = np.array(zf[:,::-1],np.float32)
-        zneb_loc = np.array(zneb[:,::-1],np.float32)
-    else:
-        zf_loc = np.array(zf[:,:],np.float32)
-        zneb_loc = np.array(zneb[:,:],np.float32)
-
-    tmp = np.argmax(zneb_loc >= 0.001, axis=1)
-    zcb = np.array([zf_loc[it,tmp[it]] for it in range(0,nt)])
-    tmp = np.max(zneb_loc, axis=1)
-    zcb[tmp < 0.001] = cc.missing
+    zcb = kernels.cloud_base(_values(zf), _values(zneb), missing=cc.missing)
 
     zcb = xr.DataArray(zcb, coords=[zneb.time,])
     zcb.encoding = encoding
@@ -77,59 +42,9 @@ def f_zcb(zf,zneb):
 
     return zcb
 
-def f_zct_old(zf,zneb):
-
-    nt,nlev = zneb.shape
-
-    zct = np.zeros(nt,dtype=np.float32) + cc.missing
-    if len(zf.shape) == 1:
-        zf = np.tile(zf.data,(nt,1))
-
-    if zf[0,0] > zf[0,1]:
-        lpos = False
-    else:
-        lpos = True
-
-    for it in range(0,nt):
-      lfound = False
-      ilev = 0
-      if lpos: ilev = nlev-1
-      while not(lfound) and not(ilev == -1) and not(ilev == nlev):
-        if zneb[it,ilev] >= 0.001:
-            lfound = True
-            zct[it] = zf[it,ilev]
-        else:
-            if lpos: # zf is in increasing order
-                ilev = ilev - 1
-            else:    # zf is in decreasing order
-                ilev = ilev + 1
-
-    zct = xr.DataArray(zct, coords=[zneb.time,])
-    zct.encoding = encoding
-    zct.attrs["missing_value"] = np.float32(cc.missing)
-    zct.attrs["long_name"] = 'Cloud top height'
-    zct.attrs["units"] = 'm'
-
-    return zct
-
 def f_zct(zf,zneb):
 
-    nt,nlev = zneb.shape
-
-    if len(zf.shape) == 1:
-        zf = np.tile(zf.data,(nt,1))
-
-    if zf[0,0] < zf[0,1]:
-        zf_loc = np.array(zf[:,::-1],np.float32)
-        zneb_loc = np.array(zneb[:,::-1],np.float32)
-    else:
-        zf_loc = np.array(zf[:,:],np.float32)
-        zneb_loc = np.array(zneb[:,:],np.float32)
-
-    tmp = np.argmax(zneb_loc >= 0.001, axis=1)
-    zct = np.array([zf_loc[it,tmp[it]] for it in range(0,nt)])
-    tmp = np.max(zneb_loc, axis=1)
-    zct[tmp < 0.001] = cc.missing
+    zct = kernels.cloud_top(_values(zf), _values(zneb), missing=cc.missing)
 
     zct = xr.DataArray(zct, coords=[zneb.time,])
     zct.encoding = encoding
@@ -141,19 +56,7 @@ def f_zct(zf,zneb):
 
 def f_int(ph,var2int):
 
-    nt,nlev = var2int.shape
-    zout = np.zeros(nt,dtype=np.float32)
-
-    if len(ph.shape) == 1:
-        ph = np.tile(ph.data,(nt,1))
-
-    if ph[0,0] < ph[0,1]:
-        lpos = 1
-    else:
-        lpos = -1
-    for ilev in range(0,nlev):
-        dp = (ph[:,ilev+1]-ph[:,ilev])*lpos
-        zout[:] = zout[:] + var2int[:,ilev]*dp/cc.g
+    zout = kernels.column_integral(_values(ph), _values(var2int))
 
     zout = xr.DataArray(zout, coords=[var2int.time,])
     zout.encoding = encoding
@@ -165,487 +68,472 @@ def f_int(ph,var2int):
 
 def f_avg(zf, var2avg, zmin, zmax):
 
-    nt,nlev = var2avg.shape
+    zout = kernels.layer_mean(_values(zf), _values(var2avg), zmin, zmax)
+
+    zout = xr.DataArray(zout, coords=[var2avg.time,])
+    zout.encoding = encoding
+    zout.attrs["missing_value"] = np.float32(cc.missing)
+    zout.attrs["long_name"] = '{0} averaged between {1}m and {2}m'.format(var2avg.attrs['long_name'], zmin, zmax)
+    zout.attrs["units"] = var2avg.attrs['units']
+
+    return zout
 
-    zout = np.zeros(nt,dtype=np.float32)
-    ztot = np.zeros(nt,dtype=np.float32)
+##################################################
+# Registry of derived variables
+#
+# Each derived variable declares its input variables and a vectorized
+# function computing it from the corresponding DataArrays. An input is
+# itself a derived variable if it is registered under another name,
+# otherwise it is read from the dataset (e.g. ql is derived from the
+# raw variables ql and qlc).
+##################################################
 
-    if len(zf.shape) == 1:
-        zf = np.tile(zf.data,(nt,1))
+class DerivedVariable:
 
-    if zf[0,0] < zf[0,1]:
+    def __init__(self,name,func,inputs=[],optional=[],long_name=None,units=None):
 
-        zup = np.zeros((nt,nlev),dtype=np.float32)
-        zdn = np.zeros((nt,nlev),dtype=np.float32)
+        self.name = name
+        self.func = func
 
-        zup[:,nlev-1] = 1.e20
-        zdn[:,0] = 0
+        # Inputs which must be available
+        self.inputs = list(inputs)
 
-        zup[:,0:nlev-1] = (zf[:,0:nlev-1]+zf[:,1:nlev])/2.
-        zdn[:,1:nlev] = (zf[:,0:nlev-1]+zf[:,1:nlev])/2.
+        # Inputs which may be missing. They are then given as None to func.
+        self.optional = list(optional)
 
-        dz = np.zeros((nt,nlev),dtypecode=np.float32)
-        dz = np.where((zdn <= zmin) & (zup > zmin), zup-zmin, dz)
-        dz = np.where((zdn < zmax)  & (zup >= zmax), zmax - zdn, dz)
-        dz = np.where((zdn >= zmin) & (zup <= zmax), zup - zdn, dz)
+        self.long_name = long_name
+        self.units = units
 
-        zout = np.sum(var2avg*dz,axis=1)
-        ztot = np.sum(dz,axis=1)
+    def dependencies(self):
 
-    else:
+        return self.inputs + self.optional
 
-        zup = np.zeros((nt,nlev),dtype=np.float32)
-        zdn = np.zeros((nt,nlev),dtype=np.float32)
+    def is_derived(self,var):
+        """
+        Is input var a derived variable, or is it read from the dataset?
+        """
 
-        zup[:,0] = 1.e20
-        zdn[:,nlev-1] = 0
+        return var in _registry and not(var == self.name)
 
-        zup[:,1:nlev] = (zf[:,0:nlev-1]+zf[:,1:nlev])/2.
-        zdn[:,0:nlev-1] = (zf[:,0:nlev-1]+zf[:,1:nlev])/2.
+_registry = OrderedDict()
 
-        dz = np.zeros((nt,nlev),dtype=np.float32)
-        dz = np.where((zdn <= zmin) & (zup > zmin), zup-zmin, dz)
-        dz = np.where((zdn < zmax)  & (zup >= zmax), zmax - zdn, dz)
-        dz = np.where((zdn >= zmin) & (zup <= zmax), zup - zdn, dz)
+def register(name,inputs=[],optional=[],long_name=None,units=None):
+    """
+    Decorator registering a function computing the derived variable name
+    """
 
-        zout = np.sum(var2avg*dz,axis=1)
-        ztot = np.sum(dz,axis=1)
+    def decorator(func):
+        _registry[name] = DerivedVariable(name,func,inputs=inputs,optional=optional,long_name=long_name,units=units)
+        return func
 
-    zout[:] = zout[:]/ztot[:]
+    return decorator
 
-    zout = xr.DataArray(zout, coords=[var2avg.time,])
-    zout.encoding = encoding
-    zout.attrs["missing_value"] = np.float32(cc.missing)
-    zout.attrs["long_name"] = '{0} averaged between {1}m and {2}m'.format(var2int.attrs['long_name'], zmin, zmax)
-    zout.attrs["units"] = var2int.attrs['units']
+def known_variables():
 
-    return zout
+    return list(_registry.keys())
 
-def f_thetal(ds):
+def resolve(variables):
     """
-    Compute thetal.
+    Compute the minimal dependency graph needed to derive variables.
+    Return the derived variables in evaluation order (dependencies first)
+    and the set of variables to be read from the dataset.
     """
 
-    try:
-        ql = get_ql(ds)
-        #tmp = ds.theta - (ds.theta/ds.temp)*(cc.Lv/cc.Cpd)*ql
-        tmp = ds.theta - (cc.Lv/cc.Cpd)*ql
-    except:
-        raise
+    if isinstance(variables,str):
+        variables = [variables,]
+
+    order = []
+    raw = set()
+    visiting = set()
+
+    def visit(var):
+        if var in order:
+            return
+        if var in visiting:
+            logger.error('Circular dependency for derived variable {0}'.format(var))
+            raise ValueError
+        visiting.add(var)
+        entry = _registry[var]
+        for dep in entry.dependencies():
+            if entry.is_derived(dep):
+                visit(dep)
+            else:
+                raw.add(dep)
+        visiting.remove(var)
+        order.append(var)
+
+    for var in variables:
+        if not(var in _registry):
+            logger.error('variable to be computed is unknown: {0}'.format(var))
+            raise NotImplementedError
+        visit(var)
+
+    return order, raw
 
-    thetal = xr.DataArray(tmp, coords=[ds.theta.time,ds.theta.levf])
-    thetal.encoding = encoding
-    thetal.attrs["missing_value"] = np.float32(cc.missing)
-    thetal.attrs["long_name"] = 'Liquid-water potential temperature'
-    thetal.attrs["units"] = 'K'
+def required_variables(variables):
+    """
+    Variables to be read from a dataset to derive variables
+    """
 
-    return thetal
+    return resolve(variables)[1]
 
-def f_qt(ds):
+class Deriver:
     """
-    Compute qt
+    Compute derived variables for one dataset, sharing intermediate results.
     """
 
-    try:
-        try:
-            ql = get_ql(ds)
-        except AttributeError:
-            logger.debug('No ql available. Assume equal 0')
-            ql = 0
-        except:
-            raise
-        try:
-            qi = get_qi(ds)
-        except AttributeError:
-            logger.debug('No qi available. Assume equal 0')
-            qi = 0
-        except:
-            raise
+    def __init__(self,ds):
+
+        # Derivers are kept with their dataset (see get_deriver): they only reference it weakly
+        self._ds = weakref.ref(ds)
+
+        # Derived variables already computed, or exception raised while computing them
+        self._memo = {}
+
+    @property
+    def ds(self):
+
+        return self._ds()
+
+    @property
+    def reader(self):
+        # Variables are read through the reader of ds, an xarray Dataset or a reader (see atlas1d.readers)
+
+        return readers.as_reader(self.ds)
+
+    def read(self,var):
+
         try:
-            qr = get_qr(ds)
-        except AttributeError:
-            logger.debug('No qr available. Assume equal 0')
-            qr = 0
-        except:
-            raise
+            return self.reader.dataarray(var)
+        except KeyError:
+            raise AttributeError("Dataset has no variable '{0}'".format(var))
+
+    def get(self,var):
+
+        if var in self._memo:
+            tmp = self._memo[var]
+            if isinstance(tmp,Exception):
+                raise tmp
+            return tmp
+
+        if not(var in _registry):
+            logger.error('variable to be computed is unknown: {0}'.format(var))
+            raise NotImplementedError
+
         try:
-            qsn = get_qsn(ds)
-        except AttributeError:
-            logger.debug('No qsn available. Assume equal 0')
-            qsn = 0
-        except:
+            tmp = self._compute(_registry[var])
+        except (AttributeError, KeyError, IndexError) as e:
+            logger.debug('Cannot compute {0}: {1}'.format(var,e))
+            self._memo[var] = e
             raise
-        tmp = ds.qv + ql + qi + qr + qsn
-    except:
-        raise
 
-    qt = xr.DataArray(tmp, coords=[ds.qv.time,ds.qv.levf])
-    qt.encoding = encoding
-    qt.attrs["missing_value"] = np.float32(cc.missing)
-    qt.attrs["long_name"] = 'Total water content'
-    qt.attrs["units"] = 'kg kg-1'
-
-    return qt
-
-def add_ql_to_dataset(ds):
-    """
-    Compute ql=ql+qlc in case of PCMT. If no ql or no qlc, raise exception.
-    """
-
-    try:
-        ds['ql'] = get_ql(ds) #ds.ql + ds.qlc
-        ds['ql'].attrs['long_name'] = 'Liquid water content'
-        ds['ql'].attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing ql=ql+qlc:' + str(e))
-        logger.debug('Most probably, either ql or qlc does not exist in the dataset (specific to PCMT)')
-        logger.debug('Thus just raise exception (AttributeError)')
-        raise
-    except:
-        raise    
-
-def add_qi_to_dataset(ds):
-    """
-    Compute qi=qi+qic in case of PCMT. If no qi or no qic, raise exception.
-    """
-
-    try:
-        ds['qi'] = get_qi(ds) #ds.qi + ds.qic
-        ds['qi'].attrs['long_name'] = 'Ice water content'
-        ds['qi'].attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing qi=qi+qic:' + str(e))
-        logger.debug('Most probably, either qi or qic does not exist in the dataset (specific to PCMT)')
-        logger.debug('Thus just raise exception (AttributeError)')
-        raise
-    except:
-        raise 
-
-def add_qc_to_dataset(ds):
-    """
-    Compute qc=ql+qi. If no ql or no qi, raise exception.
-    """
-
-    try:
-        ds['qc'] = get_ql(ds) + get_qi(ds)
-        ds['qc'].attrs['long_name'] = 'Condensed water content'
-        ds['qc'].attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing qc=ql+qi:' + str(e))
-        logger.debug('Most probably, either ql or qi does not exist in the dataset')
-        logger.debug('Thus just raise exception (AttributeError)')
-        raise
-    except:
-        raise 
-
-def add_qr_to_dataset(ds):
-    """
-    Compute qr=qr+qrc in case of PCMT. If no qr or no qrc, raise exception.
-    """
-
-    try:
-        ds['qr'] = get_qr(ds) #ds.qr + ds.qrc
-        ds['qr'].attrs['long_name'] = 'Rain water content'
-        ds['qr'].attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing qr=qr+qrc:' + str(e))
-        logger.debug('Most probably, either qr or qrc does not exist in the dataset (specific to PCMT)')
-        logger.debug('Thus just raise exception (AttributeError)')
-        raise
-    except:
-        raise  
-
-def add_qsn_to_dataset(ds):
-    """
-    Compute qsn=qsn+qsnc in case of PCMT. If no qr or no qrc, raise exception.
-    """
-
-    try:
-        ds['qsn'] = get_qsn(ds) #ds.qsn + ds.qsnc
-        ds['qsn'].attrs['long_name'] = 'Snow water content'
-        ds['qsn'].attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing qsn=qsn+qsnc:' + str(e))
-        logger.debug('Most probably, either qsn or qsnc does not exist in the dataset (specific to PCMT)')
-        logger.debug('Thus just raise exception (AttributeError)')
-        raise
-    except:
-        raise  
-
-def add_qp_to_dataset(ds):
-    """
-    Compute qp=qr+qsn+qg. If no qr or no qsn, raise exception.
-    If no qg, just assume the model do not have graupel
-    """
-
-    try:
-        ds['qp'] = ds.qg
-    except AttributeError as e:
-        logger.debug('Most probably, dataset has no graupel. Raised error:' + str(e))
-        logger.debug('Just assume graupel is not relevant for that model')
-        ds['qp'] = ds['theta']*0.
-    except:
-        raise
-
-    try:
-        ds['qp'] += get_qr(ds) + get_qsn(ds)
-        ds['qp'].attrs['long_name'] = 'Precipitating water content'
-        ds['qp'].attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing qp=qr+qsn(+qg):' + str(e))
-        logger.debug('Most probably, either qr or qsn does not exist in the dataset')
-        logger.debug('Thus just raise exception (AttributeError)')
-        raise
-    except:
-        raise
+        self._memo[var] = tmp
 
-def get_ql(ds):
+        return tmp
+
+    def get_all(self,variables):
+        """
+        Compute all variables in one pass. Variables that cannot be computed are skipped.
+        """
+
+        order, _ = resolve(variables)
+
+        out = OrderedDict()
+        for var in order:
+            try:
+                tmp = self.get(var)
+            except (AttributeError, KeyError, IndexError):
+                continue
+            if var in variables:
+                out[var] = tmp
+
+        return out
+
+    def _input(self,entry,var):
+
+        if entry.is_derived(var):
+            return self.get(var)
+        else:
+            return self.read(var)
+
+    def _compute(self,entry):
+
+        logger.debug('Computing ' + entry.name)
+
+        args = {}
+        for var in entry.inputs:
+            args[var] = self._input(entry,var)
+        for var in entry.optional:
+            try:
+                args[var] = self._input(entry,var)
+            except (AttributeError, KeyError, IndexError) as e:
+                logger.debug('Optional input {0} of {1} not available: {2}'.format(var,entry.name,e))
+                args[var] = None
+
+        tmp = entry.func(**args)
+
+        # Do not modify the attributes of a variable shared with the dataset
+        tmp = tmp.copy(deep=False)
+        tmp.name = entry.name
+        if entry.long_name is not None:
+            tmp.attrs['long_name'] = entry.long_name
+        if entry.units is not None:
+            tmp.attrs['units'] = entry.units
+
+        return tmp
+
+def get_deriver(ds):
     """
-    Get ql in dataset ds
+    Deriver attached to dataset ds, so that intermediate variables are shared
+    between all the diagnostics using ds. It is kept in the state shared by the
+    readers of ds (see atlas1d.readers), which is released with ds.
     """
 
-    try:
-        tmp1 = ds.ql
-        tmp2 = ds.qlc
-        tmp1 = tmp1.where(tmp1 > 0, other=0)
-        tmp2 = tmp2.where(tmp2 > 0, other=0)
-        tmp = tmp1 + tmp2
-        tmp.attrs['long_name'] = 'Liquid water content'
-        tmp.attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing ql=ql+qlc:' + str(e))
-        logger.debug('Most probably, either ql or qlc does not exist in the dataset (specific to PCMT)')
-        logger.debug('Try to get ql')
-        try:
-            tmp = ds.ql
-            tmp = tmp.where(tmp > 0, other=0)
-            logger.debug('Dataset has ql. We can continue!')
-        except AttributeError as e:
-            logger.debug('Dataset has no ql: ' + str(e))
-            logger.debug('Just raise exception (AttributeError)')
-            raise
-        except:
-            raise
-        pass            
-    except:
-        raise
+    state = readers.as_reader(ds).state
+    if not('deriver' in state):
+        state['deriver'] = Deriver(ds)
+
+    return state['deriver']
+
+##################################################
+# Definition of derived variables
+##################################################
+
+def _positive(var):
 
+    return var.where(var > 0, other=0)
+
+def _sum_pcmt(var,varc):
+    """
+    In case of PCMT, condensates are split in a stratiform part (var)
+    and a convective part (varc)
+    """
+
+    if varc is None:
+        return _positive(var)
+    else:
+        return _positive(var) + _positive(varc)
+
+@register('ql', inputs=['ql'], optional=['qlc'], long_name='Liquid water content', units='kg kg-1')
+def _ql(ql,qlc):
+    return _sum_pcmt(ql,qlc)
+
+@register('qi', inputs=['qi'], optional=['qic'], long_name='Ice water content', units='kg kg-1')
+def _qi(qi,qic):
+    return _sum_pcmt(qi,qic)
+
+@register('qr', inputs=['qr'], optional=['qrc'], long_name='Rain water content', units='kg kg-1')
+def _qr(qr,qrc):
+    return _sum_pcmt(qr,qrc)
+
+@register('qsn', inputs=['qsn'], optional=['qsnc'], long_name='Snow water content', units='kg kg-1')
+def _qsn(qsn,qsnc):
+    return _sum_pcmt(qsn,qsnc)
+
+@register('qc', inputs=['ql','qi'], long_name='Condensed water content', units='kg kg-1')
+def _qc(ql,qi):
+    return ql + qi
+
+@register('qp', inputs=['qr','qsn'], optional=['qg'], long_name='Precipitating water content', units='kg kg-1')
+def _qp(qr,qsn,qg):
+    # If no qg, just assume the model do not have graupel
+    if qg is None:
+        return qr + qsn
+    return qg + qr + qsn
+
+@register('qt', inputs=['qv'], optional=['ql','qi','qr','qsn'], long_name='Total water content', units='kg kg-1')
+def _qt(qv,ql,qi,qr,qsn):
+    tmp = qv
+    for q in [ql,qi,qr,qsn]:
+        if q is not None:
+            tmp = tmp + q
     return tmp
 
+@register('thetal', inputs=['theta','ql'], long_name='Liquid-water potential temperature', units='K')
+def _thetal(theta,ql):
+    #return theta - (theta/temp)*(cc.Lv/cc.Cpd)*ql
+    return theta - (cc.Lv/cc.Cpd)*ql
+
+@register('windspeed', optional=['windspeed','ua','va'], long_name='Horizontal wind speed', units='m s-1')
+def _windspeed(windspeed,ua,va):
+    if windspeed is not None:
+        return windspeed
+    if ua is None or va is None:
+        raise AttributeError('Dataset has neither windspeed nor ua and va')
+    return np.sqrt(ua**2 + va**2)
+
+@register('zcb', inputs=['zfull','cl'])
+def _zcb(zfull,cl):
+    return f_zcb(zfull,cl)
+
+@register('zct', inputs=['zfull','cl'])
+def _zct(zfull,cl):
+    return f_zct(zfull,cl)
+
+@register('lwp', inputs=['phalf','ql'], long_name='Liquid water path', units='kg m-2')
+def _lwp(phalf,ql):
+    return f_int(phalf,ql)
+
+@register('iwp', inputs=['phalf','qi'], long_name='Ice water path', units='kg m-2')
+def _iwp(phalf,qi):
+    return f_int(phalf,qi)
+
+@register('rwp', inputs=['phalf','qr'], long_name='Rain water path', units='kg m-2')
+def _rwp(phalf,qr):
+    return f_int(phalf,qr)
+
+@register('swp', inputs=['phalf','qsn'], long_name='Snow water path', units='kg m-2')
+def _swp(phalf,qsn):
+    return f_int(phalf,qsn)
+
+@register('gwp', inputs=['phalf','qg'], long_name='Graupel water path', units='kg m-2')
+def _gwp(phalf,qg):
+    return f_int(phalf,qg)
+
+@register('theta_0_500', inputs=['zfull','theta'], long_name='Potential temperature averaged over 0-500m', units='K')
+def _theta_0_500(zfull,theta):
+    return f_avg(zfull,theta,0,500)
+
+@register('qv_0_500', inputs=['zfull','qv'], long_name='Specific humidity averaged over 0-500m', units='kg kg-1')
+def _qv_0_500(zfull,qv):
+    return f_avg(zfull,qv,0,500)
+
+@register('theta_2000_5000', inputs=['zfull','theta'], long_name='Potential temperature averaged over 2000-5000m', units='K')
+def _theta_2000_5000(zfull,theta):
+    return f_avg(zfull,theta,2000,5000)
+
+@register('qv_2000_5000', inputs=['zfull','qv'], long_name='Specific humidity averaged over 2000-5000m', units='kg kg-1')
+def _qv_2000_5000(zfull,qv):
+    return f_avg(zfull,qv,2000,5000)
+
+@register('max_cf', inputs=['cl'], long_name='Maximum cloud fraction', units='-')
+def _max_cf(cl):
+    return cl.max(axis=1)
+
+@register('Qr_int', inputs=['rsus','rsds','rlus','rlds','rsdt','rsut','rlut'], long_name='Integrated radiative heating', units='W m-2')
+def _Qr_int(rsus,rsds,rlus,rlds,rsdt,rsut,rlut):
+    return rsus - rsds + rlus - rlds + rsdt - rsut - rlut
+
+@register('TOA_cre_sw', inputs=['rsutcs','rsut'], long_name='TOA SW CRE', units='W m-2')
+def _TOA_cre_sw(rsutcs,rsut):
+    return rsutcs - rsut
+
+@register('TOA_cre_lw', inputs=['rlutcs','rlut'], long_name='TOA LW CRE', units='W m-2')
+def _TOA_cre_lw(rlutcs,rlut):
+    return rlutcs - rlut
+
+@register('Qr_int_cre', inputs=['Qr_int','rsuscs','rsdscs','rlus','rldscs','rsdt','rsutcs','rlutcs'], long_name='Atmospheric CRE', units='W m-2')
+def _Qr_int_cre(Qr_int,rsuscs,rsdscs,rlus,rldscs,rsdt,rsutcs,rlutcs):
+    zqrcs = rsuscs - rsdscs + rlus - rldscs + rsdt - rsutcs - rlutcs
+    return Qr_int - zqrcs
+
+##################################################
+# Getting derived variables
+##################################################
+
+def get_ql(ds):
+    """
+    Get ql in dataset ds
+    """
+
+    return get_deriver(ds).get('ql')
+
 def get_qi(ds):
     """
     Get qi in dataset ds
     """
 
-    try:
-        tmp1 = ds.qi
-        tmp2 = ds.qic
-        tmp1 = tmp1.where(tmp1 > 0, other=0)
-        tmp2 = tmp2.where(tmp2 > 0, other=0)
-        tmp = tmp1 + tmp2
-        tmp.attrs['long_name'] = 'Ice water content'
-        tmp.attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing qi=qi+qic:' + str(e))
-        logger.debug('Most probably, either qi or qic does not exist in the dataset (specific to PCMT)')
-        logger.debug('Try to get qi')
-        try:
-            tmp = ds.qi
-            tmp = tmp.where(tmp > 0, other=0)
-            logger.debug('Dataset has qi. We can continue!')
-        except AttributeError as e:
-            logger.debug('Dataset has no qi: ' + str(e))
-            logger.debug('Just raise exception (AttributeError)')
-            raise
-        except:
-            raise
-        pass            
-    except:
-        raise
-
-    return tmp
+    return get_deriver(ds).get('qi')
 
 def get_qr(ds):
     """
     Get qr in dataset ds
     """
 
-    try:
-        tmp1 = ds.qr
-        tmp2 = ds.qrc
-        tmp1 = tmp1.where(tmp1 > 0, other=0)
-        tmp2 = tmp2.where(tmp2 > 0, other=0)
-        tmp = tmp1 + tmp2
-        tmp.attrs['long_name'] = 'Rain water content'
-        tmp.attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing qr=qr+qrc:' + str(e))
-        logger.debug('Most probably, either qr or qrc does not exist in the dataset (specific to PCMT)')
-        logger.debug('Try to get qr')
-        try:
-            tmp = ds.qr
-            tmp = tmp.where(tmp > 0, other=0)
-            logger.debug('Dataset has qr. We can continue!')
-        except AttributeError as e:
-            logger.debug('Dataset has no qr: ' + str(e))
-            logger.debug('Just raise exception (AttributeError)')
-            raise
-        except:
-            raise
-        pass            
-    except:
-        raise
-
-    return tmp
+    return get_deriver(ds).get('qr')
 
 def get_qsn(ds):
     """
     Get qsn in dataset ds
     """
 
-    try:
-        tmp1 = ds.qsn
-        tmp2 = ds.qsnc
-        tmp1 = tmp1.where(tmp1 > 0, other=0)
-        tmp2 = tmp2.where(tmp2 > 0, other=0)
-        tmp = tmp1 + tmp2
-        tmp.attrs['long_name'] = 'Snow water content'
-        tmp.attrs['units'] = 'kg kg-1'
-    except AttributeError as e:
-        logger.debug('Error in computing qsn=qsn+qsnc:' + str(e))
-        logger.debug('Most probably, either qsn or qsnc does not exist in the dataset (specific to PCMT)')
-        logger.debug('Try to get qsn')
-        try:
-            tmp = ds.qsn
-            tmp = tmp.where(tmp > 0, other=0)
-            logger.debug('Dataset has qsn. We can continue!')
-        except AttributeError as e:
-            logger.debug('Dataset has no qsn: ' + str(e))
-            logger.debug('Just raise exception (AttributeError)')
-            raise
-        except:
-            raise
-        pass            
-    except:
-        raise
+    return get_deriver(ds).get('qsn')
 
-    return tmp
+def get_qc(ds):
+    """
+    Get qc=ql+qi in dataset ds
+    """
+
+    return get_deriver(ds).get('qc')
+
+def get_qp(ds):
+    """
+    Get qp=qr+qsn+qg in dataset ds
+    """
+
+    return get_deriver(ds).get('qp')
 
 def get_windspeed(ds):
     """
     Get wind speed in dataset ds
     """
-    func = lambda x, y: np.sqrt(x**2 + y**2)
-    try:
-        tmp = ds.windspeed
-    except AttributeError as e:
-        logger.debug('Error in getting windspeed:' + str(e))
-        logger.debug('Try to compute it from ua and va')
-        tmp = xr.apply_ufunc(func, ds.ua, ds.va)
-        logger.debug('Windspeed has been computed')
-    except:
-       raise
 
-    tmp.attrs['long_name'] = 'Horizontal wind speed'
-    tmp.attrs['units'] = 'm s-1'
+    return get_deriver(ds).get('windspeed')
+
+def _finalize(tmp):
+    """
+    Derived variable as if it were written to and read back from a netCDF file:
+    float32, with missing values set to NaN.
+    """
+
+    tmp = tmp.astype(np.float32)
+    tmp = tmp.where(tmp != np.float32(cc.missing))
+    tmp.encoding = encoding
+    tmp.attrs["missing_value"] = np.float32(cc.missing)
 
     return tmp
 
+def derive(ds, var):
+    """
+    Compute the derived variable var from dataset ds, which is left unchanged
+    """
+
+    tmp = get_deriver(ds).get(var).copy(deep=False)
+    tmp.encoding = encoding
+    tmp.attrs["missing_value"] = np.float32(cc.missing)
+
+    return tmp
+
+def add_to_dataset(ds, variables):
+    """
+    Return a new dataset made of the variables of ds (shared, not copied)
+    and of the derived variables computed in memory. variables may be a single
+    variable name, in which case an exception is raised if it cannot be computed,
+    or a list of names, in which case the variables which cannot be computed are skipped.
+    """
+
+    return ds.assign(get_derived(ds, variables))
+
+def get_derived(ds, variables):
+    """
+    Derived variables computed from dataset ds, as they are added to it by add_to_dataset
+    """
+
+    if isinstance(variables,str):
+        derived = {variables: get_deriver(ds).get(variables)}
+    else:
+        derived = get_deriver(ds).get_all(variables)
+
+    return OrderedDict([(var, _finalize(tmp)) for var, tmp in derived.items()])
+
 def compute(filein, fileout, var):
+    """
+    Write in fileout the content of filein completed by the derived variable var
+    """
 
     with xr.open_dataset(filein) as ds:
         logger.debug('Computing ' + var + ' in ' + filein)
 
-        if var == 'zcb':
-            ds['zcb'] = f_zcb(ds.zfull, ds.cl)
-        elif var == 'zct':
-            ds['zct'] = f_zct(ds.zfull, ds.cl)
-        elif var == 'ql':
-            add_ql_to_dataset(ds)
-        elif var == 'qi':
-            add_qi_to_dataset(ds)
-        elif var == 'qc':
-            add_qc_to_dataset(ds)            
-        elif var == 'qr':
-            add_qr_to_dataset(ds)
-        elif var == 'qsn':
-            add_qsn_to_dataset(ds)
-        elif var == 'qp':
-            add_qp_to_dataset(ds)            
-        elif var == 'lwp':
-            tmp = get_ql(ds)
-            ds['lwp'] = f_int(ds.phalf, tmp)
-            ds['lwp'].attrs['long_name'] = 'Liquid water path'
-            ds['lwp'].attrs['units'] = 'kg m-2'
-        elif var == 'rwp':
-            tmp = get_qr(ds)
-            ds['rwp'] = f_int(ds.phalf, tmp)
-            ds['rwp'].attrs['long_name'] = 'Rain water path'
-            ds['rwp'].attrs['units'] = 'kg m-2'
-        elif var == 'iwp':
-            tmp = get_qi(ds)
-            ds['iwp'] = f_int(ds.phalf, tmp)
-            ds['iwp'].attrs['long_name'] = 'Ice water path'
-            ds['iwp'].attrs['units'] = 'kg m-2'
-        elif var == 'swp':
-            tmp = get_qsn(ds)
-            ds['swp'] = f_int(ds.phalf, tmp)
-            ds['swp'].attrs['long_name'] = 'Snow water path'
-            ds['swp'].attrs['units'] = 'kg m-2'
-        elif var == 'gwp':
-            ds['gwp'] = f_int(ds.phalf, ds.qg)
-            ds['gwp'].attrs['long_name'] = 'Graupel water path'
-            ds['gwp'].attrs['units'] = 'kg m-2'            
-        elif var == 'theta_0_500':
-            ds[var] = f_avg(ds.zfull,ds.theta,0,500)
-            ds[var].attrs['long_name'] = 'Potential temperature averaged over 0-500m'
-            ds[var].attrs['units'] = 'K'
-        elif var == 'qv_0_500':
-            ds[var] = f_avg(ds.zfull,ds.qv,0,500)
-            ds[var].attrs['long_name'] = 'Specific humidity averaged over 0-500m'
-            ds[var].attrs['units'] = 'kg kg-1'
-        elif var == 'theta_2000_5000':
-            ds[var] = f_avg(ds.zfull,ds.theta,2000,5000)
-            ds[var].attrs['long_name'] = 'Potential temperature averaged over 2000-5000m'
-            ds[var].attrs['units'] = 'K'
-        elif var == 'qv_2000_5000':
-            ds[var] = f_avg(ds.zfull,ds.qv,2000,5000)
-            ds[var].attrs['long_name'] = 'Specific humidity averaged over 2000-5000m'
-            ds[var].attrs['units'] = 'kg kg-1'
-        elif var == 'max_cf':
-            ds[var] = ds.cl.max(axis=1)
-            ds[var].attrs['long_name'] = 'Maximum cloud fraction'
-            ds[var].attrs['units'] = '-'
-        elif var == 'Qr_int':
-            ds[var] = ds.rsus - ds.rsds + ds.rlus - ds.rlds + ds.rsdt - ds.rsut - ds.rlut
-            ds[var].attrs['long_name'] = 'Integrated radiative heating'
-            ds[var].attrs['units'] = 'W m-2'
-        elif var == 'TOA_cre_sw':
-            ds[var] = d.rsutcs - ds.rsut
-            ds[var].attrs['long_name'] = 'TOA SW CRE'
-            ds[var].attrs['units'] = 'W m-2'
-        elif var == 'TOA_cre_lw':
-            ds[var] = ds.rlutcs - ds.rlut
-            ds[var].attrs['long_name'] = 'TOA LW CRE'
-            ds[var].attrs['units'] = 'W m-2'
-        elif var == 'Qr_int_cre':
-            zqr = ds.rsus - ds.rsds + ds.rlus - ds.rlds + ds.rsdt - ds.rsut - ds.rlut
-            zqrcs = ds.rsuscs - ds.rsdscs + ds.rlus - ds.rldscs + ds.rsdt - ds.rsutcs - ds.rlutcs
-            ds[var] = zqr-zqrcs
-            ds[var].attrs['long_name'] = 'Atmospheric CRE'
-            ds[var].attrs['units'] = 'W m-2'
-        elif var == 'thetal':
-            ds[var] = f_thetal(ds)
-        elif var == 'qt':
-            ds[var] = f_qt(ds)
-        elif var == 'windspeed':
-            ds[var] = get_windspeed(ds) 
-        else:
-            logger.error('variable to be computed is unknown:', var)
-            raise NotImplementedError
-
-        ds[var].encoding = encoding
-        ds[var].attrs["missing_value"] = np.float32(cc.missing)
+        ds[var] = derive(ds, var)
 
         ds.to_netcdf(fileout)
-
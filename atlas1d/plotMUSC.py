@@ -13,33 +13,56 @@ from collections import OrderedDict
 
 import math
 import numpy as np
-import numpy.ma as ma
 import xarray as xr
 
-from datetime import datetime, timedelta
 import cftime
 
 import atlas1d
 import atlas1d.plotutils as plotutils
-import atlas1d.constants as cc
+import atlas1d.readers as readers
+import atlas1d.timeaxis as timeaxis
+import atlas1d.vertical as vertical
+import atlas1d.regrid as regrid
+import atlas1d.timealign as timealign
+import atlas1d.downsample as downsample
+import atlas1d.instrument as instrument
+
+# Vertical coordinates possibly used to plot a variable
+_coordinates = ['zfull','zhalf','pfull','phalf']
+
+def open_reader(filein, layout=None, variables=None):
+    """
+       Return the reader of the dataset described by filein, either a netCDF
+       file name or an already opened (possibly in-memory) xarray Dataset.
+       For a file name, its store with the given layout is preferred if it
+       is up to date and has variables (see atlas1d.ingest)
+    """
 
-def plot_timeseries(filein,varname,coef=None,units='',tmin=None,tmax=None,dtlabel='1h',error=None,**kwargs):
+    return readers.open_reader(filein, layout=layout, variables=variables)
+
+def plot_timeseries(filein,varname,coef=None,units='',tmin=None,tmax=None,dtlabel='1h',ldownsample=False,error=None,**kwargs):
     """
-       Do a timeseries plot of varname for several MUSC files
+       Do a timeseries plot of varname for several MUSC files.
+       If ldownsample, lines longer than the width of the plot in pixels are reduced
+       to the min/max of the samples falling in each pixel column.
     """
 
     data = OrderedDict()
     time = {}
+    rds = {}
     if coef is None:
         coef = {k: 1. for k in filein.keys()}
 
     for k in filein.keys():
+        instrument.set_phase('read')
         try:
-            with xr.open_dataset(filein[k], use_cftime=True) as ds:
-                data[k] = np.squeeze(ds[varname[k]].data)*coef[k]
-                data[k] = np.ma.masked_where(data[k] == cc.missing, data[k])
-                time[k] = ds[varname[k]].time.data
-                kref = k
+            rd = open_reader(filein[k], layout='time', variables=[varname[k],])
+            it = get_time_slice(rd,tmin,tmax) if 'time' in rd.dims(varname[k]) else slice(None)
+            # Missing values are NaN (see atlas1d.readers)
+            data[k] = np.squeeze(rd.read(varname[k],it=it))*coef[k]
+            time[k] = rd.time()[it]
+            rds[k] = (rd, it)
+            kref = k
         except (KeyError,FileNotFoundError) as e:
             data[k] = None  
             time[k] = None
@@ -65,7 +88,7 @@ def plot_timeseries(filein,varname,coef=None,units='',tmin=None,tmax=None,dtlabe
 
     try:
         timeref = time[kref]
-        tunits = timeref[0].strftime("hours since %Y-%m-%d %H:%M:0.0")
+        tunits = timeaxis.time_units(timeref[0])
 
         if tmin is None:
             tmin = timeref[0]
@@ -80,9 +103,17 @@ def plot_timeseries(filein,varname,coef=None,units='',tmin=None,tmax=None,dtlabe
         tmin_rel = cftime.date2num(tmin, tunits)
         tmax_rel = cftime.date2num(tmax, tunits)
 
+        # Numeric times are computed once per file and units
         for k in data.keys():
-            time[k] = cftime.date2num(time[k], tunits)
+            rd, it = rds[k]
+            time[k] = rd.numeric_time(tunits)[it]
 
+        if ldownsample:
+            nbins = downsample.target_width(kwargs.get('figsize',None))
+            for k in data.keys():
+                time[k], data[k] = downsample.minmax_line(time[k], data[k], nbins)
+
+        instrument.set_phase('render')
         plotutils.plot1D(time, data,\
                 xmin=tmin_rel, xmax=tmax_rel,\
                 xlabels=tlabels,\
@@ -95,13 +126,17 @@ def plot_timeseries(filein,varname,coef=None,units='',tmin=None,tmax=None,dtlabe
         raise
 
 
-def plot_profile(filein,varname,lines=None,coef=None,units='',lev=None,levunits='km',tt=None,tmin=None,tmax=None,init=False,t0=False,lbias=False,refdataset=None,error=None,**kwargs):
+def plot_profile(filein,varname,lines=None,coef=None,units='',lev=None,levunits='km',tt=None,tmin=None,tmax=None,init=False,t0=False,lbias=False,refdataset=None,talign='nearest',error=None,**kwargs):
     """
-       Do a profile plot of varname for several MUSC files
+       Do a profile plot of varname for several MUSC files.
+       For biases of instantaneous profiles, the reference is aligned on the time of
+       each dataset with the mode talign (see atlas1d.timealign)
     """
 
     data = OrderedDict()
     level = {}
+    # Instantaneous profiles: reader, level slice, levels and times around the profile
+    selected = {}
     if coef is None:
         coef = {k: 1. for k in filein.keys()}
     
@@ -111,57 +146,70 @@ def plot_profile(filein,varname,lines=None,coef=None,units='',lev=None,levunits=
       lev = {k: lev for k in filein.keys()}
 
     for i,k in enumerate(filein.keys()):
+        instrument.set_phase('read')
         try:
-            with xr.open_dataset(filein[k], use_cftime=True) as ds:
-                time = ds[varname[k]].time.data
-                if tmin is not None and tmax is not None:
+            rd = open_reader(filein[k], layout='level', variables=[varname[k],]+_coordinates)
+            nlev = rd.shape(varname[k])[-1]
+            time = rd.time()
 
-                    data[k] = np.ma.average(ds[varname[k]].sel(time=slice(tmin,tmax)).data,axis=0)*coef[k]
-                    level[k] = get_level(ds, lev[k], nlev=data[k].shape[0])
+            # Only the levels to be plotted are read
+            levloc = get_level(rd, lev[k], nlev=nlev)
+            ilev, _ = get_level_slice(get_level(rd, lev[k], nlev=nlev, units=levunits), nlev,
+                                      kwargs.get('ymin',None), kwargs.get('ymax',None))
+            levloc = levloc[...,ilev]
 
-                    if len(level[k].shape) == 2:
-                        level[k] = np.ma.average(level[k].sel(time=slice(tmin,tmax)).data,axis=0)
+            if tmin is not None and tmax is not None:
 
-                elif t0:
+                it = get_time_window(rd,tmin,tmax)
+                data[k] = time_mean(rd.read(varname[k],it=it,ilev=ilev))*coef[k]
+                level[k] = levloc
 
-                    data[k] = ds[varname[k]].data[0,:]*coef[k]
-                    level[k] = get_level(ds, lev[k], nlev=data[k].shape[0])
+                if len(level[k].shape) == 2:
+                    level[k] = time_mean(level[k][it])
 
-                    if len(level[k].shape) == 2:
-                        level[k] = level[k].data[0,:]
+            elif t0:
 
-                elif tt is not None:
+                data[k] = rd.read(varname[k],it=slice(0,1),ilev=ilev)[0,:]*coef[k]
+                level[k] = levloc
 
-                    if tmin is None:
-                        tmin = time[0]
-                    if tmax is None:
-                        tmax = time[-1]
+                if len(level[k].shape) == 2:
+                    level[k] = level[k][0,:]
 
-                    logger.debug('tmin = ' + tmin.isoformat())
-                    logger.debug('tmax = ' + tmax.isoformat())
+            elif tt is not None:
 
-                    if isinstance(tt,int):
-                        tt = time[tt]
-                    else:
-                        if tt < tmin:
-                            logger.info('tt={0} is lower than tmin={1}'.format(tt.isoformat(),tmin.isoformat()))
-                        if tt > tmax:
-                            logger.info('tt={0} is greatet than tmax={1}'.format(tt.isoformat(),tmax.isoformat()))
+                if tmin is None:
+                    tmin = time[0]
+                if tmax is None:
+                    tmax = time[-1]
 
-                    logger.debug('dataset = ' + k)
-                    logger.debug('tt = ' + tt.isoformat())
+                logger.debug('tmin = ' + tmin.isoformat())
+                logger.debug('tmax = ' + tmax.isoformat())
 
-                    data[k] = ds[varname[k]].sel(time=tt, method='nearest').data*coef[k]
-                    level[k] = get_level(ds, lev[k], nlev=data[k].shape[0])
+                if isinstance(tt,int):
+                    tt = time[tt]
+                else:
+                    if tt < tmin:
+                        logger.info('tt={0} is lower than tmin={1}'.format(tt.isoformat(),tmin.isoformat()))
+                    if tt > tmax:
+                        logger.info('tt={0} is greatet than tmax={1}'.format(tt.isoformat(),tmax.isoformat()))
 
-                    if len(level[k].shape) == 2:
-                        level[k] = level[k].sel(time=tt, method='nearest').data
+                logger.debug('dataset = ' + k)
+                logger.debug('tt = ' + tt.isoformat())
 
-                else:
-                    logger.error('Case unexpected : tmin, tmax and tt are None and t0 is False')
-                    raise ValueError
-                    
-                kref = k
+                it = get_time_nearest(rd,tt)
+                data[k] = rd.read(varname[k],it=slice(it,it+1),ilev=ilev)[0]*coef[k]
+                level[k] = levloc
+                i0 = max(it-1,0)
+                selected[k] = (rd, ilev, levloc, time[i0:it+2], it-i0)
+
+                if len(level[k].shape) == 2:
+                    level[k] = level[k][it]
+
+            else:
+                logger.error('Case unexpected : tmin, tmax and tt are None and t0 is False')
+                raise ValueError
+                
+            kref = k
 
         except (KeyError, AttributeError, FileNotFoundError) as e:
             data[k] = None
@@ -191,18 +239,18 @@ def plot_profile(filein,varname,lines=None,coef=None,units='',lev=None,levunits=
             level[k] = update_level(level[k], lev[k], levunits)
 
     if init: # Adding initial profiles on plot
-        if not(os.path.exists(filein[kref])):
+        if not(isinstance(filein[kref], xr.Dataset)) and not(os.path.exists(filein[kref])):
             raise ValueError('The following file does not exist: ' + filein[kref])
-        with xr.open_dataset(filein[kref]) as ds:
-            data['init'] = ds[varname[kref]].data[0,:]*coef[k]
-            tmp = get_level(ds, lev[kref], nlev=data['init'].shape[0])
-            if len(tmp.shape) == 2:
-                level['init'] = tmp[0,:]
-            elif len(tmp.shape) == 1:
-                level['init'] = tmp[:]
-            else:
-                logger.error('level shape unexpected:', tmp.shape)
-                raise ValueError
+        rd = open_reader(filein[kref], layout='level', variables=[varname[kref],]+_coordinates)
+        data['init'] = rd.read(varname[kref],it=slice(0,1))[0,:]*coef[k]
+        tmp = get_level(rd, lev[kref], nlev=data['init'].shape[0])
+        if len(tmp.shape) == 2:
+            level['init'] = tmp[0,:]
+        elif len(tmp.shape) == 1:
+            level['init'] = tmp[:]
+        else:
+            logger.error('level shape unexpected:', tmp.shape)
+            raise ValueError
 
         level['init'] = update_level(level['init'], lev[kref], levunits)
 
@@ -217,17 +265,32 @@ def plot_profile(filein,varname,lines=None,coef=None,units='',lev=None,levunits=
             logger.error('please provide reference dataset (keyword refdataset) to compute bias)')
             raise ValueError
         else: 
+            # The reference is interpolated on the levels of each dataset (see atlas1d.regrid)
             for k in data.keys():
                 if not(k == refdataset):
-                    data[k] = data[k]-data[refdataset]
+                    dataref = data[refdataset]
+                    levelref = level[refdataset]
+                    if k in selected and refdataset in selected:
+                        # Instantaneous profiles: the reference is aligned on the time of the dataset
+                        rd, ilev, levloc = selected[refdataset][0:3]
+                        dataref, levelref = get_profile_aligned(rd, varname[refdataset], ilev, levloc,
+                                                                selected[k][3], selected[k][4], talign)
+                        dataref = dataref*coef[refdataset]
+                        levelref = update_level(levelref, lev[refdataset], levunits)
+                    data[k] = regrid.bias(data[k],level[k],dataref,levelref)
             data[refdataset] = data[refdataset]*0.
 
+    instrument.set_phase('render')
     plotutils.plot1D(data,level,lines=lines,**kwargs)
 
 
-def plot2D(filein,varname,coef=None,units='',lev=None,levunits=None,tmin=None,tmax=None,dtlabel='1h',namefig=None,lbias=False,refdataset=None,error=None,**kwargs):
+def plot2D(filein,varname,coef=None,units='',lev=None,levunits=None,tmin=None,tmax=None,dtlabel='1h',namefig=None,lbias=False,refdataset=None,talign='nearest',ldownsample=False,error=None,**kwargs):
     """
-       Do a 2D plot of varname for several MUSC file
+       Do a 2D plot of varname for several MUSC file.
+       If ldownsample, fields with more time steps than the width of the plot in pixels
+       are averaged over blocks of time steps.
+       For biases, the reference is aligned on the times of each dataset with the
+       mode talign (see atlas1d.timealign).
     """
 
     #print('Plot2D', kwargs['title'], filein)
@@ -263,110 +326,130 @@ def plot2D(filein,varname,coef=None,units='',lev=None,levunits=None,tmin=None,tm
     elif isinstance(levunits,str):
         levunits = {k: levunits for k in filein.keys()}
 
-    datasets = filein.keys()
+    datasets = list(filein.keys())
     if lbias:
         if refdataset is None:
             logger.error('please provide reference dataset (keyword refdataset) to compute bias)')
             raise ValueError
         else: 
-            with xr.open_dataset(filein[refdataset]) as ds:
-                dataref = ds[varname[refdataset]].data*coef[refdataset]
+            rdref = open_reader(filein[refdataset], layout='time', variables=[varname[refdataset],]+_coordinates)
+            itref = get_time_slice(rdref,tmin,tmax) if 'time' in rdref.dims(varname[refdataset]) else slice(None)
+            dataref = rdref.read(varname[refdataset],it=itref)*coef[refdataset]
             datasets.remove(refdataset)
 
     for k in datasets:
+        instrument.set_phase('read')
         try:
-            with xr.open_dataset(filein[k], use_cftime=True) as ds:
-                data = ds[varname[k]].data*coef[k]
-                if lbias:
-                    nt,_ = data.shape
-                    data = data-dataref[0:nt,:]
-
-                time = ds[varname[k]].time.data
-                tunits = time[0].strftime("hours since %Y-%m-%d %H:%M:0.0")
-
-                if tmin is None:
-                    tmin = time[0]
-                logger.debug('tmin = ' + tmin.isoformat())
+            # Time-height plots read whole time series of the levels to be plotted
+            rd = open_reader(filein[k], layout='time', variables=[varname[k],]+_coordinates)
+            nlev0 = rd.shape(varname[k])[-1]
+            # Only the time window to be plotted is read
+            it = get_time_slice(rd,tmin,tmax)
+
+            time = rd.time()[it]
+            tunits = timeaxis.time_units(time[0])
+
+            if tmin is None:
+                tmin = time[0]
+            logger.debug('tmin = ' + tmin.isoformat())
       
-                if tmax is None:
-                    tmax = time[-1]
-                logger.debug('tmax = ' + tmax.isoformat())
-
-                tlabels = get_time_labels(tmin, tmax, tunits, dtlabel)
-
-                tmin_rel = cftime.date2num(tmin, tunits)
-                tmax_rel = cftime.date2num(tmax, tunits)
-
-                time = cftime.date2num(time, tunits)
-                dt = time[1] - time[0]
-
-                nt0, nlev0 = data.shape
-                time1 = np.zeros(nt0+1)
-                time1[0:nt0] = time[:]-dt/2
-                time1[nt0] = time[-1]+dt/2
-
-                try:
-                    levax = ds[lev[k]].data
-                except:
-                    if lev[k] == 'zhalf':
-                        levax = ds.zfull.data
-                    if lev[k] == 'phalf':
-                        levax = ds.pfull.data 
-
-                try:
-                    zorog = np.min(ds['zhalf'].data)
-                except:
-                    zorog = np.min(ds.zfull.data)
-
-                levax -= zorog
-
-                levax = update_level(levax, lev[k], levunits[k])
+            if tmax is None:
+                tmax = time[-1]
+            logger.debug('tmax = ' + tmax.isoformat())
+
+            tlabels = get_time_labels(tmin, tmax, tunits, dtlabel)
+
+            tmin_rel = cftime.date2num(tmin, tunits)
+            tmax_rel = cftime.date2num(tmax, tunits)
+
+            time = rd.numeric_time(tunits)[it]
+            dt = time[1] - time[0]
+
+            nt0 = time.shape[0]
+            time1 = np.zeros(nt0+1)
+            time1[0:nt0] = time[:]-dt/2
+            time1[nt0] = time[-1]+dt/2
+
+            levax = get_level(rd, lev[k], units=levunits[k])
+            if len(levax.shape) == 2:
+                levax = levax[it]
+
+            # Only the levels to be plotted are read
+            ilev, iax = get_level_slice(levax, nlev0, kwargs.get('ymin',None), kwargs.get('ymax',None))
+            levax = levax[...,iax]
+            data = rd.read(varname[k],it=it,ilev=ilev)*coef[k]
+            if lbias:
+                # The reference is aligned on the times of the dataset (see atlas1d.timealign)
+                # and interpolated on its levels (see atlas1d.regrid)
+                tref = rdref.numeric_time(tunits)[itref]
+                level = get_level(rd, lev[k], nlev=nlev0)
+                level = level[it,ilev] if len(level.shape) == 2 else level[ilev]
+                levelref = get_level(rdref, lev[refdataset], nlev=dataref.shape[-1])
+                if len(levelref.shape) == 2:
+                    levelref = align_level(levelref[itref], tref, time, talign)
+                data = regrid.bias(data,level,timealign.align(dataref,tref,time,talign),levelref)
+            nlev0 = data.shape[1]
       
-                if len(levax.shape) == 2:
-                    nt,nlev = levax.shape
-                    if nlev == nlev0+1:
-                        time = time1
-                        levax1 = np.zeros((nt0+1,nlev))
-                        levax1[0,:] = levax[0,:]
-                        levax1[1:nt0+1,:] = levax[:,:]
-                        levax = levax1
-                else:
-                    nlev, = levax.shape
-                    if nlev == nlev0+1:
-                        time = time1
-                    nt, = time.shape
-                    levax = np.tile(levax,(nt,1))
-
-                timeax = np.tile(time[:],(nlev,1))
-
-                X = np.array(timeax[:])
-                Y = np.transpose(levax[:])
-
-                if isinstance(namefig,str):
-                    tmp = k + '_' + namefig
-                elif isinstance(namefig,dict):
-                    tmp = namefig[k]
-                elif namefig is None:
-                    tmp = None
-                else:
-                    logger.error('namefig type unexpected:', namefig)
-                    raise ValueError
-
-                kwargs['title'] = '{0} - {1}'.format(title0,k)
-                #print(kwargs['title'])
-
-                #print(X.shape)
-                #print('X, min, max=', np.min(X), np.max(X))
-                #print(Y.shape)
-                #print('Y, min, max=', np.min(Y), np.max(Y))
-                #print(data.shape)
-                #print('data, min, max=', np.min(data), np.max(data))
+            if len(levax.shape) == 2:
+                nt,nlev = levax.shape
+                if nlev == nlev0+1:
+                    time = time1
+                    levax1 = np.zeros((nt0+1,nlev),dtype=levax.dtype)
+                    levax1[0,:] = levax[0,:]
+                    levax1[1:nt0+1,:] = levax[:,:]
+                    levax = levax1
+            else:
+                nlev, = levax.shape
+                if nlev == nlev0+1:
+                    time = time1
+                nt, = time.shape
+                # Time-invariant levels: broadcast view instead of a copy
+                levax = np.broadcast_to(levax,(nt,nlev))
+
+            X = np.broadcast_to(time[:],(nlev,time.shape[0]))
+            Y = np.transpose(levax)
+
+            if isinstance(namefig,str):
+                tmp = k + '_' + namefig
+            elif isinstance(namefig,dict):
+                tmp = namefig[k]
+            elif namefig is None:
+                tmp = None
+            else:
+                logger.error('namefig type unexpected:', namefig)
+                raise ValueError
 
-                plotutils.plot2D(X,Y,ma.transpose(data),\
-                    xmin=tmin_rel, xmax=tmax_rel,\
-                    xlabels=tlabels,\
-                    namefig=tmp,\
-                    **kwargs)
+            kwargs['title'] = '{0} - {1}'.format(title0,k)
+            #print(kwargs['title'])
+
+            #print(X.shape)
+            #print('X, min, max=', np.min(X), np.max(X))
+            #print(Y.shape)
+            #print('Y, min, max=', np.min(Y), np.max(Y))
+            #print(data.shape)
+            #print('data, min, max=', np.min(data), np.max(data))
+
+            data = np.transpose(data)
+
+            plotdico = dict(kwargs)
+            if ldownsample:
+                if plotdico.get('minmax',False) is True:
+                    # min and max of the full resolution data
+                    ymin = plotdico.get('ymin',None)
+                    ymax = plotdico.get('ymax',None)
+                    if ymin is None:
+                        ymin = np.nanmin(Y)
+                    if ymax is None:
+                        ymax = np.nanmax(Y)
+                    plotdico['minmax'] = plotutils.get_minmax(X,Y,data,tmin_rel,tmax_rel,ymin,ymax)
+                X, Y, data = downsample.block_mesh(X,Y,data,downsample.target_width(plotdico.get('figsize',None)))
+
+            instrument.set_phase('render')
+            plotutils.plot2D(X,Y,data,\
+                xmin=tmin_rel, xmax=tmax_rel,\
+                xlabels=tlabels,\
+                namefig=tmp,\
+                **plotdico)
 
         except (KeyError, AttributeError, FileNotFoundError) as e:
             logger.debug('Variable {2} probably unknown in dataset {0} (file={1})'.format(k,filein[k],varname[k]))
@@ -387,127 +470,104 @@ def plot2D(filein,varname,coef=None,units='',lev=None,levunits=None,tmin=None,tm
         except:
             raise
 
-def get_time_labels(tmin, tmax, tunits, dtlabel):
+def get_time_slice(rd, tmin=None, tmax=None):
+    """
+       Index slice of the time axis of reader rd covering [tmin,tmax], with margins
+       (see atlas1d.timeaxis, also used to read only this window of datasets)
+    """
 
-    tt = []
-    tlabels = []
-
-    if dtlabel == '1h':
-
-        tmin0 = datetime(tmin.year,tmin.month,tmin.day,tmin.hour)
-        t0 = tmin0 + timedelta(hours=0)
-        while t0 <= tmax:
-            if t0 >= tmin: 
-                tt.append(cftime.date2num(t0, tunits))
-                tlabels.append('{0}'.format(t0.hour))
-            t0 = t0 + timedelta(hours=1)
-
-    elif dtlabel == '2h':
-
-        tmin0 = datetime(tmin.year,tmin.month,tmin.day,tmin.hour)
-        t0 = tmin0 + timedelta(hours=0)
-        while t0 <= tmax:
-            if t0 >= tmin: 
-                tt.append(cftime.date2num(t0, tunits))
-                tlabels.append('{0}'.format(t0.hour))
-            t0 = t0 + timedelta(hours=2)
-
-    elif dtlabel == '3h':
-
-        tmin0 = datetime(tmin.year,tmin.month,tmin.day,tmin.hour)
-        t0 = tmin0 + timedelta(hours=0)
-        while t0 <= tmax:
-            if t0 >= tmin: 
-                tt.append(cftime.date2num(t0, tunits))
-                tlabels.append('{0}'.format(t0.hour))
-            t0 = t0 + timedelta(hours=3)
-
-    elif dtlabel == '6h':
-
-        tmin0 = datetime(tmin.year,tmin.month,tmin.day,tmin.hour)
-        t0 = tmin0 + timedelta(hours=0)
-        while t0 <= tmax:
-            if t0 >= tmin: 
-                tt.append(cftime.date2num(t0, tunits))
-                tlabels.append('{0}'.format(t0.hour))
-            t0 = t0 + timedelta(hours=6)
-        
-    elif dtlabel == '10d':
-
-        tmin0 = datetime(tmin.year,tmin.month,tmin.day,tmin.hour)
-        t0 = tmin0 + timedelta(hours=0)
-        while t0 <= tmax:
-            if t0 >= tmin:
-                tt.append(cftime.date2num(t0, tunits))
-                tlabels.append('{0}/{1}'.format(t0.month,t0.day))
-            if t0.day == 1:
-                t0 = cftime.datetime(t0.year,t0.month,10,0)
-            elif t0.day == 10:
-                t0 = cftime.datetime(t0.year,t0.month,20,0)
-            elif t0.day == 20:
-                if t0.month == 12:
-                    t0 = cftime.datetime(t0.year+1,1,1,0)
-                else:
-                    t0 = cftime.datetime(t0.year,t0.month+1,1,0)
-            else:
-                t0 = t0 + timedelta(days=10)
+    return timeaxis.time_slice(rd, tmin, tmax)
 
-    else:
+def get_numeric_time(rd):
+    """
+       Time axis of reader rd in hours since its first time, and its units (see atlas1d.timeaxis)
+    """
 
-        logger.error('dtlabel={} not coded yet'.format(dtlabel))
-        raise NotImplementedError
+    return timeaxis.numeric_time(rd)
 
-    return tt, tlabels
+def get_time_window(rd, tmin, tmax):
+    """
+       Index slice of the times of reader rd within [tmin,tmax] (see atlas1d.timeaxis)
+    """
 
-def get_level(ds, lev, nlev=None):
+    return timeaxis.time_window(rd, tmin, tmax)
 
-    if lev == 'zfull':
-        level = ds[lev]
-    elif lev == 'zhalf':
-        try:
-            level = ds[lev]
-        except:
-            try:
-                level = ds['zfull']
-            except:
-                raise
-    elif lev == 'pfull':
-        level = ds[lev]
-    elif lev == 'phalf':
-        try:
-            level = ds[lev]
-        except:
-            try:
-                level = ds['pfull']
-            except:
-                raise
-    else:
-        logger.error('Level unexpected: {0}'.forma(lev))
-        raise NotImplementedError
+def time_mean(data):
+    """
+       Average of data over time (first axis), ignoring missing values (NaN).
+       The average is NaN where all values are missing.
+    """
 
-    if nlev is not None:
-        if len(level.shape) == 2:
-            _, nlev_loc = level.shape
-        else:
-            nlev_loc, = level.shape
-
-        if nlev != nlev_loc:
-            if lev == 'zfull':
-                level = ds['zhalf']
-            elif lev == 'zalfh':
-                level = ds['zfull']
-            elif lev == 'pfull':
-                level = ds['phalf']
-            elif lev == 'phalf':
-                level = ds['pfull']
-
-    if lev in ['zfull', 'zhalf']:
-        try:
-            zorog = np.min(ds['zhalf'].data)
-        except:
-            zorog = np.min(ds.zfull.data)
+    count = np.sum(~np.isnan(data), axis=0)
+    total = np.nansum(data, axis=0)
+
+    return np.where(count > 0, total/np.maximum(count, 1).astype(total.dtype), np.nan)
+
+def get_time_nearest(rd, tt):
+    """
+       Index of the time of reader rd nearest to tt (see atlas1d.timeaxis)
+    """
+
+    return timeaxis.time_nearest(rd, tt)
+
+def align_level(level, src, tgt, mode):
+    """
+       Time-varying levels at times src aligned on times tgt (see atlas1d.timealign).
+       Levels are defined at all target times: those outside the source times are
+       the nearest ones, and cells without source time in mean mode use the
+       nearest ones too.
+    """
+
+    lmode = 'linear' if mode == 'linear' else 'nearest'
+
+    return timealign.align(level, src, tgt, lmode, lextrapolate=True)
+
+def get_profile_aligned(rd, varname, ilev, level, dates, it, mode):
+    """
+       Profile of varname (level index slice ilev) of reader rd and its levels
+       level (possibly time-varying), aligned with the mode on the times dates
+       (see atlas1d.timealign), at dates[it]. Neighbours of dates[it] bound its
+       cell in mean mode. Only the times the profile depends on are read.
+    """
+
+    trel, tunits = get_numeric_time(rd)
+    tgt = cftime.date2num(dates, tunits)
+
+    tmap = timealign.get_map(trel, tgt, mode)
+    data = tmap.apply_at(rd.read(varname,it=tmap.sources(it),ilev=ilev), it)
+    if len(level.shape) == 2:
+        level = align_level(level, trel, tgt, mode)[it]
+
+    return data, level
+
+def get_level_slice(level, nlev, ymin=None, ymax=None):
+    """
+       Index slices of the nlev data levels and of the level axis covering
+       [ymin,ymax], with margins (see atlas1d.vertical, also used to read
+       only this range of datasets)
+    """
+
+    return vertical.level_slice(level, nlev, ymin, ymax)
+
+def get_time_labels(tmin, tmax, tunits, dtlabel):
+    """
+       Positions and labels of time ticks every dtlabel (see atlas1d.timeaxis)
+    """
+
+    return timeaxis.get_ticks(tmin, tmax, tunits, dtlabel)
+
+def get_level(rd, lev, nlev=None, units=None):
+    """
+       Array of the level lev (relative to the surface for heights) of the dataset
+       of reader rd, matching nlev levels if given, in units (SI units if None).
+       Levels are computed once per dataset (see atlas1d.vertical) and must not be
+       modified. Time-invariant levels are given as a single profile.
+    """
 
-        level -= zorog
+    vc = vertical.get_vertical(rd)
+    level = vc.level(lev, nlev=nlev, units=units)
+    if level.ndim == 2 and vc.ltime_invariant(lev, nlev=nlev):
+        level = level[0]
 
     return level
 
@@ -4,30 +4,112 @@
 # This software is governed by the CeCILL-C license under French law.
 # http://www.cecill.info
 
+"""
+Rendering of 1D and 2D plots.
+
+Figures are built as Figure objects drawn on their own Agg canvas, without
+the pyplot state machine (only used to show figures interactively), so that
+several figures may be rendered concurrently. Custom colormaps and norms
+are cached.
+"""
+
+import threading
+
 import numpy as np
 import numpy.ma as ma
-import matplotlib.pyplot as plt
-plt.set_loglevel('error')
-from matplotlib.colors import BoundaryNorm
-from copy import copy
+import matplotlib
+matplotlib.set_loglevel('error')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import BoundaryNorm, LinearSegmentedColormap
+
+import atlas1d.instrument as instrument
+
+_lock = threading.Lock()
+_cmaps = {}
+_norms = {}
+
+def new_figure(figsize=None,lshow=False):
+    """
+       New figure with one axes. Only figures to be shown are managed by pyplot.
+    """
+
+    if lshow:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=figsize)
+    else:
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+
+    return fig, fig.add_subplot()
+
+def close_figure(fig,namefig=None):
+    """
+       Save fig in namefig or show it if namefig is None
+    """
+
+    if namefig is None:
+        import matplotlib.pyplot as plt
+        plt.show()
+        plt.close(fig)
+    else:
+        instrument.save_figure(fig,namefig)
+
+def get_cmap(cmap,nn,firstwhite=False,badcolor='darkgrey'):
+    """
+       Colormap cmap without its nn first and last colors (the first one being white
+       if firstwhite), extended with them. cmap may be given by its name.
+       Colormaps are built once and cached.
+    """
+
+    if isinstance(cmap,str):
+        cmap = matplotlib.colormaps[cmap]
+
+    # Colormaps are identified by their colors, as different colormaps may have the same name
+    key = (cmap.name, cmap(np.arange(cmap.N)).tobytes(), nn, firstwhite, badcolor)
+
+    with _lock:
+        if not(key in _cmaps):
+            cmaplist = [cmap(i) for i in range(cmap.N-1)]
+            if firstwhite:
+                cmaplist[nn] = (1,1,1,0)
+            cmaploc = LinearSegmentedColormap.from_list('Custom cmap',cmaplist[nn:-nn], len(cmaplist[nn:-nn]))
+            cmaploc.set_over(cmaplist[-1])
+            cmaploc.set_under(cmaplist[0])
+            cmaploc.set_bad(badcolor)
+            _cmaps[key] = cmaploc
+
+        return _cmaps[key]
+
+def get_norm(levels,ncolors):
+    """
+       BoundaryNorm for levels, built once and cached
+    """
+
+    key = (tuple(levels), ncolors)
+
+    with _lock:
+        if not(key in _norms):
+            _norms[key] = BoundaryNorm(levels, ncolors=ncolors, clip=False)
+
+        return _norms[key]
 
 def plot1D(x,y,lines=None,title='',xname='',yname='',xlabels=None,ylabels=None,xmin=None,xmax=None,ymin=None,ymax=None,namefig=None,lgrid=False,figsize=None):
     """
        Make a simple 1D plot
     """
 
-    if not(figsize is None):
-        plt.figure(figsize=figsize)
+    fig, ax = new_figure(figsize=figsize,lshow=(namefig is None))
 
     if lines is None:
         for k in x.keys():
-            cs = plt.plot(x[k],y[k],label=k)
+            cs = ax.plot(x[k],y[k],label=k)
     else:
         for k in x.keys():
             if k in lines:
-                cs = plt.plot(x[k],y[k],lines[k],label=k)
+                cs = ax.plot(x[k],y[k],lines[k],label=k)
             else:
-                cs = plt.plot(x[k],y[k],label=k)
+                cs = ax.plot(x[k],y[k],label=k)
 
     if xmin is None:
         xmin = 1.e20
@@ -48,130 +130,191 @@ def plot1D(x,y,lines=None,title='',xname='',yname='',xlabels=None,ylabels=None,x
             ymax = max(ymax,np.nanmax(y[k]))
 
 
-    plt.xlim(xmin,xmax)
-    plt.ylim(ymin,ymax)
+    ax.set_xlim(xmin,xmax)
+    ax.set_ylim(ymin,ymax)
     if xlabels is not None:
-        plt.xticks(xlabels[0][:],xlabels[1][:])
+        ax.set_xticks(xlabels[0][:])
+        ax.set_xticklabels(xlabels[1][:])
     if ylabels is not None:
-        plt.yticks(ylabels[0][:],ylabels[1][:])
+        ax.set_yticks(ylabels[0][:])
+        ax.set_yticklabels(ylabels[1][:])
 
-    plt.legend(loc='best')
-    plt.title(title)
-    plt.xlabel(xname)
-    plt.ylabel(yname)
+    ax.legend(loc='best')
+    ax.set_title(title)
+    ax.set_xlabel(xname)
+    ax.set_ylabel(yname)
 
     if lgrid:
-        plt.grid(True,linestyle='--')
+        ax.grid(True,linestyle='--')
 
-    if namefig is None:
-        plt.show()
+    close_figure(fig,namefig)
+
+def _centers2edges(c):
+
+    e = np.zeros(c.shape[0]+1)
+    e[1:-1] = (c[:-1]+c[1:])/2.
+    e[0] = c[0] - (c[1]-c[0])/2.
+    e[-1] = c[-1] + (c[-1]-c[-2])/2.
+
+    return e
+
+def get_edges(x,y,data):
+    """
+       If the mesh (x,y) of data is rectilinear (x only varies along columns
+       and y along rows), return the increasing 1D cell edges along both axes
+       and data ordered accordingly. Return None otherwise.
+    """
+
+    if not(x.ndim == 2 and y.ndim == 2) or ma.is_masked(x) or ma.is_masked(y):
+        return None
+
+    x = ma.getdata(x)
+    y = ma.getdata(y)
+
+    # Broadcast views (null stride) are rectilinear without further check
+    if not(x.strides[0] == 0) and not(np.all(x == x[:1,:])):
+        return None
+    if not(y.strides[1] == 0) and not(np.all(y == y[:,:1])):
+        return None
+
+    ny, nx = data.shape
+    xe = np.asarray(x[0,:], dtype=np.float64)
+    ye = np.asarray(y[:,0], dtype=np.float64)
+
+    if not(np.all(np.isfinite(xe)) and np.all(np.isfinite(ye))) or nx < 2 or ny < 2:
+        return None
+
+    if xe.shape[0] == nx:
+        xe = _centers2edges(xe)
+    if ye.shape[0] == ny:
+        ye = _centers2edges(ye)
+    if not(xe.shape[0] == nx+1 and ye.shape[0] == ny+1):
+        return None
+
+    # Edges must be strictly monotonic, and are given increasing
+    dx = np.diff(xe)
+    dy = np.diff(ye)
+    if np.all(dx < 0):
+        xe = xe[::-1]
+        data = data[:,::-1]
+    elif not(np.all(dx > 0)):
+        return None
+    if np.all(dy < 0):
+        ye = ye[::-1]
+        data = data[::-1,:]
+    elif not(np.all(dy > 0)):
+        return None
+
+    return xe, ye, data
+
+def get_minmax(x,y,data,xmin,xmax,ymin,ymax):
+    """
+       Minimum and maximum of data on the cells of mesh (x,y) within the plot limits.
+       Missing values (NaN or masked) are ignored; 1.e20 and -1.e20 are returned
+       if there is no value. The window is selected in one pass over the mesh,
+       as a block of rows and columns of data for rectilinear meshes.
+    """
+
+    nx,ny = data.shape
+    x = x[:nx,:ny]
+    y = y[:nx,:ny]
+    if ymin > ymax: # e.g., pressure axis
+        ymin, ymax = ymax, ymin
+
+    if ma.isMaskedArray(data):
+        data = ma.filled(data.astype(np.float32 if data.dtype.itemsize <= 4 else np.float64), np.nan)
+
+    # Broadcast views (null stride) are rectilinear without further check
+    if x.strides[0] == 0 and y.strides[1] == 0:
+        icol = (x[0,:] >= xmin) & (x[0,:] <= xmax)
+        irow = (y[:,0] >= ymin) & (y[:,0] <= ymax)
+        window = data[np.ix_(irow,icol)]
     else:
-        plt.savefig(namefig)
+        window = data[(x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)]
+
+    # fmin/fmax ignore NaN, without warning on empty or all-NaN windows
+    mini = np.fmin.reduce(window, axis=None, initial=np.inf)
+    maxi = np.fmax.reduce(window, axis=None, initial=-np.inf)
 
-    plt.close()
+    if np.isinf(mini):
+        mini = 1.e20
+    if np.isinf(maxi):
+        maxi = -1.e20
 
-def plot2D(x,y,data,cmap=plt.cm.RdBu,levels=None,firstwhite=False,badcolor='darkgrey',extend='neither',title='',xname='',yname='',xlabels=None,ylabels=None,xmin=None,xmax=None,ymin=None,ymax=None,namefig=None,minmax=False,lgrid=False,figsize=None):
+    return mini, maxi
+
+def plot2D(x,y,data,cmap='RdBu',levels=None,firstwhite=False,badcolor='darkgrey',extend='neither',title='',xname='',yname='',xlabels=None,ylabels=None,xmin=None,xmax=None,ymin=None,ymax=None,namefig=None,minmax=False,lgrid=False,figsize=None):
     """
-       Make a simple 2D plot
+       Make a simple 2D plot.
+       minmax may be True, to display the min and max of data within the plot limits,
+       or a (min,max) tuple of values to display.
     """
 
-    if not(figsize is None):
-        plt.figure(figsize=figsize)
+    fig, ax = new_figure(figsize=figsize,lshow=(namefig is None))
 
     if levels is None:
         nn = 20
     else:
         nn = 255//len(levels)
 
-    cmaploc = copy(cmap)
-    cmaplist = [cmaploc(i) for i in range(cmaploc.N-1)]
-    if firstwhite:
-        cmaplist[nn] = (1,1,1,0)
-    cmaploc = cmaploc.from_list('Custom cmap',cmaplist[nn:-nn], len(cmaplist[nn:-nn]))
-    cmaploc.set_over(cmaplist[-1])
-    cmaploc.set_under(cmaplist[0])
-    cmaploc.set_bad(badcolor)
+    cmaploc = get_cmap(cmap,nn,firstwhite=firstwhite,badcolor=badcolor)
 
-    #print(x.shape)
-    #print(y.shape)
-    #print(data.shape)
+    if levels is None:
+        norm = None
+    else:
+        norm = get_norm(levels,cmaploc.N)
+
+    edges = get_edges(x,y,data)
+    if edges is None: # grid varying in time
+        cs = ax.pcolormesh(x,y,data, cmap=cmaploc, norm=norm, shading='auto')
+    else: # image-based path, much faster
+        xedges, yedges, dataloc = edges
+        cs = ax.pcolorfast(xedges,yedges,dataloc, cmap=cmaploc, norm=norm)
 
     if levels is None:
-        cs = plt.pcolormesh(x,y,data, cmap=cmaploc, shading='auto')
-        plt.colorbar(cs,extend=extend) 
+        fig.colorbar(cs,extend=extend) 
     else:
-        norm = BoundaryNorm(levels, ncolors=cmaploc.N, clip=False)
-        cs = plt.pcolormesh(x,y,data, cmap=cmaploc, norm=norm, shading='auto')
-        plt.colorbar(cs,ticks=levels,extend=extend)
+        fig.colorbar(cs,ticks=levels,extend=extend)
 
     if xmin is None:
-        xmin = ma.min(x)
+        xmin = np.nanmin(x)
     if xmax is None:
-        xmax = ma.max(x)
+        xmax = np.nanmax(x)
     if ymin is None:
-        ymin = ma.min(y)
+        ymin = np.nanmin(y)
     if ymax is None:
-        ymax = ma.max(y)
+        ymax = np.nanmax(y)
 
 
-    plt.xlim(xmin,xmax)
-    plt.ylim(ymin,ymax)
+    ax.set_xlim(xmin,xmax)
+    ax.set_ylim(ymin,ymax)
     if xlabels is not None:
-        plt.xticks(xlabels[0][:],xlabels[1][:])
+        ax.set_xticks(xlabels[0][:])
+        ax.set_xticklabels(xlabels[1][:])
     if ylabels is not None:
-        plt.yticks(ylabels[0][:],ylabels[1][:])
+        ax.set_yticks(ylabels[0][:])
+        ax.set_yticklabels(ylabels[1][:])
 
-    plt.title(title)
-    plt.xlabel(xname)
-    plt.ylabel(yname)
+    ax.set_title(title)
+    ax.set_xlabel(xname)
+    ax.set_ylabel(yname)
 
     if lgrid:
-        plt.grid(True,linestyle='--')
+        ax.grid(True,linestyle='--')
 
     if minmax:
-        if ymin < ymax:
-            nx,ny = data.shape
-            tmp = ma.where(x[:nx,:ny] >= xmin, data, 1.e20)
-            tmp = ma.where(x[:nx,:ny] <= xmax, tmp, 1.e20)
-            tmp = ma.where(y[:nx,:ny] >= ymin, tmp, 1.e20)
-            tmp = ma.where(y[:nx,:ny] <= ymax, tmp, 1.e20)
-            tmp = ma.where(np.isnan(tmp), 1.e20, tmp)
-            mini = ma.min(tmp)
-
-            tmp = ma.where(x[:nx,:ny] >= xmin, data, -1.e20)
-            tmp = ma.where(x[:nx,:ny] <= xmax, tmp, -1.e20)
-            tmp = ma.where(y[:nx,:ny] >= ymin, tmp, -1.e20)
-            tmp = ma.where(y[:nx,:ny] <= ymax, tmp, -1.e20)
-            tmp = ma.where(np.isnan(tmp), -1.e20, tmp)
-            maxi = ma.max(tmp)
-        else:
-            nx,ny = data.shape
-            tmp = ma.where(x[:nx,:ny] >= xmin, data, 1.e20)
-            tmp = ma.where(x[:nx,:ny] <= xmax, tmp, 1.e20)
-            tmp = ma.where(y[:nx,:ny] >= ymax, tmp, 1.e20)
-            tmp = ma.where(y[:nx,:ny] <= ymin, tmp, 1.e20)
-            tmp = ma.where(np.isnan(tmp), 1.e20, tmp)
-            mini = ma.min(tmp)
-
-            tmp = ma.where(x[:nx,:ny] >= xmin, data, -1.e20)
-            tmp = ma.where(x[:nx,:ny] <= xmax, tmp, -1.e20)
-            tmp = ma.where(y[:nx,:ny] >= ymax, tmp, -1.e20)
-            tmp = ma.where(y[:nx,:ny] <= ymin, tmp, -1.e20)
-            tmp = ma.where(np.isnan(tmp), -1.e20, tmp)
-            maxi = ma.max(tmp)
-
-        plt.text(xmax+(xmax-xmin)/20, ymin-(ymax-ymin)/20., "min = {:f}".format(mini), {'color': 'k', 'fontsize': 10},
+        if minmax is True:
+            mini, maxi = get_minmax(x,y,data,xmin,xmax,ymin,ymax)
+        else: # already computed, e.g. on data before downsampling
+            mini, maxi = minmax
+
+        ax.text(xmax+(xmax-xmin)/20, ymin-(ymax-ymin)/20., "min = {:f}".format(mini), {'color': 'k', 'fontsize': 10},
              horizontalalignment='left',
              verticalalignment='center',
              clip_on=False)
-        plt.text(xmax+(xmax-xmin)/20, ymin-(ymax-ymin)/10., "max = {:f}".format(maxi), {'color': 'k', 'fontsize': 10},
+        ax.text(xmax+(xmax-xmin)/20, ymin-(ymax-ymin)/10., "max = {:f}".format(maxi), {'color': 'k', 'fontsize': 10},
              horizontalalignment='left',
              verticalalignment='center',
              clip_on=False)
 
-    if namefig is None:
-        plt.show()
-    else:
-        plt.savefig(namefig)
-
-    plt.close()
+    close_figure(fig,namefig)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Readers of MUSC datasets.
+
+A Reader gives access to the variables of a dataset as plain NumPy arrays
+(float32 with NaN for missing values), possibly restricted to time and level
+index slices, and to its time axis, decoded once as cftime datetimes and
+converted once to numbers for each unit asked for.
+Two implementations are provided:
+  - XarrayReader, for xarray Datasets (files opened with xarray or the
+    memory-mapped reader, in-memory datasets of the read planner)
+  - NetCDF4Reader, reading files directly with netCDF4-python, without
+    decoding anything else than the variables read and the time axis
+Use open_reader to get the reader of a file or of a Dataset.
+"""
+
+import os
+import threading
+import weakref
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+import numpy as np
+import xarray as xr
+
+import atlas1d.constants as cc
+import atlas1d.datacache as datacache
+import atlas1d.ingest as ingest
+
+# Attributes used to decode variables, which are not among the attributes of decoded variables
+_encoding_attrs = ['_FillValue','missing_value','coordinates','scale_factor','add_offset']
+_time_attrs = ['units','calendar']
+
+def to_float32(data):
+    """
+    Float data as float32, with NaN for missing values (atlas1d.constants.missing).
+    data is copied only if needed.
+    """
+
+    if not(data.dtype.kind == 'f'):
+        return data
+
+    if not(data.dtype.itemsize == 4):
+        data = data.astype(np.float32)
+
+    missing = data == cc.missing
+    if missing.any():
+        data = np.where(missing, np.float32(np.nan), data)
+
+    return data
+
+class Reader:
+    """
+    Interface of readers. Their attribute state is a dictionary of what is computed
+    once per dataset and shared by all its readers (e.g., numeric times).
+    """
+
+    def variables(self):
+        """
+        Names of the variables of the dataset
+        """
+        raise NotImplementedError
+
+    def __contains__(self,var):
+
+        return var in self.variables()
+
+    def dims(self,var):
+        """
+        Dimension names of var. Raise KeyError if var is unknown.
+        """
+        raise NotImplementedError
+
+    def shape(self,var):
+        raise NotImplementedError
+
+    def attrs(self,var):
+        """
+        Attributes of var, as those of the xarray decoded variable
+        """
+        raise NotImplementedError
+
+    def time(self):
+        """
+        Time axis as an array of cftime datetimes
+        """
+        raise NotImplementedError
+
+    def numeric_time(self,units):
+        """
+        Time axis as numbers in units (e.g., 'hours since 1997-06-21 11:00:0.0'),
+        computed once for each units. The array is shared and read-only.
+        """
+
+        import cftime
+
+        numtime = self.state.setdefault('numtime',{})
+        if not(units in numtime):
+            tt = np.asarray(cftime.date2num(self.time(), units), dtype=np.float64)
+            tt.setflags(write=False)
+            numtime[units] = tt
+
+        return numtime[units]
+
+    def read(self,var,it=None,ilev=None):
+        """
+        Array of var, for the time index slice it (first dimension, if time)
+        and the level index slice ilev (last dimension, if not time), all if None.
+        Float variables are returned as float32 (see to_float32).
+        Raise KeyError if var is unknown.
+        """
+        raise NotImplementedError
+
+    def dataarray(self,var):
+        """
+        var as an xarray DataArray with its time coordinate
+        """
+        raise NotImplementedError
+
+    def to_dataset(self,variables=None,indexers=None):
+        """
+        xarray Dataset of variables (all if None), those unknown being skipped.
+        If indexers is given, as a dictionary of index slices per dimension,
+        only the selected part of variables is read.
+        """
+        raise NotImplementedError
+
+    def _index(self,var,it,ilev):
+
+        dims = self.dims(var)
+        index = [slice(None),]*len(dims)
+        if it is not None and len(dims) > 0 and dims[0] == 'time':
+            index[0] = it
+        if ilev is not None and len(dims) > 0 and not(dims[-1] == 'time'):
+            index[-1] = ilev
+
+        return tuple(index)
+
+# What readers of xarray Datasets cache (e.g., numeric times), kept as long
+# as their dataset, so that it is shared by all the plots of a dataset
+# (reentrant, as datasets may be collected while it is held)
+_lock = threading.RLock()
+_shared_states = {}
+
+def _shared(ds):
+
+    key = id(ds)
+    with _lock:
+        if not(key in _shared_states) or not(_shared_states[key][0]() is ds):
+            ref = weakref.ref(ds, lambda ref, key=key: _forget(key,ref))
+            _shared_states[key] = (ref, {})
+
+        return _shared_states[key][1]
+
+def _forget(key,ref):
+
+    with _lock:
+        if key in _shared_states and _shared_states[key][0] is ref:
+            del _shared_states[key]
+
+class XarrayReader(Reader):
+
+    def __init__(self,ds):
+
+        self.ds = ds
+
+        self.state = _shared(ds)
+
+    def variables(self):
+
+        return list(self.ds.variables)
+
+    def dims(self,var):
+
+        return self.ds[var].dims
+
+    def shape(self,var):
+
+        return self.ds[var].shape
+
+    def attrs(self,var):
+
+        return self.ds[var].attrs
+
+    def time(self):
+
+        if not('time' in self.state):
+            self.state['time'] = self.ds['time'].data
+
+        return self.state['time']
+
+    def read(self,var,it=None,ilev=None):
+
+        index = self._index(var,it,ilev)
+        if all([i == slice(None) for i in index]):
+            return to_float32(np.asarray(self.ds[var].data))
+
+        return to_float32(np.asarray(self.ds[var].variable[index].data))
+
+    def dataarray(self,var):
+
+        return self.ds[var]
+
+    def to_dataset(self,variables=None,indexers=None):
+
+        ds = self.ds
+        if variables is not None:
+            ds = ds[[var for var in variables if var in ds.variables]]
+
+        if indexers:
+            # Lazily loaded variables are only read when computed
+            ds = ds.isel({dim: ind for dim, ind in indexers.items() if dim in ds.dims})
+
+        return ds
+
+class NetCDF4Reader(Reader):
+
+    def __init__(self,filein):
+
+        import netCDF4
+
+        self.filein = filein
+        self.nc = netCDF4.Dataset(filein, 'r')
+
+        # Readers of files are cached (see atlas1d.datacache)
+        self.state = {}
+
+    def close(self):
+
+        self.nc.close()
+
+    def variables(self):
+
+        return list(self.nc.variables.keys())
+
+    def dims(self,var):
+
+        return self.nc.variables[var].dimensions
+
+    def shape(self,var):
+
+        return self.nc.variables[var].shape
+
+    def attrs(self,var):
+
+        v = self.nc.variables[var]
+        out = OrderedDict()
+        for att in v.ncattrs():
+            if att in _encoding_attrs or (var == 'time' and att in _time_attrs):
+                continue
+            out[att] = v.getncattr(att)
+
+        return out
+
+    def time(self):
+
+        import cftime
+
+        # Decoded once, when first needed
+        if not('time' in self.state):
+            v = self.nc.variables['time']
+            self.state['time'] = cftime.num2date(np.asarray(v[:], dtype=np.float64), v.getncattr('units'),
+                                                 calendar=getattr(v, 'calendar', 'standard'),
+                                                 only_use_cftime_datetimes=True)
+
+        return self.state['time']
+
+    def read(self,var,it=None,ilev=None):
+
+        if var == 'time':
+            return self.time()[self._index(var,it,ilev)]
+
+        return to_float32(self._decode(var,self._index(var,it,ilev)))
+
+    def _decode(self,var,index):
+        # Values of var as decoded by xarray
+
+        data = self.nc.variables[var][index]
+
+        # Missing values are NaN, as with xarray
+        if np.ma.isMaskedArray(data):
+            if np.ma.is_masked(data):
+                if not(data.dtype.kind == 'f'):
+                    data = data.astype(np.float64)
+                data = data.filled(np.nan)
+            else:
+                data = data.data
+
+        return data
+
+    def dataarray(self,var):
+
+        return self._dataarray(var,{})
+
+    def _dataarray(self,var,indexers):
+        # var, for the index slices per dimension indexers
+
+        dims = self.dims(var)
+        index = tuple([indexers.get(dim,slice(None)) for dim in dims])
+        coords = {}
+        if 'time' in dims and not(var == 'time'):
+            coords['time'] = self.time()[indexers.get('time',slice(None))]
+
+        if var == 'time':
+            data = self.time()[index]
+        else:
+            data = self._decode(var,index)
+
+        return xr.DataArray(data, dims=dims, coords=coords, attrs=self.attrs(var), name=var)
+
+    def to_dataset(self,variables=None,indexers=None):
+
+        if variables is None:
+            variables = self.variables()
+
+        out = OrderedDict()
+        for var in variables:
+            if var in self.nc.variables and not(var in out):
+                out[var] = self._dataarray(var,indexers or {})
+
+        return xr.Dataset(out)
+
+def as_reader(ds):
+    """
+    Reader of ds, either a reader or an xarray Dataset
+    """
+
+    if isinstance(ds,Reader):
+        return ds
+
+    return XarrayReader(ds)
+
+def open_reader(filein,layout=None,variables=None,backend=None):
+    """
+    Reader of filein, either a file name or an xarray Dataset. For a file, its store
+    with the given layout is preferred if it is up to date and has variables
+    (see atlas1d.ingest), and it is read with backend (see atlas1d.datacache).
+    """
+
+    if isinstance(filein,(xr.Dataset,Reader)):
+        return as_reader(filein)
+
+    if layout is not None:
+        storefile = ingest.find(filein,layout,variables)
+        if storefile is not None:
+            logger.debug('Reading {0} from {1}'.format(filein,storefile))
+            filein = storefile
+
+    backend = datacache.get_backend(filein,backend,lreader=True)
+    if backend == 'netcdf4':
+        return datacache.get_cache().open_dataset(filein,backend)
+
+    return as_reader(datacache.get_cache().open_dataset(filein,backend))
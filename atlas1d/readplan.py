@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Read planner of an atlas.
+
+The variables needed by all the diagnostics of an atlas are first collected
+for each dataset, with the time windows and level ranges they plot. Each
+dataset is then read once, only over the union of these windows and ranges
+(levels being kept down to the ground, which heights are relative to),
+derived variables being computed in the same pass, and diagnostics are
+served from the resulting in-memory store.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+import atlas1d.instrument as instrument
+
+from variables_info import var2compute
+
+# Vertical coordinates possibly needed to plot any variable
+_coordinates = ['zfull','zhalf','pfull','phalf']
+
+# Diagnostics plotting vertical profiles or time-level sections, with their default level
+_default_lev = {'plot2D': 'zhalf', 'plotAvgP': 'zfull', 'plotInitP': 'zfull', 'plotInstP': 'zfull'}
+
+# Full and half levels of each kind of vertical coordinate
+_levels = {'z': ('zfull','zhalf'), 'p': ('pfull','phalf')}
+
+def get_varname(dat,variable):
+    """
+    Name of variable in dataset dat
+    """
+
+    if variable in dat.varnames:
+        return dat.varnames[variable]
+    return variable
+
+def needs(diag,dat):
+    """
+    Derived variables and variables to read in dataset dat for diagnostic diag
+    """
+
+    derived = []
+    if diag.variable in var2compute:
+        derived.append(diag.variable)
+
+    variables = [get_varname(dat,diag.variable),] + _coordinates
+    if 'lev' in diag.plot_details:
+        lev = diag.plot_details['lev']
+        if isinstance(lev,dict):
+            if dat.name in lev:
+                variables.append(lev[dat.name])
+        else:
+            variables.append(lev)
+
+    return derived, variables
+
+def _get(details,key,dat,default=None):
+    # Plot detail key for dataset dat, possibly given for each dataset
+
+    value = details.get(key,default)
+    if isinstance(value,dict):
+        return value.get(dat.name,default)
+    return value
+
+def extent(diag,dat):
+    """
+    Time windows and level range plotted by diagnostic diag for dataset dat:
+      - a time window is (tmin, tmax), None meaning unbounded, or 'first'
+        for the first time step only
+      - the level range is (lev, levunits, ymin, ymax), None for all levels or
+        if diag does not plot levels (e.g., time series)
+    References of biases are plotted against other datasets: they are read whole.
+    """
+
+    details = diag.plot_details
+
+    if details.get('lbias',False) and details.get('refdataset',None) == dat.name:
+        return [(None, None),], None
+
+    tmin = details.get('tmin',None)
+    tmax = details.get('tmax',None)
+    tt = details.get('tt',None)
+    if tmin is not None and tmax is not None:
+        window = (tmin, tmax)
+    elif diag.diag_type == 'plotInitP':
+        window = 'first'
+    elif diag.diag_type in ['plotAvgP','plotInstP'] and tt is not None and not(isinstance(tt,int)):
+        window = (tt, tt)
+    elif diag.diag_type in ['plot2D','plotTS']:
+        window = (tmin, tmax)
+    else:
+        window = (None, None)
+
+    windows = [window,]
+    if details.get('init',False) and not(window == 'first'):
+        # Initial profiles are plotted as well
+        windows.append('first')
+
+    # ymin and ymax of time series are bounds of values, not of levels
+    if not(diag.diag_type in _default_lev):
+        return windows, None
+
+    ymin = _get(details,'ymin',dat)
+    ymax = _get(details,'ymax',dat)
+    if ymin is None and ymax is None:
+        return windows, None
+
+    lev = _get(details,'lev',dat,_default_lev[diag.diag_type])
+    levunits = _get(details,'levunits',dat,'km' if lev[0] == 'z' else 'hPa')
+
+    return windows, (lev, levunits, ymin, ymax)
+
+def plan(diaglist,datasets):
+    """
+    Derived variables, variables to read, time windows and level ranges (see extent)
+    in each dataset for all diagnostics of diaglist. A whole time axis (all levels)
+    is kept as the only window (range) of a dataset.
+    """
+
+    out = OrderedDict()
+    for dat in datasets:
+        derived = []
+        variables = []
+        windows = []
+        ranges = []
+        for diag in diaglist:
+            d, v = needs(diag,dat)
+            derived.extend([var for var in d if not(var in derived)])
+            variables.extend([var for var in v if not(var in variables)])
+            w, levels = extent(diag,dat)
+            windows.extend([window for window in w if not(window in windows)])
+            # Levels of time series are not plotted
+            if diag.diag_type in _default_lev and not(levels in ranges):
+                ranges.append(levels)
+
+        if (None, None) in windows:
+            windows = [(None, None),]
+        if None in ranges:
+            ranges = [None,]
+
+        out[dat.name] = (derived, variables, windows, ranges)
+
+    return out
+
+def time_index(rd,windows):
+    """
+    Index slice of the times of reader rd covering all windows (see extent),
+    with the margins of plots
+    """
+
+    import atlas1d.timeaxis as timeaxis
+
+    if not('time' in rd):
+        return {}
+
+    nt = rd.shape('time')[0]
+    i0 = nt
+    i1 = 0
+    for window in windows:
+        if window == 'first':
+            it = slice(0,1)
+        else:
+            it = timeaxis.time_slice(rd,window[0],window[1])
+        start, stop, _ = it.indices(nt)
+        i0 = min(i0,start)
+        i1 = max(i1,stop)
+
+    if i0 == 0 and i1 == nt:
+        return {}
+
+    return {'time': slice(i0,i1)}
+
+def level_index(rd,ranges):
+    """
+    Index slices of the full and half level dimensions of reader rd covering all
+    level ranges (see extent), with the margins of plots, down to the ground
+    """
+
+    import atlas1d.vertical as vertical
+
+    if None in ranges or len(ranges) == 0:
+        return {}
+
+    vc = vertical.get_vertical(rd)
+
+    full = None
+    half = None
+    i0 = None
+    i1 = None
+    for lev, levunits, ymin, ymax in ranges:
+        for name in _levels.get(lev[0],[]):
+            if not(name in rd):
+                continue
+            # Full levels are between half levels i and i+1
+            dim = rd.dims(name)[-1]
+            level = vc.level(name,units=levunits)
+            n = level.shape[-1]
+            ilev, _ = vertical.level_slice(level, n, ymin, ymax)
+            start, stop, _ = ilev.indices(n)
+            if name[1:] == 'full':
+                full = dim
+                nfull = n
+            else:
+                half = dim
+                start = max(start-1,0)
+            i0 = start if i0 is None else min(i0,start)
+            i1 = stop if i1 is None else max(i1,stop)
+
+    if full is None:
+        return {}
+
+    i1 = min(i1,nfull)
+    # Heights are relative to the ground: the lowest levels are kept
+    if vc.lupward('zfull' if 'zfull' in rd else 'pfull'):
+        i0 = 0
+    else:
+        i1 = nfull
+    if i0 == 0 and i1 == nfull:
+        return {}
+
+    out = {full: slice(i0,i1)}
+    if half is not None:
+        out[half] = slice(i0,i1+1)
+
+    return out
+
+def _select(ds,indexers):
+    # Indexers of dimensions of ds only
+
+    return {dim: ind for dim, ind in indexers.items() if dim in ds.dims}
+
+def _extract(ds,variables):
+
+    return ds[[var for var in variables if var in ds.variables]]
+
+def load(datasets,readplan,reports=None,cached=[]):
+    """
+    Read each dataset once following readplan (see plan) and return the in-memory datasets,
+    restricted to the time windows and level ranges of readplan.
+    Datasets that cannot be read are not in the store.
+    If reports is a dictionnary, the measures of the reading of each dataset
+    are added to it (see atlas1d.instrument).
+    Derived variables of the datasets named in cached are taken from and kept
+    in the persistent cache of derived variables (see atlas1d.derivedcache).
+    """
+
+    # Planning does not need xarray, reading does
+    import xarray as xr
+    import atlas1d.readers as readers
+    import atlas1d.vertical as vertical
+    import atlas1d.derivedcache as derivedcache
+    from atlas1d.new_variables import add_to_dataset, required_variables
+
+    store = OrderedDict()
+    for dat in datasets:
+        if not(dat.name in readplan):
+            continue
+
+        derived, variables, windows, ranges = readplan[dat.name]
+        if len(variables) == 0:
+            continue
+
+        with instrument.Recorder() as recorder:
+            try:
+                instrument.set_phase('read')
+                inputs = sorted(required_variables(derived))
+                rd = readers.open_reader(dat.ncfile,layout='time',variables=variables+inputs,backend=dat.backend)
+                tindex = time_index(rd,windows)
+                lindex = level_index(rd,ranges)
+                logger.debug('Reading {0} over {1}'.format(dat.name,dict(tindex,**lindex)))
+                ds = rd.to_dataset(variables,indexers=dict(tindex,**lindex))
+            except (FileNotFoundError, OSError, ValueError) as e:
+                logger.debug('Cannot read {0}: {1}'.format(dat.ncfile,e))
+                continue
+
+            if len(derived) > 0:
+                # Variables that cannot be computed are skipped.
+                # They are computed on all levels (e.g., column integrals) and then selected.
+                instrument.set_phase('compute')
+                if dat.name in cached:
+                    # Cached variables are computed over the whole time axis,
+                    # only from the inputs of those missing in the cache
+                    sizes = {dim: n for var in rd.variables() for dim, n in zip(rd.dims(var),rd.shape(var))}
+                    found, missing = derivedcache.lookup(sizes,dat.ncfile,derived)
+                    if len(missing) > 0:
+                        tmp = rd.to_dataset(sorted(required_variables(missing))+_coordinates)
+                        found.update(derivedcache.derive(tmp,dat.ncfile,missing))
+                    logger.debug('Derived variables of {0}: {1} from cache, {2} computed'.format(dat.ncfile,len(derived)-len(missing),len(missing)))
+                    tmp = xr.Dataset(found)
+                    tmp = tmp.isel(_select(tmp,dict(tindex,**lindex)))
+                else:
+                    tmp = add_to_dataset(rd.to_dataset(inputs+_coordinates,indexers=tindex),derived)
+                    tmp = tmp.isel(_select(tmp,lindex))
+                ds = ds.assign({var: tmp[var] for var in derived if var in tmp.variables})
+
+            if len(lindex) > 0 or len(tindex) > 0:
+                # Heights stay relative to the ground of the whole dataset
+                zorog = vertical.get_vertical(rd).zorog
+                if zorog is not None:
+                    ds = ds.assign({lev: ds[lev].assign_attrs({vertical.zorog_attribute: float(zorog)})
+                                    for lev in ['zfull','zhalf'] if lev in ds.variables})
+
+            logger.debug('Loading {0} variables of {1}'.format(len(variables),dat.name))
+            instrument.set_phase('read')
+            store[dat.name] = _extract(ds,variables).compute()
+
+        if reports is not None:
+            reports[dat.name] = recorder.report()
+
+    return store
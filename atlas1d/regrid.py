@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Vertical regridding of columns.
+
+Columns given on source levels are linearly interpolated onto target levels.
+Levels are given along the last dimension, either as a single profile or
+with leading dimensions (e.g., time) when they vary. Interpolation weights
+are computed for all columns at once with searchsorted, and are cached per
+(source grid, target grid) pair, so that they are reused for all variables
+and time steps on the same grids. Levels may be ordered upward or downward.
+Values at target levels outside the source levels, or in columns with missing
+(NaN) source levels, are NaN. Data on identical grids are passed through.
+"""
+
+import hashlib
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+import numpy as np
+
+# Maximum number of weights kept in cache
+_maxsize = 64
+
+_lock = threading.Lock()
+_weights = OrderedDict()
+
+class Weights:
+    """
+    Interpolation weights: values at target levels are data[i0]*(1-w) + data[i1]*w,
+    along the last dimension. w is NaN at target levels outside the source levels.
+    """
+
+    def __init__(self,i0,i1,w):
+
+        self.i0 = i0
+        self.i1 = i1
+        self.w = w
+
+    def apply(self,data):
+        """
+        Interpolate data, given on the source levels along its last dimension
+        """
+
+        data = np.asarray(data)
+        shape = np.broadcast_shapes(data.shape[:-1], self.w.shape[:-1]) + self.w.shape[-1:]
+        if len(shape) == 1:
+            d0 = data[self.i0]
+            d1 = data[self.i1]
+        else:
+            data = np.broadcast_to(data, shape[:-1] + data.shape[-1:])
+            d0 = np.take_along_axis(data, np.broadcast_to(self.i0, shape), axis=-1)
+            d1 = np.take_along_axis(data, np.broadcast_to(self.i1, shape), axis=-1)
+
+        w = self.w.astype(d0.dtype) if d0.dtype.kind == 'f' else self.w
+
+        return d0 + w*(d1 - d0)
+
+def _key(src,tgt):
+
+    return (src.shape, tgt.shape, hashlib.sha1(src.tobytes()).hexdigest(), hashlib.sha1(tgt.tobytes()).hexdigest())
+
+def _compute(src,tgt):
+    # Weights of the interpolation from src to tgt, both float64 arrays
+
+    nsrc = src.shape[-1]
+    if nsrc < 2:
+        logger.error('At least 2 source levels are needed, got {0}'.format(nsrc))
+        raise ValueError
+
+    # Levels are searched increasing (ordering given by a column without missing level)
+    columns = src.reshape((-1,nsrc))
+    lvalid = ~np.isnan(columns).any(axis=-1)
+    column = columns[np.argmax(lvalid)]
+    lreverse = column[0] > column[-1]
+    if lreverse:
+        src = src[...,::-1]
+
+    lead = np.broadcast_shapes(src.shape[:-1], tgt.shape[:-1])
+    src2 = np.broadcast_to(src, lead + src.shape[-1:]).reshape((-1,nsrc))
+    tgt2 = np.broadcast_to(tgt, lead + tgt.shape[-1:]).reshape((-1,tgt.shape[-1]))
+    nb = src2.shape[0]
+
+    # Columns with missing levels are searched on a dummy grid, so that the others
+    # stay sorted, and are NaN
+    lmissing = np.isnan(src2).any(axis=-1)
+    if lmissing.any():
+        src2 = np.where(lmissing[:,np.newaxis], np.arange(nsrc, dtype=np.float64), src2)
+
+    # All columns are searched at once, each one being shifted above the previous one
+    # (missing targets are NaN whatever their index)
+    finite = tgt2[~np.isnan(tgt2)]
+    lo = min(np.min(src2), np.min(finite, initial=np.inf))
+    span = max(np.max(src2), np.max(finite, initial=-np.inf)) - lo + 1.
+    shift = (np.arange(nb)*span)[:,np.newaxis]
+    ind = np.searchsorted((src2 - lo + shift).ravel(), (tgt2 - lo + shift).ravel(), side='right')
+    ind = ind.reshape(tgt2.shape) - np.arange(nb)[:,np.newaxis]*nsrc - 1
+    ind = np.clip(ind, 0, nsrc-2)
+
+    x0 = np.take_along_axis(src2, ind, axis=-1)
+    x1 = np.take_along_axis(src2, ind+1, axis=-1)
+    dx = np.where(x1 == x0, 1., x1 - x0)
+    w = (tgt2 - x0)/dx
+    w[(tgt2 < src2[:,:1]) | (tgt2 > src2[:,-1:])] = np.nan
+    w[lmissing] = np.nan
+
+    if lreverse:
+        i0 = nsrc - 1 - ind
+        i1 = nsrc - 2 - ind
+    else:
+        i0 = ind
+        i1 = ind + 1
+
+    shape = lead + tgt.shape[-1:]
+
+    return Weights(i0.reshape(shape), i1.reshape(shape), w.astype(np.float32).reshape(shape))
+
+def get_weights(src,tgt):
+    """
+    Weights of the interpolation from levels src to levels tgt, computed once
+    per pair of grids. They are shared: they must not be modified.
+    """
+
+    src = np.asarray(src, dtype=np.float64)
+    tgt = np.asarray(tgt, dtype=np.float64)
+    key = _key(src,tgt)
+
+    with _lock:
+        if key in _weights:
+            _weights.move_to_end(key)
+            return _weights[key]
+
+    weights = _compute(src,tgt)
+
+    with _lock:
+        _weights[key] = weights
+        while len(_weights) > _maxsize:
+            _weights.popitem(last=False)
+
+    return weights
+
+def interpolate(data,src,tgt):
+    """
+    data, given on levels src along its last dimension, interpolated on levels tgt
+    """
+
+    src = np.asarray(src)
+    tgt = np.asarray(tgt)
+    if src.shape == tgt.shape and np.array_equal(src,tgt):
+        # Identical grids: data are passed through, without rounding
+        data = np.asarray(data)
+        return np.array(np.broadcast_to(data, np.broadcast_shapes(data.shape[:-1], tgt.shape[:-1]) + data.shape[-1:]))
+
+    return get_weights(src,tgt).apply(data)
+
+def bias(data,level,dataref,levelref):
+    """
+    Difference between data on levels level and dataref on levels levelref,
+    on levels level. It is NaN where levels are outside those of the reference.
+    """
+
+    return data - interpolate(dataref,levelref,level)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Alignment of datasets on a common time base.
+
+Data given at source times (first dimension) are mapped onto target times,
+both given as numbers in the same units (see atlas1d.timeaxis), with one
+of the modes:
+  - nearest: value at the nearest source time, within half a source time
+    step of the source times
+  - linear: linear interpolation between the two surrounding source times
+  - mean: average of the source values within the cell of each target
+    time, bounded by the mid-points between target times
+Target times outside the source times (or cells without source value in
+mean mode) are NaN. Index maps are computed once per (source times, target
+times, mode) and applied to any variable without loop over time steps, or
+at a single target time to the source times it depends on only.
+"""
+
+import hashlib
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+import numpy as np
+
+modes = ['nearest','linear','mean']
+
+# Maximum number of maps kept in cache
+_maxsize = 64
+
+_lock = threading.Lock()
+_maps = OrderedDict()
+
+def _cell_edges(t):
+    # Edges of the cells centered on times t
+
+    if len(t) < 2:
+        return np.array([-np.inf, np.inf])
+
+    e = np.zeros(len(t)+1)
+    e[1:-1] = (t[:-1]+t[1:])/2.
+    e[0] = t[0] - (t[1]-t[0])/2.
+    e[-1] = t[-1] + (t[-1]-t[-2])/2.
+
+    return e
+
+class TimeMap:
+    """
+    Map from source times to target times
+    """
+
+    def __init__(self,src,tgt,mode):
+
+        if not(mode in modes):
+            logger.error('Unknown time alignment mode: {0} (known modes: {1})'.format(mode,modes))
+            raise ValueError
+
+        self.mode = mode
+        self.nsrc = len(src)
+        self.ntgt = len(tgt)
+
+        if self.nsrc == 0:
+            logger.error('No source time to align')
+            raise ValueError
+
+        if mode == 'mean':
+            # Source times in the cell of each target time are contiguous
+            edges = _cell_edges(tgt)
+            self.start = np.searchsorted(src, edges[:-1], side='left')
+            self.end = np.searchsorted(src, edges[1:], side='left')
+            self.valid = self.end > self.start
+            return
+
+        if self.nsrc == 1:
+            i0 = np.zeros(self.ntgt, dtype=int)
+            i1 = i0
+            w = np.zeros(self.ntgt)
+            valid = tgt == src[0]
+        elif mode == 'nearest':
+            edges = _cell_edges(src)
+            i0 = np.clip(np.searchsorted(edges, tgt, side='right') - 1, 0, self.nsrc-1)
+            i1 = i0
+            w = np.zeros(self.ntgt)
+            valid = (tgt >= edges[0]) & (tgt <= edges[-1])
+        else:
+            i0 = np.clip(np.searchsorted(src, tgt, side='right') - 1, 0, self.nsrc-2)
+            i1 = i0 + 1
+            w = (tgt - src[i0])/(src[i1] - src[i0])
+            valid = (tgt >= src[0]) & (tgt <= src[-1])
+            w = np.clip(w, 0., 1.)
+
+        self.i0 = i0
+        self.i1 = i1
+        self.w = w
+        self.valid = valid
+
+    def apply(self,data,lextrapolate=False):
+        """
+        data, given at source times along its first dimension, at target times.
+        If lextrapolate, target times outside source times get the value at the
+        nearest source time instead of NaN (not in mean mode).
+        """
+
+        data = np.asarray(data)
+        if not(data.shape[0] == self.nsrc):
+            logger.error('{0} times given, {1} expected'.format(data.shape[0],self.nsrc))
+            raise ValueError
+
+        dtype = data.dtype if data.dtype.kind == 'f' else np.float64
+        shape = (self.ntgt,) + (1,)*(data.ndim-1)
+
+        if self.mode == 'mean':
+            # Sums over source times in each cell, from cumulative sums
+            ok = ~np.isnan(data)
+            total = np.zeros((self.nsrc+1,) + data.shape[1:])
+            total[1:] = np.cumsum(np.where(ok, data, 0.), axis=0, dtype=np.float64)
+            count = np.zeros((self.nsrc+1,) + data.shape[1:])
+            count[1:] = np.cumsum(ok, axis=0)
+            n = count[self.end] - count[self.start]
+            out = (total[self.end] - total[self.start])/np.maximum(n, 1.)
+            out[n == 0] = np.nan
+            return out.astype(dtype)
+
+        d0 = np.take(data, self.i0, axis=0)
+        if self.mode == 'nearest':
+            out = d0.astype(dtype)
+        else:
+            d1 = np.take(data, self.i1, axis=0)
+            w = self.w.astype(dtype).reshape(shape)
+            out = d0 + w*(d1 - d0)
+
+        if not(lextrapolate) and not(np.all(self.valid)):
+            out = np.where(self.valid.reshape(shape), out, np.nan).astype(dtype)
+
+        return out
+
+    def sources(self,k):
+        """
+        Index slice of the source times the value at target time k depends on
+        """
+
+        if self.mode == 'mean':
+            return slice(int(self.start[k]), int(max(self.end[k], self.start[k])))
+
+        return slice(int(self.i0[k]), int(self.i1[k])+1)
+
+    def apply_at(self,data,k,lextrapolate=False):
+        """
+        Value at target time k of data, given at the source times sources(k)
+        only along its first dimension (see apply)
+        """
+
+        data = np.asarray(data)
+        isrc = self.sources(k)
+        if not(data.shape[0] == isrc.stop - isrc.start):
+            logger.error('{0} times given, {1} expected'.format(data.shape[0],isrc.stop - isrc.start))
+            raise ValueError
+
+        dtype = data.dtype if data.dtype.kind == 'f' else np.float64
+
+        if self.mode == 'mean':
+            if not(self.valid[k]):
+                return np.full(data.shape[1:], np.nan, dtype=dtype)
+            ok = ~np.isnan(data)
+            total = np.sum(np.where(ok, data, 0.), axis=0, dtype=np.float64)
+            n = np.sum(ok, axis=0)
+            out = np.where(n > 0, total/np.maximum(n, 1.), np.nan)
+            return out.astype(dtype)
+
+        if self.mode == 'nearest':
+            out = data[0].astype(dtype)
+        else:
+            w = self.w[k].astype(dtype)
+            out = data[0] + w*(data[-1] - data[0])
+
+        if not(lextrapolate) and not(self.valid[k]):
+            out = np.full(out.shape, np.nan, dtype=dtype)
+
+        return out
+
+def _key(src,tgt,mode):
+
+    return (len(src), len(tgt), mode, hashlib.sha1(src.tobytes()).hexdigest(), hashlib.sha1(tgt.tobytes()).hexdigest())
+
+def get_map(src,tgt,mode='nearest'):
+    """
+    Map from times src to times tgt (1D, increasing, in the same units),
+    computed once per (src, tgt, mode). It is shared: it must not be modified.
+    """
+
+    src = np.atleast_1d(np.asarray(src, dtype=np.float64))
+    tgt = np.atleast_1d(np.asarray(tgt, dtype=np.float64))
+    key = _key(src,tgt,mode)
+
+    with _lock:
+        if key in _maps:
+            _maps.move_to_end(key)
+            return _maps[key]
+
+    tmap = TimeMap(src,tgt,mode)
+
+    with _lock:
+        _maps[key] = tmap
+        while len(_maps) > _maxsize:
+            _maps.popitem(last=False)
+
+    return tmap
+
+def align(data,src,tgt,mode='nearest',lextrapolate=False):
+    """
+    data, given at times src along its first dimension, at times tgt (see TimeMap.apply)
+    """
+
+    return get_map(src,tgt,mode).apply(data,lextrapolate=lextrapolate)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Time axes of plots.
+
+Times are given in hours since the first time of the plotted window (see
+time_units). Numeric times of datasets are cached by their readers (see
+atlas1d.readers.Reader.numeric_time). Time windows are resolved into index
+slices of the time axis of datasets (see time_slice) in the same way by
+plots and by the read planner (see atlas1d.readplan), which reads only
+these windows. Time ticks are generated for any
+interval given as a number and a unit:
+  - 'min', 'h', 'd': every n minutes, hours or days, from the hour (day)
+    of the start of the axis, e.g., '30min', '1h', '12h', '1d'
+  - 'mon': first day of every n months, e.g., '1mon', '3mon'
+  - '10d': every 10 days from the hour of the start of the axis, on the
+    1st, 10th and 20th day of each month once one of them is reached
+Ticks are computed once per (tmin, tmax, units, interval), since all the
+diagnostics of a group share them, and the most recently used ones are kept.
+"""
+
+import re
+import threading
+from datetime import timedelta
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+import numpy as np
+import cftime
+
+# Maximum number of tick sets kept in cache
+_maxsize = 64
+
+_lock = threading.Lock()
+_ticks = OrderedDict()
+
+# Units of intervals, with their length in hours when fixed
+_intervals = {'min': 1./60., 'h': 1., 'd': 24., 'mon': None}
+
+# Length in hours of the units of numeric times
+_time_units = {'seconds': 1./3600., 'minutes': 1./60., 'hours': 1., 'days': 24.}
+
+def time_units(t0):
+    """
+    Units of numeric times of an axis starting at t0
+    """
+
+    return t0.strftime("hours since %Y-%m-%d %H:%M:0.0")
+
+def numeric_time(rd):
+    """
+    Time axis of reader rd in hours since its first time (cached by rd), and its units
+    """
+
+    tunits = time_units(rd.time()[0])
+
+    return rd.numeric_time(tunits), tunits
+
+def time_slice(rd, tmin=None, tmax=None):
+    """
+    Index slice of the time axis of reader rd covering [tmin,tmax], with one time
+    step of margin on each side so that lines and cells reach the edges of the plot
+    """
+
+    trel, tunits = numeric_time(rd)
+    nt = len(trel)
+    if nt < 2 or (tmin is None and tmax is None):
+        return slice(None)
+
+    i0 = 0
+    i1 = nt
+    if tmin is not None:
+        i0 = max(np.searchsorted(trel, cftime.date2num(tmin, tunits), side='right')-1, 0)
+    if tmax is not None:
+        i1 = min(np.searchsorted(trel, cftime.date2num(tmax, tunits), side='left')+1, nt)
+
+    if i1 - i0 < 2: # Window (almost) empty: everything is kept as before
+        return slice(None)
+
+    return slice(int(i0), int(i1))
+
+def time_window(rd, tmin, tmax):
+    """
+    Index slice of the times of reader rd within [tmin,tmax], bounds included
+    """
+
+    trel, tunits = numeric_time(rd)
+
+    i0 = np.searchsorted(trel, cftime.date2num(tmin, tunits), side='left')
+    i1 = np.searchsorted(trel, cftime.date2num(tmax, tunits), side='right')
+
+    return slice(int(i0), int(i1))
+
+def time_nearest(rd, tt):
+    """
+    Index of the time of reader rd nearest to tt (the latest one in case of a tie)
+    """
+
+    trel, tunits = numeric_time(rd)
+    dist = np.abs(trel - cftime.date2num(tt, tunits))
+
+    return int(len(dist) - 1 - np.argmin(dist[::-1]))
+
+def parse_interval(dtlabel):
+    """
+    Number and unit of the tick interval dtlabel, e.g., (30,'min') for '30min'
+    """
+
+    m = re.match(r'^\s*(\d*)\s*(min|h|d|mon)\s*$', dtlabel)
+    if m is None or m.group(1) in ['0',]:
+        logger.error('dtlabel={} not coded yet'.format(dtlabel))
+        raise NotImplementedError
+
+    n = int(m.group(1)) if len(m.group(1)) > 0 else 1
+
+    return n, m.group(2)
+
+def _hours(tunits):
+    # Length in hours of the unit of tunits
+
+    unit = tunits.split()[0]
+    if not(unit in _time_units):
+        logger.error('Time units unexpected: {0}'.format(tunits))
+        raise ValueError
+
+    return _time_units[unit]
+
+def _regular(tmin, tmax, tunits, n, unit, calendar):
+    # Ticks every n units, from the hour (day) of tmin
+
+    if unit == 'd':
+        start = cftime.datetime(tmin.year, tmin.month, tmin.day, calendar=calendar)
+    else:
+        start = cftime.datetime(tmin.year, tmin.month, tmin.day, tmin.hour, calendar=calendar)
+
+    step = n*_intervals[unit]/_hours(tunits)
+    t0 = cftime.date2num(start, tunits)
+    eps = 1.e-6*step
+
+    k0 = int(np.ceil((cftime.date2num(tmin, tunits) - t0)/step - eps))
+    k1 = int(np.floor((cftime.date2num(tmax, tunits) - t0)/step + eps))
+
+    return t0 + step*np.arange(k0, k1+1)
+
+def _monthly(tmin, tmax, tunits, n, days, calendar):
+    # Ticks on days of every n months
+
+    nmonths = (tmax.year - tmin.year)*12 + tmax.month - tmin.month + 1
+    months = np.arange(0, nmonths, n) + tmin.month - 1
+    dates = [cftime.datetime(tmin.year + m//12, m % 12 + 1, d, calendar=calendar) for m in months for d in days]
+
+    tt = cftime.date2num(dates, tunits)
+    tt = tt[(tt >= cftime.date2num(tmin, tunits)) & (tt <= cftime.date2num(tmax, tunits))]
+
+    return np.asarray(tt, dtype=np.float64)
+
+def _tendays(tmin, tmax, tunits, calendar):
+    # Ticks every 10 days from the hour of tmin, on days 1, 10 and 20 once one of them is reached
+
+    dates = []
+    t0 = cftime.datetime(tmin.year, tmin.month, tmin.day, tmin.hour, calendar=calendar)
+    while t0 <= tmax:
+        if t0 >= tmin:
+            dates.append(t0)
+        if t0.day == 1:
+            t0 = cftime.datetime(t0.year, t0.month, 10, calendar=calendar)
+        elif t0.day == 10:
+            t0 = cftime.datetime(t0.year, t0.month, 20, calendar=calendar)
+        elif t0.day == 20:
+            t0 = cftime.datetime(t0.year + t0.month//12, t0.month % 12 + 1, 1, calendar=calendar)
+        else:
+            t0 = t0 + timedelta(days=10)
+
+    return np.asarray(cftime.date2num(dates, tunits), dtype=np.float64).reshape(-1)
+
+def _labels(tt, tunits, unit, calendar):
+
+    dates = cftime.num2date(tt, tunits, calendar=calendar)
+
+    if unit == 'min':
+        return tuple(['{0}:{1:02d}'.format(t.hour,t.minute) for t in dates])
+    elif unit == 'h':
+        return tuple(['{0}'.format(t.hour) for t in dates])
+    elif unit == 'mon':
+        return tuple(['{0}/{1}'.format(t.month,t.year) for t in dates])
+
+    return tuple(['{0}/{1}'.format(t.month,t.day) for t in dates])
+
+def get_ticks(tmin, tmax, tunits, dtlabel):
+    """
+    Positions (in tunits) and labels of the time ticks between tmin and tmax
+    every dtlabel. They are shared: they must not be modified.
+    """
+
+    # Calendar first: dates of different calendars cannot be compared
+    calendar = getattr(tmin, 'calendar', '') or 'standard'
+    key = (calendar, tmin, tmax, tunits, dtlabel)
+
+    with _lock:
+        if key in _ticks:
+            _ticks.move_to_end(key)
+            return _ticks[key]
+
+    if dtlabel == '10d':
+        unit = 'd'
+        tt = _tendays(tmin, tmax, tunits, calendar)
+    else:
+        n, unit = parse_interval(dtlabel)
+        if unit == 'mon':
+            tt = _monthly(tmin, tmax, tunits, n, [1,], calendar)
+        else:
+            tt = _regular(tmin, tmax, tunits, n, unit, calendar)
+
+    tt.setflags(write=False)
+    ticks = (tt, _labels(tt, tunits, unit, calendar))
+
+    with _lock:
+        _ticks[key] = ticks
+        while len(_ticks) > _maxsize:
+            _ticks.popitem(last=False)
+
+    return ticks
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Vertical coordinates of MUSC datasets.
+
+The vertical coordinate of a dataset is built once, with its first reader
+(see atlas1d.readers), and shared by all the plots of the dataset. Levels
+are read once, heights are given above the ground (the lowest half level,
+or full level if there is no half level) and levels in plot units are
+computed once for each units. Returned arrays are shared and read-only.
+Level ranges are resolved into index slices of levels (see level_slice) in
+the same way by plots and by the read planner (see atlas1d.readplan), which
+reads only these ranges.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+# Units of levels, with their value in SI units
+_units = {
+    'zfull': {'m': 1., 'km': 1000.},
+    'zhalf': {'m': 1., 'km': 1000.},
+    'pfull': {'Pa': 1., 'hPa': 100.},
+    'phalf': {'Pa': 1., 'hPa': 100.},
+    }
+
+# Levels used when a level is not in a dataset
+_fallback = {'zfull': None, 'zhalf': 'zfull', 'pfull': None, 'phalf': 'pfull'}
+
+# Levels at the other side of the layers
+_other = {'zfull': 'zhalf', 'zhalf': 'zfull', 'pfull': 'phalf', 'phalf': 'pfull'}
+
+# Attribute of heights giving the ground height when they are only part of those
+# of a dataset (e.g., read over a time window, see atlas1d.readplan)
+zorog_attribute = 'atlas1d_zorog'
+
+class VerticalCoordinate:
+    """
+    Levels of a dataset: heights above ground (zfull, zhalf, m) and pressure (pfull, phalf, Pa)
+    """
+
+    def __init__(self,rd):
+
+        # Levels in SI units, heights being above ground
+        self._levels = {}
+        for lev in _units.keys():
+            if lev in rd:
+                self._levels[lev] = np.array(rd.read(lev))
+
+        self.zorog = None
+        for lev in ['zhalf','zfull']:
+            if lev in self._levels:
+                self.zorog = rd.attrs(lev).get(zorog_attribute, np.min(self._levels[lev]))
+                break
+
+        for lev in self._levels.keys():
+            if lev in ['zfull','zhalf']:
+                self._levels[lev] -= self.zorog
+            self._levels[lev].setflags(write=False)
+
+        self.shapes = {lev: self._levels[lev].shape for lev in self._levels.keys()}
+
+        self._scaled = {}
+        self._invariant = {}
+
+    def name(self,lev,nlev=None):
+        """
+        Name of the levels used for lev: those of the other side of layers if lev
+        does not have nlev levels, the full levels if lev is not in the dataset.
+        Raise KeyError if there is no such levels.
+        """
+
+        if not(lev in _units):
+            logger.error('Level unexpected: {0}'.format(lev))
+            raise NotImplementedError
+
+        if not(lev in self._levels) and _fallback[lev] is not None:
+            lev = _fallback[lev]
+        if not(lev in self._levels):
+            raise KeyError(lev)
+
+        if nlev is not None and not(self.shapes[lev][-1] == nlev) and _other[lev] in self._levels:
+            lev = _other[lev]
+
+        return lev
+
+    def level(self,lev,nlev=None,units=None):
+        """
+        Levels lev (see name) in units (SI units if None)
+        """
+
+        lev = self.name(lev,nlev)
+        if units is None:
+            return self._levels[lev]
+
+        if not(units in _units[lev]):
+            logger.error('levunits={0} for levname={1} not coded yet'.format(units,lev))
+            raise NotImplementedError
+
+        key = (lev,units)
+        if not(key in self._scaled):
+            unit = _units[lev][units]
+            if unit == 1.:
+                level = self._levels[lev]
+            else:
+                level = self._levels[lev]/unit
+                level.setflags(write=False)
+            self._scaled[key] = level
+
+        return self._scaled[key]
+
+    def height(self,lev='zfull'):
+        """
+        Height above ground (m) of full (zfull) or half (zhalf) levels
+        """
+
+        return self.level(lev,units='m')
+
+    def pressure(self,lev='pfull',units='Pa'):
+        """
+        Pressure of full (pfull) or half (phalf) levels, in Pa or hPa
+        """
+
+        return self.level(lev,units=units)
+
+    def ltime_invariant(self,lev,nlev=None):
+        """
+        Are levels lev (see name) the same at all times?
+        """
+
+        lev = self.name(lev,nlev)
+        if not(lev in self._invariant):
+            level = self._levels[lev]
+            self._invariant[lev] = level.ndim == 1 or bool(np.all(level == level[:1]))
+
+        return self._invariant[lev]
+
+    def lupward(self,lev,nlev=None):
+        """
+        Are levels lev (see name) ordered upward (first level at the bottom)?
+        """
+
+        lev = self.name(lev,nlev)
+        level = self._levels[lev]
+        if lev[0] == 'z':
+            return bool(level[...,0].flat[0] < level[...,-1].flat[0])
+
+        return bool(level[...,0].flat[0] > level[...,-1].flat[0])
+
+def level_slice(level, nlev, ymin=None, ymax=None):
+    """
+    Index slices of the nlev data levels and of the level axis covering
+    [ymin,ymax], with one extra level of margin. level is given in plot
+    units, possibly varies in time, and is either at the nlev data levels
+    or at the nlev+1 half levels bounding them.
+    """
+
+    level = np.asarray(level)
+    n = level.shape[-1]
+    if (ymin is None and ymax is None) or not(n in [nlev, nlev+1]):
+        return slice(None), slice(None)
+
+    if ymin is not None and ymax is not None and ymin > ymax: # e.g., pressure axis
+        ymin, ymax = ymax, ymin
+
+    inside = np.ones(level.shape, dtype=bool)
+    if ymin is not None:
+        inside = inside & (level >= ymin)
+    if ymax is not None:
+        inside = inside & (level <= ymax)
+    inside = np.any(inside.reshape((-1,n)), axis=0)
+
+    ind = np.nonzero(inside)[0]
+    if len(ind) == 0:
+        return slice(None), slice(None)
+
+    i0 = max(ind[0]-1, 0)
+    i1 = min(ind[-1]+1, n-1)
+
+    if n == nlev+1: # cells bounded by half levels i and i+1
+        i1 = max(i1, i0+1)
+        return slice(int(i0), int(i1)), slice(int(i0), int(i1)+1)
+
+    return slice(int(i0), int(i1)+1), slice(int(i0), int(i1)+1)
+
+def get_vertical(rd):
+    """
+    Vertical coordinate of the dataset of reader rd, built once
+    """
+
+    if not('vertical' in rd.state):
+        rd.state['vertical'] = VerticalCoordinate(rd)
+
+    return rd.state['vertical']
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Worker processes used to run atlas and diagnostics in parallel.
+
+Log records emitted in a worker are collected and sent back with the
+result, so that they are handled by the loggers of the parent process.
+In-memory datasets read for an atlas are shared with the workers through
+files, which each worker loads once (see SharedStore).
+"""
+
+import os
+import atexit
+import pickle
+import shutil
+import tempfile
+import traceback
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+class RecordCollector(logging.Handler):
+    """
+    Keep log records so that they can be sent back to the parent process
+    """
+
+    def __init__(self):
+
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self,record):
+
+        # Make the record picklable
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+def run_captured(func,loglevel,*args,**kwargs):
+    """
+    Call func(*args,**kwargs) collecting log records instead of emitting them.
+    Return the result of func (None if it failed), the log records and
+    the formatted traceback if func raised an exception (None otherwise).
+    """
+
+    root = logging.getLogger()
+    handlers = root.handlers
+    level = root.level
+
+    collector = RecordCollector()
+    root.handlers = [collector,]
+    root.setLevel(loglevel)
+
+    result = None
+    error = None
+    try:
+        result = func(*args,**kwargs)
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        root.handlers = handlers
+        root.setLevel(level)
+
+    return result, collector.records, error
+
+def replay(records):
+    """
+    Handle in the present process log records collected in a worker
+    """
+
+    for record in records:
+        logging.getLogger(record.name).handle(record)
+
+def get_jobs(jobs):
+    """
+    Number of processes to use: all available cores if jobs <= 0
+    """
+
+    if jobs <= 0:
+        return os.cpu_count()
+    return jobs
+
+##################################################
+# Pool of long-lived rendering processes
+##################################################
+
+_pool = None
+_pool_jobs = None
+
+def _init_renderer():
+    """
+    Import once for all what is needed for rendering
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import atlas1d.plotMUSC
+
+def get_pool(jobs):
+    """
+    Pool of jobs rendering processes, created on first use and kept alive
+    """
+
+    global _pool, _pool_jobs
+
+    jobs = get_jobs(jobs)
+
+    if _pool is not None and not(_pool_jobs == jobs):
+        shutdown()
+
+    if _pool is None:
+        logger.debug('Starting {0} rendering processes'.format(jobs))
+        _pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_renderer)
+        _pool_jobs = jobs
+
+    return _pool
+
+def shutdown():
+
+    global _pool, _pool_jobs
+
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+        _pool_jobs = None
+
+atexit.register(shutdown)
+
+##################################################
+# In-memory datasets shared with rendering processes
+##################################################
+
+# Maximum number of shared datasets kept by a process
+_maxsize = 16
+
+_datasets = OrderedDict()
+
+class SharedStore:
+    """
+    In-memory datasets of an atlas (see atlas1d.readplan) shared with rendering
+    processes. Each dataset is written once to a file, and a process loads it on
+    first use and keeps it for the next diagnostics, with what readers cache for it
+    (e.g., numeric times, vertical coordinates). Only file names are sent with
+    each diagnostic.
+    """
+
+    def __init__(self,store):
+
+        self.directory = tempfile.mkdtemp(prefix='atlas1d_store_')
+        self.files = OrderedDict()
+        for i, (name, ds) in enumerate(store.items()):
+            self.files[name] = os.path.join(self.directory,'{0}.pickle'.format(i))
+            with open(self.files[name],'wb') as f:
+                pickle.dump(ds,f,protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __contains__(self,name):
+
+        return name in self.files
+
+    def __getitem__(self,name):
+
+        filein = self.files[name]
+        if filein in _datasets:
+            _datasets.move_to_end(filein)
+            return _datasets[filein]
+
+        logger.debug('Loading {0} from {1}'.format(name,filein))
+        with open(filein,'rb') as f:
+            ds = pickle.load(f)
+
+        _datasets[filein] = ds
+        while len(_datasets) > _maxsize:
+            _datasets.popitem(last=False)
+
+        return ds
+
+    def keys(self):
+
+        return self.files.keys()
+
+    def close(self):
+        """
+        Remove the files of the datasets, once all diagnostics are rendered
+        """
+
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Benchmarks of SCM-atlas
+------------------------------------------------------------------
+
+synthetic      : generator of synthetic MUSC output files
+run_benchmarks : benchmark suite, with results saved as JSON
+bench_kernels  : vectorized column diagnostics against loop versions
+bench_import   : import times and heavy dependencies of atlas1d modules
+bench_readers  : backends reading MUSC files against xr.open_dataset
+bench_regrid   : vertical regridding against np.interp column by column
+bench_timealign: time alignment of datasets against loops over time steps
+"""
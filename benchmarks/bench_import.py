@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding:UTF-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Time the import of atlas1d modules in fresh interpreters and check that
+modules used by non-rendering paths (html, info, planning) do not import
+heavy dependencies (matplotlib, xarray...).
+
+Usage: bench_import.py [--repeat N]
+"""
+
+import os
+import sys
+import argparse
+import json
+import subprocess
+
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Modules which must not import heavy dependencies
+light_modules = ['atlas1d.MultiAtlas', 'atlas1d.Atlas', 'atlas1d.DiagGroup', 'atlas1d.Diagnostic',
+                 'atlas1d.readplan', 'atlas1d.manifest', 'atlas1d.workers']
+# Modules needed to render diagnostics, timed for reference
+render_modules = ['atlas1d.plotMUSC', 'atlas1d.new_variables']
+
+heavy = ['matplotlib', 'xarray', 'cftime', 'netCDF4', 'pandas']
+
+_snippet = """
+import sys, time, json
+t0 = time.perf_counter()
+import {0}
+t1 = time.perf_counter()
+print(json.dumps({{'time': t1-t0, 'loaded': [m for m in {1} if m in sys.modules]}}))
+"""
+
+def import_time(module, repeat):
+    """
+    Best time of import of module in a fresh interpreter over repeat runs,
+    and heavy dependencies loaded by this import
+    """
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([rootdir, env.get('PYTHONPATH','')])
+    # atlas1d needs a configuration directory providing variables_info
+    env.setdefault('ATLAS_CONFIG', os.path.join(rootdir, 'default_atlas'))
+
+    best = None
+    for i in range(repeat):
+        out = subprocess.run([sys.executable, '-c', _snippet.format(module, heavy)],
+                             env=env, capture_output=True, text=True, check=True)
+        res = json.loads(out.stdout.splitlines()[-1])
+        if best is None or res['time'] < best['time']:
+            best = res
+
+    return best
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", help="Number of repetitions of timings", type=int, default=5)
+    args = parser.parse_args()
+
+    lok = True
+    print('### Import times (best of {0}, fresh interpreter)'.format(args.repeat))
+    for module in light_modules + render_modules:
+        res = import_time(module, args.repeat)
+        status = ''
+        if module in light_modules:
+            if len(res['loaded']) > 0:
+                status = 'FAILED (imports {0})'.format(', '.join(res['loaded']))
+                lok = False
+            else:
+                status = 'OK'
+        print('  {0:25s} {1:10.1f} ms  {2}'.format(module, res['time']*1000., status))
+
+    if not(lok):
+        sys.exit(1)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding:UTF-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Check the vectorized column diagnostics of atlas1d.kernels against the
+loop versions (see tests/test_kernels.py) and time both of them.
+
+Usage: bench_kernels.py [--nt NT] [--nlev NLEV] [--repeat N]
+"""
+
+import os
+import sys
+import argparse
+import timeit
+
+import numpy as np
+import xarray as xr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import atlas1d.constants as cc
+import atlas1d.new_variables as nv
+
+from tests.test_kernels import cloud_base_loop, cloud_top_loop, column_integral_loop, layer_mean_loop
+
+def synthetic_column(nt, nlev, lup=True, seed=0):
+    """
+    Heights (full and half levels), half-level pressure, a cloud fraction
+    with random cloud layers and a smooth variable, in MUSC-like DataArrays
+    """
+
+    rng = np.random.default_rng(seed)
+
+    time = xr.DataArray(np.arange(nt)*300., dims='time', name='time')
+
+    zhalf = np.linspace(0., 20000., nlev+1)**1.5/20000.**0.5
+    zhalf = np.tile(zhalf, (nt,1)) + rng.uniform(0., 1., (nt,1))
+    zfull = (zhalf[:,:-1] + zhalf[:,1:])/2.
+    phalf = 101325.*np.exp(-zhalf/8000.)
+
+    cl = np.zeros((nt,nlev), dtype=np.float32)
+    for it in range(nt):
+        if rng.uniform() < 0.8:
+            i1 = rng.integers(0, nlev-1)
+            i2 = rng.integers(i1+1, nlev)
+            cl[it,i1:i2] = rng.uniform(0.01, 1., i2-i1)
+
+    var = (300. + zfull/1000. + rng.normal(0., 0.1, (nt,nlev))).astype(np.float32)
+
+    if not(lup):
+        zhalf = zhalf[:,::-1]
+        zfull = zfull[:,::-1]
+        phalf = phalf[:,::-1]
+        cl = cl[:,::-1]
+        var = var[:,::-1]
+
+    def da(x, lev, name):
+        return xr.DataArray(np.ascontiguousarray(x, dtype=np.float32), dims=('time',lev), coords={'time': time},
+                            name=name, attrs={'long_name': name, 'units': '-'})
+
+    return da(zfull,'levf','zfull'), da(phalf,'levh','phalf'), da(cl,'levf','cl'), da(var,'levf','theta')
+
+def check(name, new, old, rtol=1.e-5, atol=1.e-3):
+
+    new = np.asarray(new)
+    old = np.asarray(old)
+    ok = np.allclose(new, old, rtol=rtol, atol=atol, equal_nan=True)
+    print('  {0:25s} {1}'.format(name, 'OK' if ok else 'FAILED (max diff {0})'.format(np.nanmax(np.abs(new-old)))))
+
+    return ok
+
+def timing(name, func, repeat):
+
+    t = min(timeit.repeat(func, number=1, repeat=repeat))
+    print('  {0:25s} {1:10.3f} ms'.format(name, t*1000.))
+
+    return t
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nt", help="Number of time steps", type=int, default=2000)
+    parser.add_argument("--nlev", help="Number of levels", type=int, default=91)
+    parser.add_argument("--repeat", help="Number of repetitions of timings", type=int, default=5)
+    args = parser.parse_args()
+
+    lok = True
+    for lup in [True, False]:
+        zfull, phalf, cl, theta = synthetic_column(args.nt, args.nlev, lup=lup)
+        print('### nt={0}, nlev={1}, levels ordered {2}'.format(args.nt, args.nlev, 'upward' if lup else 'downward'))
+
+        print('Correctness:')
+        z, ph, cf, var = zfull.values, phalf.values, cl.values, theta.values
+        lok = check('zcb', nv.f_zcb(zfull,cl), cloud_base_loop(z,cf,missing=cc.missing)) and lok
+        lok = check('zct', nv.f_zct(zfull,cl), cloud_top_loop(z,cf,missing=cc.missing)) and lok
+        lok = check('int', nv.f_int(phalf,theta), column_integral_loop(ph,var), atol=1.) and lok
+        lok = check('avg 0-500', nv.f_avg(zfull,theta,0,500), layer_mean_loop(z,var,0,500)) and lok
+        lok = check('avg 2000-5000', nv.f_avg(zfull,theta,2000,5000), layer_mean_loop(z,var,2000,5000)) and lok
+        # Profile shared by all time steps
+        lok = check('zcb (1D heights)', nv.f_zcb(zfull[0],cl), cloud_base_loop(z[0],cf,missing=cc.missing)) and lok
+
+        print('Timings (best of {0} for vectorized versions):'.format(args.repeat))
+        for name, new, old in [
+                ('zcb', lambda: nv.f_zcb(zfull,cl), lambda: cloud_base_loop(z,cf,missing=cc.missing)),
+                ('zct', lambda: nv.f_zct(zfull,cl), lambda: cloud_top_loop(z,cf,missing=cc.missing)),
+                ('int', lambda: nv.f_int(phalf,theta), lambda: column_integral_loop(ph,var)),
+                ('avg', lambda: nv.f_avg(zfull,theta,0,500), lambda: layer_mean_loop(z,var,0,500)),
+                ]:
+            tnew = timing(name, new, args.repeat)
+            # Loop versions are slow: a single run is enough
+            told = timing(name + ' (loop)', old, 1)
+            print('  {0:25s} {1:10.1f}'.format('speed-up', told/tnew))
+
+    if not(lok):
+        sys.exit(1)
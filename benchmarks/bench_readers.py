@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding:UTF-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Check the readers of MUSC files with each backend (see atlas1d.readers and
+atlas1d.datacache) against xr.open_dataset and time the access patterns of
+plotMUSC with each of them: opening the file, a time series, a profile and
+a time-height field.
+
+Usage: bench_readers.py [--file FILE] [--repeat N]
+"""
+
+import os
+import sys
+import argparse
+import timeit
+import warnings
+warnings.filterwarnings("ignore")
+
+import numpy as np
+import xarray as xr
+
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, rootdir)
+
+# atlas1d needs a configuration directory providing variables_info
+os.environ.setdefault('ATLAS_CONFIG', os.path.join(rootdir, 'default_atlas'))
+
+import atlas1d.datacache as datacache
+import atlas1d.readers as readers
+
+_default_file = os.path.join(rootdir, 'test/ARMCU_REF_arp632.galbs_CMIP6_L91_300s_klevel.nc')
+
+def check(name, rd, ref):
+
+    lok = sorted(rd.variables()) == sorted(ref.variables)
+    for var in ref.variables:
+        b = ref[var]
+        lok = lok and tuple(rd.dims(var)) == b.dims and dict(rd.attrs(var)) == dict(b.attrs)
+        # Arrays read are float32, with NaN for missing values
+        lok = lok and np.array_equal(rd.read(var), readers.to_float32(b.values), equal_nan=(b.dtype.kind == 'f'))
+        a = rd.dataarray(var)
+        lok = lok and np.array_equal(a.values, b.values, equal_nan=(b.dtype.kind == 'f'))
+    print('  {0:25s} {1}'.format(name, 'OK' if lok else 'FAILED'))
+
+    return lok
+
+def patterns(filein, backend, var, var1D):
+    """
+    Functions reading filein like plotMUSC does, with a fresh dataset cache each time
+    """
+
+    def open_reader():
+        datacache.evict()
+        return readers.open_reader(filein, backend=backend)
+
+    def timeseries():
+        rd = open_reader()
+        return np.squeeze(rd.read(var1D)), rd.time()
+
+    def profile():
+        rd = open_reader()
+        it = slice(len(rd.time())-1, None)
+        return rd.read(var, it=it), rd.read('zfull', it=it)
+
+    def field():
+        rd = open_reader()
+        return rd.read(var)*1., rd.read('zhalf')
+
+    return [('open', open_reader), ('timeseries', timeseries), ('profile', profile), ('time-height', field)]
+
+def timing(name, func, repeat):
+
+    t = min(timeit.repeat(func, number=1, repeat=repeat))
+    print('  {0:25s} {1:10.3f} ms'.format(name, t*1000.))
+
+    return t
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", help="MUSC file (the test file by default)", type=str, default=_default_file)
+    parser.add_argument("--variable", help="2D variable read", type=str, default='theta')
+    parser.add_argument("--variable1D", help="1D variable read", type=str, default='hfss')
+    parser.add_argument("--repeat", help="Number of repetitions of timings", type=int, default=20)
+    args = parser.parse_args()
+
+    print('### {0}'.format(args.file))
+
+    print('Correctness (against xr.open_dataset):')
+    lok = True
+    with xr.open_dataset(args.file, use_cftime=True) as ref:
+        for backend in datacache.backends:
+            print('  {0:25s} {1}'.format('backend used by ' + backend, datacache.get_backend(args.file, backend, lreader=True)))
+            lok = check(backend, readers.open_reader(args.file, backend=backend), ref) and lok
+
+    times = {}
+    print('Timings (best of {0}):'.format(args.repeat))
+    for backend in datacache.backends:
+        for name, func in patterns(args.file, backend, args.variable, args.variable1D):
+            times[(backend, name)] = timing('{0} [{1}]'.format(name, backend), func, args.repeat)
+
+    print('Speed-up against xarray:')
+    for backend in datacache.backends[1:]:
+        for name, _ in patterns(args.file, backend, args.variable, args.variable1D):
+            print('  {0:25s} {1:10.1f}'.format('{0} [{1}]'.format(name, backend), times[('xarray', name)]/times[(backend, name)]))
+
+    if not(lok):
+        sys.exit(1)
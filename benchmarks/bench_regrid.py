@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding:UTF-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Check the vertical regridding of atlas1d.regrid against np.interp applied
+column by column, and time it with and without cached weights.
+
+Usage: bench_regrid.py [--nt NT] [--nlev NLEV] [--repeat N]
+"""
+
+import os
+import sys
+import argparse
+import timeit
+
+import numpy as np
+
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, rootdir)
+
+# atlas1d needs a configuration directory providing variables_info
+os.environ.setdefault('ATLAS_CONFIG', os.path.join(rootdir, 'default_atlas'))
+
+import atlas1d.regrid as regrid
+
+from benchmarks.bench_kernels import synthetic_column, check, timing
+
+def interp_old(data, src, tgt):
+    """
+    Loop version: np.interp for each column, NaN outside source levels
+    """
+
+    src = np.broadcast_to(src, data.shape[:-1] + src.shape[-1:])
+    tgt = np.broadcast_to(tgt, data.shape[:-1] + tgt.shape[-1:])
+
+    out = np.zeros(tgt.shape)
+    for it in range(data.shape[0]):
+        x = src[it]
+        y = data[it]
+        if x[0] > x[-1]:
+            x = x[::-1]
+            y = y[::-1]
+        out[it] = np.interp(tgt[it], x, y, left=np.nan, right=np.nan)
+
+    return out
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nt", help="Number of time steps", type=int, default=2000)
+    parser.add_argument("--nlev", help="Number of levels of the source grid", type=int, default=91)
+    parser.add_argument("--repeat", help="Number of repetitions of timings", type=int, default=5)
+    args = parser.parse_args()
+
+    lok = True
+    for lup in [True, False]:
+        zfull, _, _, theta = synthetic_column(args.nt, args.nlev, lup=lup)
+        # Target grid: LES-like regular levels, partly above the source grid
+        ztgt = np.linspace(10., 25000., 160)
+        src = zfull.values
+        data = theta.values
+        print('### nt={0}, nlev={1}, levels ordered {2}'.format(args.nt, args.nlev, 'upward' if lup else 'downward'))
+
+        print('Correctness:')
+        lok = check('time-varying levels', regrid.interpolate(data, src, ztgt), interp_old(data, src, ztgt)) and lok
+        lok = check('fixed levels', regrid.interpolate(data, src[0], ztgt), interp_old(data, src[0], ztgt)) and lok
+        lok = check('time-varying target', regrid.interpolate(data, src[0], src[::-1]), interp_old(data, src[0], src[::-1])) and lok
+
+        print('Timings (best of {0} for vectorized versions):'.format(args.repeat))
+        for name, src_loc in [('time-varying levels', src), ('fixed levels', src[0])]:
+            def new(src_loc=src_loc):
+                regrid._weights.clear()
+                return regrid.interpolate(data, src_loc, ztgt)
+            tnew = timing(name, new, args.repeat)
+            tcached = timing(name + ' (cached)', lambda src_loc=src_loc: regrid.interpolate(data, src_loc, ztgt), args.repeat)
+            told = timing(name + ' (loop)', lambda src_loc=src_loc: interp_old(data, src_loc, ztgt), 1)
+            print('  {0:25s} {1:10.1f}'.format('speed-up', told/tnew))
+            print('  {0:25s} {1:10.1f}'.format('speed-up (cached)', told/tcached))
+
+    if not(lok):
+        sys.exit(1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding:UTF-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Check the time alignment of atlas1d.timealign against loops over time steps
+(see tests/test_timealign.py), and time it with and without cached maps. Source times mimic LES outputs
+(every 10 min) and target times MUSC outputs (every 300 s).
+
+Usage: bench_timealign.py [--nt NT] [--nlev NLEV] [--repeat N]
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, rootdir)
+
+# atlas1d needs a configuration directory providing variables_info
+os.environ.setdefault('ATLAS_CONFIG', os.path.join(rootdir, 'default_atlas'))
+
+import atlas1d.timealign as timealign
+
+from benchmarks.bench_kernels import check, timing
+from tests.test_timealign import align_loop
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nt", help="Number of target time steps", type=int, default=20000)
+    parser.add_argument("--nlev", help="Number of levels", type=int, default=91)
+    parser.add_argument("--repeat", help="Number of repetitions of timings", type=int, default=5)
+    args = parser.parse_args()
+
+    # Target times every 300 s, source times every 10 min, shifted (without tie
+    # for nearest times) and shorter
+    tgt = np.arange(args.nt)*300./3600.
+    src = np.arange(int(0.9*args.nt)//2)*600./3600. + 0.2
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((len(src), args.nlev)).astype(np.float32)
+    # Fine source on coarse target for block means
+    tgt_coarse = tgt[::4]
+
+    lok = True
+    print('### {0} source times, {1} target times, nlev={2}'.format(len(src), len(tgt), args.nlev))
+    print('Correctness:')
+    lok = check('nearest', timealign.align(data, src, tgt, 'nearest'), align_loop(data, src, tgt, 'nearest')) and lok
+    lok = check('linear', timealign.align(data, src, tgt, 'linear'), align_loop(data, src, tgt, 'linear')) and lok
+    lok = check('mean', timealign.align(data, src, tgt_coarse, 'mean'), align_loop(data, src, tgt_coarse, 'mean')) and lok
+
+    print('Timings (best of {0} for vectorized versions):'.format(args.repeat))
+    for mode, tgt_loc in [('nearest', tgt), ('linear', tgt), ('mean', tgt_coarse)]:
+        def new(tgt_loc=tgt_loc, mode=mode):
+            timealign._maps.clear()
+            return timealign.align(data, src, tgt_loc, mode)
+        tnew = timing(mode, new, args.repeat)
+        tcached = timing(mode + ' (cached)', lambda tgt_loc=tgt_loc, mode=mode: timealign.align(data, src, tgt_loc, mode), args.repeat)
+        told = timing(mode + ' (loop)', lambda tgt_loc=tgt_loc, mode=mode: align_loop(data, src, tgt_loc, mode), 1)
+        print('  {0:25s} {1:10.1f}'.format('speed-up', told/tnew))
+        print('  {0:25s} {1:10.1f}'.format('speed-up (cached)', told/tcached))
+
+    if not(lok):
+        sys.exit(1)
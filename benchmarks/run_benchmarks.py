@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding:UTF-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Benchmark suite of SCM-atlas, run on synthetic MUSC files (see synthetic.py).
+
+Covered: derived variables (new_variables.compute), plotMUSC entry points,
+plotutils rendering, html interface (Atlas.tohtml, MultiAtlas.tohtml) and an
+end-to-end MultiAtlas.run of the ARMCU/REF atlas. Results are saved as JSON
+and may be compared with those of a previous run (e.g. another version).
+
+Usage: run_benchmarks.py [--nt NT] [--nlev NLEV] [--nvar NVAR] [--nsim NSIM]
+                         [--repeat N] [--only NAME] [--output FILE] [--compare FILE]
+"""
+
+import os
+import sys
+import argparse
+import json
+import time
+import datetime
+import platform
+import tempfile
+import shutil
+import importlib
+
+import warnings
+warnings.filterwarnings("ignore")
+import logging
+
+from collections import OrderedDict
+
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, rootdir)
+
+# atlas1d needs a configuration directory providing variables_info and atlas configs
+os.environ.setdefault('ATLAS_CONFIG', os.path.join(rootdir, 'default_atlas'))
+
+import numpy as np
+import netCDF4
+
+import atlas1d
+import atlas1d.datacache as datacache
+import atlas1d.new_variables as new_variables
+import atlas1d.plotMUSC as plotMUSC
+import atlas1d.plotutils as plotutils
+from atlas1d.Model import Model
+from atlas1d.Simulation import Simulation
+from atlas1d.MultiAtlas import MultiAtlas
+
+from benchmarks.synthetic import write_simulations, write_klevel, template_file
+
+# Case of the end-to-end benchmark, matching the period of the template file
+case = 'ARMCU'
+subcase = 'REF'
+tmin = datetime.datetime(1997,6,21,11)
+tmax = datetime.datetime(1997,6,22,2)
+
+_lines = ['r','b','g','m','c','y']
+
+def timing(func, repeat, setup=None):
+    """
+    Best and mean wall time of repeat runs of func, after a call to setup if given
+    """
+
+    if setup is not None:
+        setup()
+
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+
+    return OrderedDict([('best', min(times)), ('mean', sum(times)/len(times)), ('repeat', repeat)])
+
+def cold(func):
+    """
+    func run with an empty dataset cache, so that files are opened again
+    """
+
+    def wrapper():
+        datacache.evict()
+        return func()
+
+    return wrapper
+
+class Suite:
+
+    def __init__(self, workdir, nt=None, nlev=None, nvar=None, nsim=1, jobs=1):
+
+        self.workdir = workdir
+        self.jobs = jobs
+
+        logging.info('Writing {0} synthetic simulation(s) in {1}'.format(nsim, workdir))
+        self.files = write_simulations(os.path.join(workdir, 'simulations'), nsim=nsim, nt=nt, nlev=nlev, nvar=nvar)
+        self.names = ['SIM{0}'.format(i) for i in range(nsim)]
+
+        self.figdir = os.path.join(workdir, 'figures')
+        os.makedirs(self.figdir)
+
+        self.multi = None
+
+    def benchmarks(self):
+        """
+        Ordered list of (name, function, setup function or None) of all benchmarks
+        """
+
+        filein = OrderedDict(zip(self.names, self.files))
+        varname = lambda var: {k: var for k in filein}
+        lines = {k: _lines[i % len(_lines)] for i, k in enumerate(filein)}
+
+        out = []
+
+        for var in ['thetal','qt','lwp','zcb']:
+            fileout = os.path.join(self.workdir, 'compute_{0}.nc'.format(var))
+            out.append(('new_variables.compute[{0}]'.format(var),
+                        lambda var=var, fileout=fileout: new_variables.compute(self.files[0], fileout, var), None))
+
+        out.append(('plotMUSC.plot_timeseries', cold(lambda: plotMUSC.plot_timeseries(
+            filein, varname('hfss'), tmin=tmin, tmax=tmax, lines=lines, title='hfss',
+            namefig=os.path.join(self.figdir, 'TS_hfss.png'))), None))
+        out.append(('plotMUSC.plot2D', cold(lambda: plotMUSC.plot2D(
+            filein, varname('theta'), lev='zhalf', levunits='km', tmin=tmin, tmax=tmax, ymin=0., ymax=4.,
+            levels=list(range(300,321,1)), extend='both', cmap='RdBu_r', minmax=True, title='theta',
+            namefig={k: os.path.join(self.figdir, '2D_theta_{0}.png'.format(k)) for k in filein})), None))
+        out.append(('plotMUSC.plot_profile', cold(lambda: plotMUSC.plot_profile(
+            filein, varname('theta'), lev='zfull', levunits='km', tmin=tmin+datetime.timedelta(hours=7),
+            tmax=tmin+datetime.timedelta(hours=8), init=True, ymin=0., ymax=4., xmin=300., xmax=325.,
+            lines=lines, title='theta', namefig=os.path.join(self.figdir, 'AvgP_theta.png'))), None))
+
+        with netCDF4.Dataset(self.files[0]) as ds:
+            t = ds['time'][:]
+            z = ds['zfull'][:]/1000.
+            theta = ds['theta'][:]
+        X = np.broadcast_to(t, (z.shape[1], t.shape[0]))
+        out.append(('plotutils.plot1D', lambda: plotutils.plot1D(
+            {k: t for k in filein}, {k: theta[:,-1] for k in filein}, lines=lines,
+            namefig=os.path.join(self.figdir, 'plot1D.png')), None))
+        out.append(('plotutils.plot2D', lambda: plotutils.plot2D(
+            X, z.T, theta.T, levels=list(range(300,321,1)), ymin=0., ymax=4., cmap='RdBu_r',
+            namefig=os.path.join(self.figdir, 'plot2D.png')), None))
+        out.append(('plotutils.get_minmax', lambda: plotutils.get_minmax(
+            X, z.T, theta.T, t[0], t[-1], 0., 4.), None))
+
+        out.append(('MultiAtlas.run', cold(lambda: self.multi.run(lverbose=False, jobs=self.jobs, lforce=True)),
+                    self.set_multiatlas))
+        out.append(('MultiAtlas.tohtml', lambda: self.multi.tohtml(), self.set_rendered))
+        out.append(('Atlas.tohtml', lambda: self.multi.atlaslist[0].tohtml(index='{0}/index.html'.format(self.multi.html_dir)),
+                    self.set_rendered))
+
+        return out
+
+    def set_multiatlas(self):
+        """
+        Multi-atlas of the synthetic simulations for the ARMCU/REF case.
+        Missing references are replaced by synthetic files if SCM_REFERENCES was not set.
+        """
+
+        if self.multi is not None:
+            return
+
+        config = importlib.import_module('atlas_{0}'.format(case))
+        for ref in config.references:
+            if ref.ncfile.startswith(self.workdir) and not(os.path.exists(ref.ncfile)):
+                os.makedirs(os.path.dirname(ref.ncfile), exist_ok=True)
+                write_klevel(ref.ncfile, seed=len(self.files))
+
+        with netCDF4.Dataset(self.files[0]) as ds:
+            levgrid = 'L{0}'.format(ds.dimensions['levf'].size)
+        model = Model(name='synthetic', binVersion='synthetic', levgrid=levgrid, tstep=300)
+
+        simulations = OrderedDict([(case, OrderedDict([(subcase, [])]))])
+        for i, (name, f) in enumerate(zip(self.names, self.files)):
+            simulations[case][subcase].append(Simulation(name=name, model=model, case=case, subcase=subcase,
+                                                         ncfile=f, line=_lines[i % len(_lines)]))
+
+        self.multi = MultiAtlas('BENCH', simulations=simulations, root_dir=os.path.join(self.workdir, 'atlas'))
+
+    def set_rendered(self):
+        """
+        Multi-atlas with all its diagnostics rendered
+        """
+
+        self.set_multiatlas()
+        self.multi.run(lverbose=False, jobs=self.jobs)
+        if not(os.path.exists(self.multi.html_dir)):
+            os.makedirs(self.multi.html_dir)
+
+def compare(results, reference):
+    """
+    Print the best times of results against those of reference
+    """
+
+    print('### Comparison with {0} (atlas1d {1})'.format(reference['date'], reference['atlas1d']))
+    for name in results:
+        if name in reference['results']:
+            old = reference['results'][name]['best']
+            new = results[name]['best']
+            print('  {0:35s} {1:10.1f} ms {2:10.1f} ms {3:8.2f}x'.format(name, old*1000., new*1000., old/new))
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nt", help="Number of time steps (those of the test file by default)", type=int, default=None)
+    parser.add_argument("--nlev", help="Number of levels (those of the test file by default)", type=int, default=None)
+    parser.add_argument("--nvar", help="Number of variables besides coordinates (those of the test file by default)", type=int, default=None)
+    parser.add_argument("--nsim", help="Number of simulations", type=int, default=2)
+    parser.add_argument("--jobs", help="Number of processes of the end-to-end benchmark", type=int, default=1)
+    parser.add_argument("--repeat", help="Number of repetitions of timings", type=int, default=3)
+    parser.add_argument("--only", help="Run only benchmarks whose name contains ONLY", type=str, default=None)
+    parser.add_argument("--output", help="JSON file of results", type=str, default='benchmark_results.json')
+    parser.add_argument("--compare", help="JSON file of results of a previous run to compare with", type=str, default=None)
+    parser.add_argument("--workdir", help="Working directory, kept after the run (temporary directory by default)", type=str, default=None)
+    parser.add_argument("--debug", help="Active debug mode", dest='debug', action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)30s - %(levelname)s - %(message)s',
+                        level=logging.DEBUG if args.debug else logging.WARNING)
+
+    if args.workdir is None:
+        workdir = tempfile.mkdtemp(prefix='atlas1d_bench_')
+    else:
+        workdir = os.path.abspath(args.workdir)
+        os.makedirs(workdir)
+
+    # References are synthetic as well, unless given by the user
+    if os.getenv('SCM_REFERENCES') is None:
+        os.environ['SCM_REFERENCES'] = os.path.join(workdir, 'references')
+
+    try:
+        suite = Suite(workdir, nt=args.nt, nlev=args.nlev, nvar=args.nvar, nsim=args.nsim, jobs=args.jobs)
+
+        results = OrderedDict()
+        print('### Benchmarks (best and mean of {0})'.format(args.repeat))
+        for name, func, setup in suite.benchmarks():
+            if args.only is not None and not(args.only in name):
+                continue
+            results[name] = timing(func, args.repeat, setup=setup)
+            print('  {0:35s} {1:10.1f} ms {2:10.1f} ms'.format(name, results[name]['best']*1000., results[name]['mean']*1000.))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir)
+
+    with netCDF4.Dataset(template_file) as ds:
+        nt = args.nt if args.nt is not None else ds.dimensions['time'].size
+        nlev = args.nlev if args.nlev is not None else ds.dimensions['levf'].size
+
+    out = OrderedDict()
+    out['atlas1d'] = atlas1d.__version__
+    out['date'] = datetime.datetime.now().isoformat(timespec='seconds')
+    out['python'] = platform.python_version()
+    out['platform'] = platform.platform()
+    out['parameters'] = OrderedDict([('nt', nt), ('nlev', nlev), ('nvar', args.nvar), ('nsim', args.nsim),
+                                     ('jobs', args.jobs), ('repeat', args.repeat)])
+    out['results'] = results
+
+    with open(args.output, 'w') as f:
+        f.write(json.dumps(out, indent=1))
+    print('Results written in {0}'.format(args.output))
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            compare(results, json.loads(f.read()))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding:UTF-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Generator of synthetic MUSC output files (Out_klevel.nc).
+
+Files are built from a template MUSC file (by default the test file of
+SCM-atlas) whose variables are linearly resampled to the requested number
+of time steps and levels, over the same period, and slightly perturbed so
+that simulations differ. They have the same format, dimensions, variable
+names and attributes as the template.
+
+Usage: synthetic.py [--nt NT] [--nlev NLEV] [--nvar NVAR] [--nsim NSIM] dirout
+"""
+
+import os
+import argparse
+
+import numpy as np
+import netCDF4
+
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+template_file = os.path.join(rootdir, 'test/ARMCU_REF_arp632.galbs_CMIP6_L91_300s_klevel.nc')
+
+# Variables always written, whatever the number of variables asked for
+coordinates = ['time','levf','levh','zfull','zhalf','pfull','phalf']
+
+def resample(a, n, axis=0):
+    """
+    Linear resampling of a on n equally spaced points along axis,
+    first and last points being kept
+    """
+
+    a = np.moveaxis(a, axis, -1)
+    nold = a.shape[-1]
+
+    if nold == n:
+        return np.moveaxis(a, -1, axis)
+
+    x = np.linspace(0., nold-1., n)
+    i0 = np.minimum(np.floor(x).astype(int), nold-2)
+    w = x - i0
+
+    out = a[...,i0]*(1.-w) + a[...,i0+1]*w
+
+    return np.moveaxis(out, -1, axis)
+
+def _read(var):
+
+    return np.ma.filled(np.ma.asarray(var[:], dtype=np.float64), np.nan)
+
+def write_klevel(fileout, nt=None, nlev=None, nvar=None, seed=0, perturbation=0.01, template=template_file):
+    """
+    Write in fileout a synthetic MUSC file with nt time steps, nlev full levels
+    and nvar variables besides coordinates (those of template if None).
+    Variables in excess of those of template are copies of them with a numbered suffix.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    with netCDF4.Dataset(template, 'r') as src:
+        src.set_auto_mask(False)
+
+        ntold = len(src.dimensions['time'])
+        nlevold = len(src.dimensions['levf'])
+        if nt is None:
+            nt = ntold
+        if nlev is None:
+            nlev = nlevold
+        size = {'time': nt, 'levf': nlev, 'levh': nlev+1}
+
+        variables = [var for var in src.variables if not(var in coordinates)]
+        if nvar is None:
+            nvar = len(variables)
+        names = [(var, var) for var in variables[:nvar]]
+        k = 1
+        while len(names) < nvar:
+            names.extend([('{0}_{1}'.format(var,k), var) for var in variables[:nvar-len(names)]])
+            k += 1
+
+        with netCDF4.Dataset(fileout, 'w', format=src.data_model) as dst:
+            for dim in src.dimensions:
+                dst.createDimension(dim, None if src.dimensions[dim].isunlimited() else size[dim])
+
+            for name, var in [(var, var) for var in coordinates if var in src.variables] + names:
+                vin = src.variables[var]
+                attrs = {att: vin.getncattr(att) for att in vin.ncattrs()}
+                fill = attrs.pop('_FillValue', None)
+                vout = dst.createVariable(name, vin.dtype, vin.dimensions, fill_value=fill)
+                vout.setncatts(attrs)
+
+                data = _read(vin)
+                if fill is not None:
+                    data[data == fill] = np.nan
+                for i, dim in enumerate(vin.dimensions):
+                    data = resample(data, size[dim], axis=i)
+
+                if var in ['levf','levh']:
+                    data = data[0] + np.arange(size[var])
+                elif not(var in coordinates) and data.ndim > 0:
+                    data = data*(1. + perturbation*rng.standard_normal(data.shape))
+
+                if fill is not None:
+                    data = np.where(np.isnan(data), fill, data)
+                vout[:] = data.astype(vin.dtype)
+
+    return fileout
+
+def write_simulations(dirout, nsim=1, nt=None, nlev=None, nvar=None, template=template_file):
+    """
+    Write nsim synthetic MUSC files in dirout and return their names
+    """
+
+    if not(os.path.exists(dirout)):
+        os.makedirs(dirout)
+
+    files = []
+    for i in range(nsim):
+        fileout = os.path.join(dirout, 'SIM{0}_Out_klevel.nc'.format(i))
+        files.append(write_klevel(fileout, nt=nt, nlev=nlev, nvar=nvar, seed=i, template=template))
+
+    return files
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dirout", help="Output directory", type=str)
+    parser.add_argument("--nt", help="Number of time steps (those of the template by default)", type=int, default=None)
+    parser.add_argument("--nlev", help="Number of levels (those of the template by default)", type=int, default=None)
+    parser.add_argument("--nvar", help="Number of variables besides coordinates (those of the template by default)", type=int, default=None)
+    parser.add_argument("--nsim", help="Number of simulations", type=int, default=1)
+    parser.add_argument("--template", help="Template MUSC file", type=str, default=template_file)
+    args = parser.parse_args()
+
+    for f in write_simulations(args.dirout, nsim=args.nsim, nt=args.nt, nlev=args.nlev, nvar=args.nvar, template=args.template):
+        print(f)
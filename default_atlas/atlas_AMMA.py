@@ -9,7 +9,6 @@ import os
 from collections import OrderedDict
 
 from datetime import datetime, timedelta
-from matplotlib import cm # for colormaps
 
 import atlas1d
 from atlas1d.Dataset import Dataset
@@ -68,8 +67,8 @@ diagnostics = OrderedDict([
         'variables': OrderedDict([
             #('theta', {'levels': list(range(300,321,1))   , 'extend':'both'                 }),
             ('thetal', {'levels': list(range(300,321,1))  , 'extend':'both'                 }),
-            #('qv'   , {'levels': [0] + list(range(4,18,1)), 'extend':'max', 'cmap': cm.RdBu }),
-            ('qt'   , {'levels': [0] + list(range(4,18,1)), 'extend':'max', 'cmap': cm.RdBu }),
+            #('qv'   , {'levels': [0] + list(range(4,18,1)), 'extend':'max', 'cmap': 'RdBu'  }),
+            ('qt'   , {'levels': [0] + list(range(4,18,1)), 'extend':'max', 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_thermo
     #######################
@@ -101,14 +100,14 @@ diagnostics = OrderedDict([
         'dtlabel'  : '1h'                ,
         'xname'    : '10 July 2006 (UTC)',
         'variables': OrderedDict([
-            ('cl' , {'levels': [0,1] + list(range(4,21,2))   , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('ql' , {'levels': list(range(0,41,4))           , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qi' , {'levels': list(range(0,41,4))           , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qc' , {'levels': list(range(0,41,4))           , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qr' , {'levels': [i*4 for i in range(0,11,1)], 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qsn', {'levels': [i*4 for i in range(0,11,1)], 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qg' , {'levels': [i*4 for i in range(0,11,1)], 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qp' , {'levels': [i*4 for i in range(0,11,1)], 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
+            ('cl' , {'levels': [0,1] + list(range(4,21,2))   , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('ql' , {'levels': list(range(0,41,4))           , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qi' , {'levels': list(range(0,41,4))           , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qc' , {'levels': list(range(0,41,4))           , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qr' , {'levels': [i*4 for i in range(0,11,1)], 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qsn', {'levels': [i*4 for i in range(0,11,1)], 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qg' , {'levels': [i*4 for i in range(0,11,1)], 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qp' , {'levels': [i*4 for i in range(0,11,1)], 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_cloud
     #######################
@@ -9,7 +9,6 @@ import os
 from collections import OrderedDict
 
 from datetime import datetime, timedelta
-from matplotlib import cm # for colormaps
 
 import atlas1d
 from atlas1d.Dataset import Dataset
@@ -72,7 +71,7 @@ diagnostics = OrderedDict([
         'xname'    : '13-14 June 1992 (UTC)',
         'variables': OrderedDict([
             ('theta', {'levels': list(range(285,306,1)), 'extend':'both'                 }),
-            ('qv'   , {'levels': list(range(0,14,1))   , 'extend':'max', 'cmap': cm.RdBu }),
+            ('qv'   , {'levels': list(range(0,14,1))   , 'extend':'max', 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_thermo
     #######################
@@ -104,9 +103,9 @@ diagnostics = OrderedDict([
         'dtlabel'  : '6h'                ,
         'xname'    : '13-14 June 1992 (UTC)',
         'variables': OrderedDict([
-            ('cl', {'levels': [0,1,5] + list(range(10,100,10)) + [95,100],                 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('ql', {'levels': list(range(0,601,50))                      , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qr', {'levels': [0,1]+list(range(1,31,2))                  , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
+            ('cl', {'levels': [0,1,5] + list(range(10,100,10)) + [95,100],                 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('ql', {'levels': list(range(0,601,50))                      , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qr', {'levels': [0,1]+list(range(1,31,2))                  , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_cloud
     #######################
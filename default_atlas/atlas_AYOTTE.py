@@ -7,7 +7,6 @@
 from collections import OrderedDict
 
 from datetime import datetime, timedelta
-from matplotlib import cm # for colormaps
 
 ####################################
 # Configuration file for AYOTTE atlas
@@ -10,7 +10,6 @@ from collections import OrderedDict
 
 from datetime import datetime, timedelta
 import numpy as np
-from matplotlib import cm # for colormaps
 
 import atlas1d
 from atlas1d.Dataset import Dataset
@@ -67,7 +66,7 @@ diagnostics = OrderedDict([
         'xname'    : '14-15 July 1987 (UTC)',
         'variables': OrderedDict([
             ('thetal', {'levels': np.arange(285,301,1), 'extend':'both'                 }),
-            ('qt'   ,  {'levels': np.arange(0,11,1)   , 'extend':'max', 'cmap': cm.RdBu }),
+            ('qt'   ,  {'levels': np.arange(0,11,1)   , 'extend':'max', 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_thermo
     #######################
@@ -99,9 +98,9 @@ diagnostics = OrderedDict([
         'dtlabel'  : '6h'                ,
         'xname'    : '14-15 July 1987 (UTC)',
         'variables': OrderedDict([
-            ('cl', {'levels': [0,1,5] + list(range(10,100,10)) + [95,100],                 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('ql', {'levels': list(range(0,451,30))                      , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qr', {'levels': [0.5*i for i in range(0,11)]               , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
+            ('cl', {'levels': [0,1,5] + list(range(10,100,10)) + [95,100],                 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('ql', {'levels': list(range(0,451,30))                      , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qr', {'levels': [0.5*i for i in range(0,11)]               , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_cloud
     #######################
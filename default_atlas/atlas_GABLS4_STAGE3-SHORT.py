@@ -11,7 +11,6 @@ from collections import OrderedDict
 import numpy as np
 
 from datetime import datetime, timedelta
-from matplotlib import cm # for colormaps
 
 import atlas1d
 from atlas1d.Dataset import Dataset
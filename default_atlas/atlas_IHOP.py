@@ -9,7 +9,6 @@ import os
 from collections import OrderedDict
 
 from datetime import datetime, timedelta
-from matplotlib import cm # for colormaps
 
 import atlas1d
 from atlas1d.Dataset import Dataset
@@ -66,7 +65,7 @@ diagnostics = OrderedDict([
         'xname'    : '14 June 2002 (UTC)',
         'variables': OrderedDict([
             ('theta', {'levels': list(range(296,316,1)), 'extend':'both'                 }),
-            ('qv'   , {'levels': list(range(0,12,1))   , 'extend':'max', 'cmap': cm.RdBu }),
+            ('qv'   , {'levels': list(range(0,12,1))   , 'extend':'max', 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_thermo
     #######################
@@ -9,7 +9,6 @@ import os
 from collections import OrderedDict
 
 from datetime import datetime, timedelta
-from matplotlib import cm # for colormaps
 
 import atlas1d
 from atlas1d.Dataset import Dataset
@@ -68,7 +67,7 @@ diagnostics = OrderedDict([
         'xname'    : '16 December 2004 (UTC)',
         'variables': OrderedDict([
             ('theta', {'levels': list(range(297,315,1))  , 'extend':'both'                 }),
-            ('qv'   , {'levels': [0,]+list(range(3,17,1)), 'extend':'max', 'cmap': cm.RdBu }),
+            ('qv'   , {'levels': [0,]+list(range(3,17,1)), 'extend':'max', 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_thermo
     #######################
@@ -100,9 +99,9 @@ diagnostics = OrderedDict([
         'dtlabel'  : '2h'                    ,
         'xname'    : '16 December 2004 (UTC)',
         'variables': OrderedDict([
-            ('cl', {'levels': list(range(0,16,1))           , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('ql', {'levels': list(range(0,21,1))           , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qr', {'levels': [i*0.2 for i in range(0,21,1)], 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
+            ('cl', {'levels': list(range(0,16,1))           , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('ql', {'levels': list(range(0,21,1))           , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qr', {'levels': [i*0.2 for i in range(0,21,1)], 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_cloud
     #######################
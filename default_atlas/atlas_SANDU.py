@@ -7,7 +7,6 @@
 from collections import OrderedDict
 
 from datetime import datetime, timedelta
-from matplotlib import cm # for colormaps
 
 ####################################
 # Configuration file for SANDU atlas
@@ -47,7 +46,7 @@ diagnostics = OrderedDict([
         'xname'    : '15-18 July 2006 (UTC)',
         'variables': OrderedDict([
             ('theta', {'levels': list(range(290,306,1)), 'extend':'both'                 }),
-            ('qv'   , {'levels': list(range(0,14,1))   , 'extend':'max', 'cmap': cm.RdBu }),
+            ('qv'   , {'levels': list(range(0,14,1))   , 'extend':'max', 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_thermo
     #######################
@@ -79,9 +78,9 @@ diagnostics = OrderedDict([
         'dtlabel'  : '6h'                ,
         'xname'    : '15-18 July 2006 (UTC)',
         'variables': OrderedDict([
-            ('cl', {'levels': [0,1,5] + list(range(10,100,10)) + [95,100],                 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('ql', {'levels': list(range(0,451,30))                      , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
-            ('qr', {'levels': [0.5*i for i in range(0,11)]               , 'extend':'max', 'firstwhite':True, 'cmap': cm.RdBu }),
+            ('cl', {'levels': [0,1,5] + list(range(10,100,10)) + [95,100],                 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('ql', {'levels': list(range(0,451,30))                      , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
+            ('qr', {'levels': [0.5*i for i in range(0,11)]               , 'extend':'max', 'firstwhite':True, 'cmap': 'RdBu'  }),
         ]),
     }), # end 2D_cloud
     #######################
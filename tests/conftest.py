@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of atlas1d, run with pytest from the root directory of SCM-atlas
+"""
+
+import os
+import sys
+
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, rootdir)
+
+# atlas1d needs a configuration directory providing variables_info
+os.environ.setdefault('ATLAS_CONFIG', os.path.join(rootdir, 'default_atlas'))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the persistent cache of derived variables of atlas1d.derivedcache
+"""
+
+import os
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import atlas1d.derivedcache as derivedcache
+
+from tests.test_readplan import write_levels
+
+sizes = {'time': 11, 'levf': 10, 'levh': 11}
+
+def derived(k=0.):
+
+    return xr.DataArray(300. + k + np.arange(110.).reshape((11,10)), dims=('time','levf'), attrs={'units': 'K'})
+
+@pytest.fixture
+def filein(tmp_path):
+
+    return write_levels(str(tmp_path / 'file.nc'))
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+
+    monkeypatch.setenv('SCM_REFERENCES', str(tmp_path / 'refs'))
+    return derivedcache.shared_dir()
+
+def test_put_get(tmp_path, filein):
+
+    cache = derivedcache.DerivedCache(cachedir=str(tmp_path / 'user'))
+    assert cache.get(filein, 'thv', sizes) is None
+
+    cache.put(filein, 'thv', derived())
+    out = cache.get(filein, 'thv', sizes)
+    np.testing.assert_array_equal(out.values, derived().values)
+    assert out.dims == ('time','levf') and out.attrs['units'] == 'K'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    # Other variables and missing files are not found
+    assert cache.get(filein, 'rv', sizes) is None
+    assert cache.get(str(tmp_path / 'none.nc'), 'thv', sizes) is None
+
+def test_disabled(tmp_path, filein):
+
+    cache = derivedcache.DerivedCache(cachedir='')
+    cache.put(filein, 'thv', derived())
+    assert cache.get(filein, 'thv', sizes) is None
+    assert cache.entries() == []
+
+def test_shared(tmp_path, filein, shared):
+
+    assert shared == os.path.join(str(tmp_path / 'refs'), derivedcache.shared_dirname)
+
+    # Entries of the shared cache, e.g. written by apptools/warm_cache.py
+    derivedcache.DerivedCache(cachedir=shared).put(filein, 'thv', derived())
+    (path, _, mtime), = derivedcache.DerivedCache(cachedir=shared).entries()
+    os.utime(path, (1000., 1000.))
+
+    cache = derivedcache.DerivedCache(cachedir=str(tmp_path / 'user'), shared=shared)
+    np.testing.assert_array_equal(cache.get(filein, 'thv', sizes).values, derived().values)
+
+    # The shared cache is only read: entries neither copied nor touched
+    assert cache.entries() == []
+    assert os.stat(path).st_mtime == 1000.
+    cache.maxsize = 0
+    cache.shrink()
+    assert os.path.exists(path)
+
+    # User entries first
+    cache.put(filein, 'thv', derived(1.))
+    np.testing.assert_array_equal(cache.get(filein, 'thv', sizes).values, derived(1.).values)
+
+    # A cache directory is not shared with itself
+    assert derivedcache.DerivedCache(cachedir=shared, shared=shared).shared == []
+
+def test_size_mismatch(tmp_path, filein):
+
+    cache = derivedcache.DerivedCache(cachedir=str(tmp_path / 'user'))
+    cache.put(filein, 'thv', derived())
+
+    assert cache.get(filein, 'thv', {'time': 5, 'levf': 10}) is None
+    assert cache.get(filein, 'thv', {'time': 11}) is None
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 2
+
+    # Datasets opened with xarray give their sizes
+    with xr.open_dataset(filein) as ds:
+        assert cache.get(filein, 'thv', ds) is not None
+
+def test_shrink(tmp_path, filein):
+
+    cache = derivedcache.DerivedCache(cachedir=str(tmp_path / 'user'))
+    for var in ['a','b','c']:
+        cache.put(filein, var, derived())
+
+    paths = {}
+    for path, size, _ in cache.entries():
+        with xr.open_dataset(path) as tmp:
+            paths[list(tmp.data_vars)[0]] = path
+    for var, mtime in [('a',1000.), ('b',2000.), ('c',3000.)]:
+        os.utime(paths[var], (mtime, mtime))
+
+    # Reading an entry makes it the most recently used
+    assert cache.get(filein, 'a', sizes) is not None
+    assert os.stat(paths['a']).st_mtime > 3000.
+
+    # Least recently used entries removed first
+    cache.maxsize = 2*size
+    cache.shrink()
+    assert sorted([e[0] for e in cache.entries()]) == sorted([paths['a'], paths['c']])
+    assert cache.stats()['evictions'] == 1
+
+    cache.shrink()
+    assert cache.stats()['evictions'] == 1
+
+    cache.maxsize = 0
+    cache.shrink()
+    assert cache.entries() == [] and cache.stats()['evictions'] == 3
+
+def test_invalidation(tmp_path, filein, monkeypatch):
+
+    cache = derivedcache.DerivedCache(cachedir=str(tmp_path / 'user'))
+    cache.put(filein, 'thv', derived())
+    key = cache.key(filein, 'thv')
+
+    # Other version of the code deriving variables
+    monkeypatch.setattr(derivedcache, '_cache_version', derivedcache._cache_version + 1)
+    assert not(cache.key(filein, 'thv') == key)
+    assert cache.get(filein, 'thv', sizes) is None
+    monkeypatch.undo()
+    assert cache.get(filein, 'thv', sizes) is not None
+
+    # Modified source file
+    write_levels(filein, nt=12)
+    os.utime(filein, (5000., 5000.))
+    assert cache.get(filein, 'thv', dict(sizes, time=12)) is None
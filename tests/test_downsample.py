@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the downsampling of plotted data of atlas1d.downsample
+"""
+
+import numpy as np
+import numpy.ma as ma
+
+import atlas1d.downsample as downsample
+
+def test_minmax_line():
+
+    rng = np.random.default_rng(0)
+    x = np.arange(1000.)
+    y = rng.normal(size=1000)
+
+    xs, ys = downsample.minmax_line(x, y, 10)
+    assert len(xs) <= 20 and np.all(np.diff(xs) > 0)
+    np.testing.assert_array_equal(ys, y[xs.astype(int)])
+
+    # Extremes of each group of samples preserved
+    for k in range(10):
+        group = slice(100*k, 100*(k+1))
+        assert x[group][np.argmin(y[group])] in xs
+        assert x[group][np.argmax(y[group])] in xs
+
+def test_minmax_line_small():
+
+    x = np.arange(20.)
+    y = np.sin(x)
+
+    xs, ys = downsample.minmax_line(x, y, 10)
+    assert xs is x and ys is y
+    xs, ys = downsample.minmax_line(x, y, 0)
+    assert xs is x and ys is y
+
+    # Last group shorter than others
+    xs, ys = downsample.minmax_line(x[:19], y[:19], 4)
+    assert xs[-1] < 19 and np.argmax(y[15:19]) + 15 in xs
+
+def test_minmax_line_gaps():
+
+    x = np.arange(100.)
+    y = np.cos(x/7.).astype(np.float32)
+    y[30:40] = np.nan
+    y[45] = np.nan
+
+    xs, ys = downsample.minmax_line(x, y, 10)
+    assert ys.dtype == np.float32
+
+    # Groups with missing values only keep their first sample: gaps are preserved
+    assert 30. in xs and np.isnan(ys[list(xs).index(30.)])
+    assert not(np.any((xs > 30.) & (xs < 40.)))
+    # Missing values are ignored otherwise
+    assert not(np.any(np.isnan(ys[xs != 30.])))
+    assert x[40:50][np.nanargmin(y[40:50])] in xs and x[40:50][np.nanargmax(y[40:50])] in xs
+
+    # Same for masked values
+    ym = ma.masked_invalid(y)
+    xm, _ = downsample.minmax_line(x, ym, 10)
+    np.testing.assert_array_equal(xm, xs)
+
+def test_block_mean():
+
+    a = np.arange(10.)
+    np.testing.assert_allclose(downsample.block_mean(a, 4), [1.5, 5.5, 8.5])
+
+    # Missing values ignored, NaN for blocks with missing values only
+    a[0] = np.nan
+    a[4:8] = np.nan
+    np.testing.assert_allclose(downsample.block_mean(a, 4), [2., np.nan, 8.5])
+    np.testing.assert_allclose(downsample.block_mean(ma.masked_invalid(a), 4), [2., np.nan, 8.5])
+
+    a = np.arange(12, dtype=np.float32).reshape((6,2))
+    out = downsample.block_mean(a, 3, axis=0)
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(out, [[2., 3.], [8., 9.]])
+
+def test_block_mesh_edges():
+
+    nlev, nt = 3, 10
+    data = np.tile(np.arange(float(nt)), (nlev,1))
+    x = np.tile(np.arange(nt+1.) - 0.5, (nlev+1,1))
+    y = np.tile(np.arange(nlev+1.)[:,None], (1,nt+1))
+
+    X, Y, out = downsample.block_mesh(x, y, data, 3)
+
+    # Blocks of 4 time steps, the last one shorter: edges of blocks kept
+    assert out.shape == (nlev,3)
+    assert X.shape == Y.shape == (nlev+1,4)
+    np.testing.assert_array_equal(X[0], [-0.5, 3.5, 7.5, 9.5])
+    np.testing.assert_array_equal(Y, y[:,:4])
+    np.testing.assert_allclose(out[0], [1.5, 5.5, 8.5])
+
+def test_block_mesh_centers():
+
+    nlev, nt = 3, 10
+    data = np.tile(np.arange(float(nt)), (nlev,1))
+    x = np.tile(np.arange(float(nt)), (nlev,1))
+    y = np.tile(np.arange(float(nlev))[:,None], (1,nt))
+
+    X, Y, out = downsample.block_mesh(x, y, data, 3)
+
+    # Centers of cells averaged as data
+    assert X.shape == Y.shape == out.shape == (nlev,3)
+    np.testing.assert_allclose(X[0], [1.5, 5.5, 8.5])
+    np.testing.assert_allclose(Y[:,0], np.arange(nlev))
+
+    # Fields not larger than the output resolution unchanged
+    X, Y, out = downsample.block_mesh(x, y, data, 10)
+    assert X is x and Y is y and out is data
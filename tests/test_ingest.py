@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the ingestion of MUSC files into stores (atlas1d.ingest)
+"""
+
+import os
+import json
+
+import numpy as np
+import pytest
+import xarray as xr
+
+netCDF4 = pytest.importorskip('netCDF4')
+
+import atlas1d.ingest as ingest
+
+from tests.test_mmapreader import write_file
+
+@pytest.fixture
+def ncfile(tmp_path):
+
+    ncfile = str(tmp_path / 'Out_klevel.nc')
+    write_file(ncfile, 'NETCDF3_64BIT_OFFSET', nt=50, nlev=20)
+
+    return ncfile
+
+def touch(filein, dt=1):
+    # Modification time of filein moved forward by dt seconds
+
+    st = os.stat(filein)
+    os.utime(filein, ns=(st.st_atime_ns, st.st_mtime_ns + dt*10**9))
+
+def test_ingest(ncfile):
+
+    dirout = ingest.ingest(ncfile, variables=['ta','ps'], storedir=None)
+    assert dirout == ncfile + '.store'
+
+    with xr.open_dataset(ncfile, use_cftime=True) as ref:
+        for layout in ingest.layouts:
+            storefile = ingest.find(ncfile, layout, ['ta','ps'], storedir=None)
+            assert storefile == os.path.join(dirout, '{0}.nc'.format(layout))
+            with xr.open_dataset(storefile, use_cftime=True) as ds:
+                # Only the selected variables and the dimension variables
+                assert sorted(ds.variables) == ['ps','ta','time']
+                assert list(ds['time'].values) == list(ref['time'].values)
+                for var in ['ta','ps']:
+                    assert ds[var].dtype == np.float32
+                    assert ds[var].attrs == ref[var].attrs
+                    np.testing.assert_array_equal(ds[var].values, ref[var].values.astype(np.float32))
+
+    # Time series in time.nc, profiles in level.nc
+    with netCDF4.Dataset(os.path.join(dirout, 'time.nc')) as nc:
+        assert nc.variables['ta'].chunking()[0] == 50
+    with netCDF4.Dataset(os.path.join(dirout, 'level.nc')) as nc:
+        assert nc.variables['ta'].chunking()[1] == 20
+
+def test_store_dir(ncfile, tmp_path):
+
+    storedir = str(tmp_path / 'stores')
+    dirout = ingest.ingest(ncfile, variables=['ta'], storedir=storedir)
+
+    assert os.path.dirname(dirout) == storedir
+    assert dirout.endswith('_Out_klevel.nc.store')
+    assert ingest.find(ncfile, 'time', ['ta'], storedir=storedir) is not None
+    assert ingest.find(ncfile, 'time', ['ta'], storedir=None) is None
+
+def test_signature_mismatch(ncfile):
+
+    ingest.ingest(ncfile, variables=['ta'], storedir=None)
+    assert ingest.find(ncfile, 'time', ['ta'], storedir=None) is not None
+
+    # Source modified after ingestion
+    touch(ncfile)
+    assert ingest.find(ncfile, 'time', ['ta'], storedir=None) is None
+
+    # Ingested again
+    ingest.ingest(ncfile, variables=['ta'], storedir=None)
+    assert ingest.find(ncfile, 'time', ['ta'], storedir=None) is not None
+
+    # Source replaced by another file
+    write_file(ncfile, 'NETCDF3_64BIT_OFFSET', nt=10, nlev=20)
+    assert ingest.find(ncfile, 'time', ['ta'], storedir=None) is None
+
+def test_missing_variables(ncfile):
+
+    ingest.ingest(ncfile, variables=['ta'], storedir=None)
+
+    # Variables of the source not in the store
+    assert ingest.find(ncfile, 'time', ['ta','ps'], storedir=None) is None
+    # All the variables of the source
+    assert ingest.find(ncfile, 'level', storedir=None) is None
+    # Variables not in the source either
+    assert ingest.find(ncfile, 'time', ['ta','ua'], storedir=None) is not None
+
+    with pytest.raises(ValueError):
+        ingest.find(ncfile, 'column', storedir=None)
+
+def test_uptodate(ncfile):
+
+    dirout = ingest.ingest(ncfile, variables=['ta'], storedir=None)
+    storefile = os.path.join(dirout, 'time.nc')
+    mtime = os.stat(storefile).st_mtime_ns
+
+    # Not written again if up to date, unless forced
+    ingest.ingest(ncfile, variables=['ta'], storedir=None)
+    assert os.stat(storefile).st_mtime_ns == mtime
+
+    ingest.ingest(ncfile, variables=['ta'], storedir=None, lforce=True)
+    assert not(os.stat(storefile).st_mtime_ns == mtime)
+    assert sorted(os.listdir(dirout)) == ['level.nc','store.json','time.nc']
+
+def test_store_description(ncfile):
+
+    dirout = ingest.ingest(ncfile, variables=['ta'], storedir=None)
+    filein = os.path.join(dirout, 'store.json')
+
+    with open(filein, 'r') as f:
+        info = json.loads(f.read())
+    assert sorted(info['variables']) == ['ta','time']
+    assert ingest.find(ncfile, 'time', ['ta'], storedir=None) is not None
+
+    # Another version of stores
+    info['version'] = ingest._store_version + 1
+    with open(filein, 'w') as f:
+        f.write(json.dumps(info))
+    touch(filein)
+    assert ingest.find(ncfile, 'time', ['ta'], storedir=None) is None
+
+    # Corrupted description
+    with open(filein, 'w') as f:
+        f.write('{"version": ')
+    touch(filein, 2)
+    assert ingest.find(ncfile, 'time', ['ta'], storedir=None) is None
+
+def test_missing_source(tmp_path):
+
+    with pytest.raises(ValueError):
+        ingest.ingest(str(tmp_path / 'missing.nc'), variables=['ta'], storedir=None)
+
+def test_chunks():
+
+    sizes = {'time': 1000, 'levf': 91, 'levh': 92}
+
+    # Whole time series of a few levels
+    chunks = ingest._chunks(('time','levf'), sizes, 'time')
+    assert chunks[0] == 1000 and 1 <= chunks[1] <= 91
+    assert chunks[0]*chunks[1]*4 <= max(ingest._chunk_bytes, 1000*4)
+
+    # Whole profiles of a few time steps
+    chunks = ingest._chunks(('time','levh'), sizes, 'level')
+    assert chunks[1] == 92 and 1 <= chunks[0] <= 1000
+    assert chunks[0]*chunks[1]*4 <= ingest._chunk_bytes
+
+    # Variables without time dimension are a single chunk
+    assert ingest._chunks(('levf',), sizes, 'time') == [91]
+    assert ingest._chunks(('time',), sizes, 'level') == [1000]
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the measures of atlas1d.instrument
+"""
+
+import tracemalloc
+
+import numpy as np
+
+import atlas1d.instrument as instrument
+
+def test_phases():
+
+    with instrument.Recorder() as recorder:
+        instrument.set_phase('read')
+        instrument.set_phase('compute')
+
+    report = recorder.report({'dat': ['theta']})
+    assert list(report['phases'].keys()) == instrument.phases
+    assert report['wall'] >= sum(report['phases'].values()) - 1.e-6
+    assert report['error'] == {'dat': ['theta']}
+
+    # Nothing recorded outside recorders
+    instrument.set_phase('read')
+
+def test_memory(monkeypatch):
+
+    monkeypatch.delenv('ATLAS1D_TRACE_MEMORY', raising=False)
+    with instrument.Recorder() as recorder:
+        pass
+    assert recorder.peak_memory is None
+    assert recorder.rss_growth is None or recorder.rss_growth >= 0
+
+    # Peak allocated within each recorder
+    instrument.trace_memory()
+    try:
+        with instrument.Recorder() as recorder:
+            data = np.ones(10**6)
+            del data
+        assert recorder.peak_memory >= 8*10**6
+        with instrument.Recorder() as recorder:
+            pass
+        assert recorder.peak_memory < 10**6
+    finally:
+        instrument.trace_memory(False)
+        tracemalloc.stop()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the vectorized column diagnostics of atlas1d.kernels against loops
+over time steps and levels
+"""
+
+import numpy as np
+import pytest
+
+import atlas1d.constants as cc
+import atlas1d.kernels as kernels
+
+def _profiles(z, nt):
+    # Heights given at each time step
+
+    z = np.asarray(z, dtype=np.float64)
+    if z.ndim == 1:
+        z = np.tile(z, (nt,1))
+
+    return z
+
+def cloud_base_loop(z, cf, missing=np.nan):
+    """
+    Loop version of atlas1d.kernels.cloud_base
+    """
+
+    nt, nlev = cf.shape
+    z = _profiles(z, nt)
+    zcb = np.zeros(nt) + missing
+    for it in range(nt):
+        for ilev in np.argsort(z[it]):
+            if cf[it,ilev] >= kernels.cloud_threshold:
+                zcb[it] = z[it,ilev]
+                break
+
+    return zcb
+
+def cloud_top_loop(z, cf, missing=np.nan):
+    """
+    Loop version of atlas1d.kernels.cloud_top
+    """
+
+    nt, nlev = cf.shape
+    z = _profiles(z, nt)
+    zct = np.zeros(nt) + missing
+    for it in range(nt):
+        for ilev in np.argsort(z[it])[::-1]:
+            if cf[it,ilev] >= kernels.cloud_threshold:
+                zct[it] = z[it,ilev]
+                break
+
+    return zct
+
+def column_integral_loop(ph, var):
+    """
+    Loop version of atlas1d.kernels.column_integral
+    """
+
+    nt, nlev = var.shape
+    ph = _profiles(ph, nt)
+    out = np.zeros(nt)
+    for it in range(nt):
+        for ilev in range(nlev):
+            out[it] += var[it,ilev]*abs(ph[it,ilev+1] - ph[it,ilev])/cc.g
+
+    return out
+
+def layer_mean_loop(z, var, zmin, zmax):
+    """
+    Loop version of atlas1d.kernels.layer_mean: layers are bounded by the
+    mid-points between levels, from 0 below the lowest level and unbounded
+    above the highest one
+    """
+
+    nt, nlev = var.shape
+    z = _profiles(z, nt)
+    out = np.zeros(nt)
+    for it in range(nt):
+        order = np.argsort(z[it])
+        zz = z[it,order]
+        total = 0.
+        weight = 0.
+        for k, ilev in enumerate(order):
+            zdn = 0. if k == 0 else (zz[k-1] + zz[k])/2.
+            zup = np.inf if k == nlev-1 else (zz[k] + zz[k+1])/2.
+            dz = max(min(zup, zmax) - max(zdn, zmin), 0.)
+            total += var[it,ilev]*dz
+            weight += dz
+        out[it] = total/weight
+
+    return out
+
+def synthetic_column(nt, nlev, lup=True, seed=0):
+    """
+    Heights (full and half levels), half-level pressure, a cloud fraction
+    with random cloud layers (and clear time steps) and a smooth variable
+    """
+
+    rng = np.random.default_rng(seed)
+
+    zhalf = np.linspace(0., 20000., nlev+1)**1.5/20000.**0.5
+    zhalf = np.tile(zhalf, (nt,1)) + rng.uniform(0., 1., (nt,1))
+    zfull = (zhalf[:,:-1] + zhalf[:,1:])/2.
+    phalf = 101325.*np.exp(-zhalf/8000.)
+
+    cl = np.zeros((nt,nlev))
+    for it in range(nt):
+        if rng.uniform() < 0.8:
+            i1 = rng.integers(0, nlev-1)
+            i2 = rng.integers(i1+1, nlev)
+            cl[it,i1:i2] = rng.uniform(0.01, 1., i2-i1)
+
+    var = 300. + zfull/1000. + rng.normal(0., 0.1, (nt,nlev))
+
+    if not(lup):
+        return zfull[:,::-1], phalf[:,::-1], cl[:,::-1], var[:,::-1]
+
+    return zfull, phalf, cl, var
+
+@pytest.mark.parametrize('lup', [True, False])
+def test_cloud_base_top(lup):
+
+    zfull, _, cl, _ = synthetic_column(50, 30, lup=lup)
+
+    np.testing.assert_allclose(kernels.cloud_base(zfull, cl), cloud_base_loop(zfull, cl))
+    np.testing.assert_allclose(kernels.cloud_top(zfull, cl), cloud_top_loop(zfull, cl))
+    # Profile shared by all time steps
+    np.testing.assert_allclose(kernels.cloud_base(zfull[0], cl), cloud_base_loop(zfull[0], cl))
+    np.testing.assert_allclose(kernels.cloud_top(zfull[0], cl), cloud_top_loop(zfull[0], cl))
+
+def test_cloud_base_missing():
+
+    zfull, _, cl, _ = synthetic_column(20, 10)
+    cl[3] = 0.
+    cl[5,:] = np.nan
+    cl[7,4] = np.nan
+
+    zcb = kernels.cloud_base(zfull, cl, missing=cc.missing)
+    np.testing.assert_allclose(zcb, cloud_base_loop(zfull, cl, missing=cc.missing))
+    assert zcb[3] == cc.missing and zcb[5] == cc.missing
+
+    zct = kernels.cloud_top(zfull, cl)
+    np.testing.assert_allclose(zct, cloud_top_loop(zfull, cl))
+    assert np.isnan(zct[3]) and np.isnan(zct[5])
+
+@pytest.mark.parametrize('lup', [True, False])
+def test_column_integral(lup):
+
+    _, phalf, _, var = synthetic_column(50, 30, lup=lup)
+
+    np.testing.assert_allclose(kernels.column_integral(phalf, var), column_integral_loop(phalf, var), rtol=1.e-10)
+    np.testing.assert_allclose(kernels.column_integral(phalf[0], var), column_integral_loop(phalf[0], var), rtol=1.e-10)
+
+    with pytest.raises(IndexError):
+        kernels.column_integral(phalf[:,:-1], var)
+
+def test_column_integral_nan():
+
+    _, phalf, _, var = synthetic_column(10, 20)
+    var[4,7] = np.nan
+
+    out = kernels.column_integral(phalf, var)
+    np.testing.assert_allclose(out, column_integral_loop(phalf, var), rtol=1.e-10)
+    assert np.isnan(out[4]) and np.sum(np.isnan(out)) == 1
+
+@pytest.mark.parametrize('lup', [True, False])
+@pytest.mark.parametrize('zmin,zmax', [(0., 500.), (2000., 5000.), (1234., 1240.), (100., 30000.)])
+def test_layer_mean(lup, zmin, zmax):
+
+    zfull, _, _, var = synthetic_column(50, 30, lup=lup)
+
+    np.testing.assert_allclose(kernels.layer_mean(zfull, var, zmin, zmax), layer_mean_loop(zfull, var, zmin, zmax), rtol=1.e-10)
+    np.testing.assert_allclose(kernels.layer_mean(zfull[0], var, zmin, zmax), layer_mean_loop(zfull[0], var, zmin, zmax), rtol=1.e-10)
+
+def test_layer_mean_single_layer():
+
+    # Both bounds within the layer of one level: its value is the mean
+    z = np.array([100., 300., 700., 1500.])
+    var = np.array([[1., 2., 3., 4.]])
+
+    np.testing.assert_allclose(kernels.layer_mean(z, var, 450., 480.), [2.])
+    np.testing.assert_allclose(kernels.layer_mean(z[::-1], var[:,::-1], 450., 480.), [2.])
+
+def test_layer_mean_nan():
+
+    zfull, _, _, var = synthetic_column(10, 20)
+    var[2,0] = np.nan
+    var[6,-1] = np.nan
+
+    out = kernels.layer_mean(zfull, var, 0., 500.)
+    np.testing.assert_allclose(out, layer_mean_loop(zfull, var, 0., 500.), rtol=1.e-10)
+    # Levels outside [zmin,zmax] have no weight, but NaN values still propagate
+    assert np.isnan(out[2]) and np.isnan(out[6])
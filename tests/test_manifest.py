@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the build manifest of atlas1d.manifest
+"""
+
+import os
+import json
+import datetime
+import logging
+
+import numpy as np
+import pytest
+
+import atlas1d
+import atlas1d.manifest as manifest
+
+matplotlib = pytest.importorskip('matplotlib')
+from matplotlib.colors import LinearSegmentedColormap, BoundaryNorm
+
+class Dataset:
+    # Attributes of atlas1d.Dataset used in signatures
+
+    def __init__(self,ncfile):
+        self.name = 'dat'
+        self.ncfile = ncfile
+        self.varnames = {'theta': 'th'}
+        self.coefs = {'qv': 1000.}
+        self.line = 'k'
+
+def test_fingerprint():
+
+    details = {'tmin': datetime.datetime(2000,1,1), 'levels': np.arange(3), 'cmap': matplotlib.colormaps['RdBu'],
+               'coef': np.float32(2.), 'norm': BoundaryNorm([0,1,2],256), 'dt': datetime.timedelta(hours=1)}
+
+    fprint = manifest.fingerprint('plotTS', details)
+    assert len(fprint) == 40
+
+    # Independent of the order of keys
+    assert manifest.fingerprint('plotTS', dict(reversed(list(details.items())))) == fprint
+
+    # Changed by any value
+    for key, value in [('tmin', datetime.datetime(2000,1,2)), ('levels', np.arange(4)), ('cmap', matplotlib.colormaps['RdBu'].resampled(128)),
+                       ('coef', np.float32(3.)), ('norm', BoundaryNorm([0,1,3],256)), ('dt', datetime.timedelta(hours=2))]:
+        other = dict(details)
+        other[key] = value
+        assert not(manifest.fingerprint('plotTS', other) == fprint), key
+
+    assert not(manifest.fingerprint('plotAvgP', details) == fprint)
+
+def test_stable_fingerprint():
+
+    # Same colors and norms, other objects: same fingerprint
+    colors = ['white','blue','red']
+    details = {'cmap': LinearSegmentedColormap.from_list('Custom cmap',colors,8), 'norm': BoundaryNorm([0,1,2],8)}
+    other = {'cmap': LinearSegmentedColormap.from_list('Custom cmap',colors,8), 'norm': BoundaryNorm([0,1,2],8)}
+    assert manifest.fingerprint(details) == manifest.fingerprint(other)
+
+    other['cmap'] = LinearSegmentedColormap.from_list('Custom cmap',colors[::-1],8)
+    assert not(manifest.fingerprint(details) == manifest.fingerprint(other))
+
+    # Objects without a stable representation
+    for value in [len, lambda x: x, object()]:
+        with pytest.raises(TypeError):
+            manifest.fingerprint({'func': value})
+
+def test_code_version(tmp_path, monkeypatch):
+
+    assert manifest.code_version() == manifest.code_version()
+
+    # Changed by any change in the source of the modules
+    for mod in ['plotMUSC.py','new_variables.py']:
+        with open(os.path.join(atlas1d._dir_Atlas1D, mod), 'rb') as f:
+            source = f.read()
+        with open(str(tmp_path / mod), 'wb') as f:
+            f.write(source)
+    version = manifest.source_version(['plotMUSC.py','new_variables.py'])
+    assert manifest.source_version(['plotMUSC.py']) != version
+
+    monkeypatch.setattr(atlas1d, '_dir_Atlas1D', str(tmp_path))
+    monkeypatch.setattr(manifest, '_source_versions', {})
+    assert manifest.source_version(['plotMUSC.py','new_variables.py']) == version
+    with open(str(tmp_path / 'plotMUSC.py'), 'ab') as f:
+        f.write(b'# changed\n')
+    monkeypatch.setattr(manifest, '_source_versions', {})
+    assert not(manifest.source_version(['plotMUSC.py','new_variables.py']) == version)
+
+def test_diagnostic_fingerprint(tmp_path, monkeypatch):
+
+    from atlas1d.Diagnostic import Diagnostic
+
+    diag = Diagnostic(diag_type='plotTS',variable='theta',plot_details={'tmin': datetime.datetime(2000,1,1)})
+    datasets = [Dataset(str(tmp_path / 'file.nc')),]
+    fprint = diag.fingerprint(datasets)
+    assert diag.fingerprint(datasets) == fprint
+
+    # Rendered again when the code changes
+    monkeypatch.setattr(manifest, 'code_version', lambda: 'other')
+    assert not(diag.fingerprint(datasets) == fprint)
+
+def test_file_signature(tmp_path):
+
+    filein = str(tmp_path / 'file.nc')
+    assert manifest.file_signature(filein) is None
+    assert manifest.file_signature(None) is None
+
+    with open(filein, 'w') as f:
+        f.write('abc')
+    signature = manifest.file_signature(filein)
+    assert signature[0] == os.path.realpath(filein) and signature[1] == 3
+
+    # Changed when the file is modified
+    st = os.stat(filein)
+    os.utime(filein, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert not(manifest.file_signature(filein) == signature)
+
+def test_dataset_signature(tmp_path):
+
+    filein = str(tmp_path / 'file.nc')
+    with open(filein, 'w') as f:
+        f.write('abc')
+    dat = Dataset(filein)
+
+    signature = manifest.dataset_signature(dat,'theta')
+    assert signature['varname'] == 'th' and signature['coef'] is None
+    assert signature['ncfile'] == manifest.file_signature(filein)
+    assert manifest.dataset_signature(dat,'qv')['coef'] == 1000.
+
+def test_uptodate(tmp_path):
+
+    output = str(tmp_path / 'fig.png')
+    outputs = {'a': str(tmp_path / 'a.png'), 'b': str(tmp_path / 'b.png')}
+    for f in [output,] + list(outputs.values()):
+        open(f, 'w').close()
+
+    mf = manifest.Manifest(str(tmp_path / '.manifest.json'))
+    assert len(mf.entries) == 0
+    assert not(mf.is_uptodate('g/plotTS/theta','abc'))
+
+    mf.update('g/plotTS/theta','abc',output,{'dat': None})
+    mf.update('g/plot2D/theta','def',outputs,{'dat': 'error'})
+    mf.update('g/plotTS/qv','ghi',None,{})
+
+    assert mf.is_uptodate('g/plotTS/theta','abc')
+    assert not(mf.is_uptodate('g/plotTS/theta','abd'))
+    assert mf.is_uptodate('g/plot2D/theta','def')
+    # Without output
+    assert not(mf.is_uptodate('g/plotTS/qv','ghi'))
+
+    # Output files removed
+    os.remove(outputs['b'])
+    assert not(mf.is_uptodate('g/plot2D/theta','def'))
+    os.remove(output)
+    assert not(mf.is_uptodate('g/plotTS/theta','abc'))
+
+    out, error = mf.get('g/plot2D/theta')
+    assert out == outputs and error == {'dat': 'error'}
+
+    mf.remove('g/plot2D/theta')
+    mf.remove('unknown')
+    assert not('g/plot2D/theta' in mf.entries)
+
+def test_save_load(tmp_path):
+
+    filename = str(tmp_path / '.manifest.json')
+    output = str(tmp_path / 'fig.png')
+    open(output, 'w').close()
+
+    mf = manifest.Manifest(filename)
+    mf.update('g/plotTS/theta','abc',output,{'dat': None})
+    mf.save()
+    assert not(os.path.exists(filename + '.tmp'))
+
+    mf = manifest.Manifest(filename)
+    assert list(mf.entries.keys()) == ['g/plotTS/theta']
+    assert mf.is_uptodate('g/plotTS/theta','abc')
+
+def test_other_version(tmp_path):
+
+    filename = str(tmp_path / '.manifest.json')
+    output = str(tmp_path / 'fig.png')
+    open(output, 'w').close()
+
+    entry = {'fingerprint': 'abc', 'output': output, 'error': {}}
+    for version, atlas_version in [(manifest._manifest_version+1, atlas1d.__version__), (manifest._manifest_version, 'other')]:
+        with open(filename, 'w') as f:
+            f.write(json.dumps({'version': version, 'atlas1d': atlas_version, 'diagnostics': {'g/plotTS/theta': entry}}))
+        assert len(manifest.Manifest(filename).entries) == 0
+
+def test_corrupted(tmp_path, caplog):
+
+    filename = str(tmp_path / '.manifest.json')
+    with open(filename, 'w') as f:
+        f.write('{"version": 1, "diagn')
+
+    with caplog.at_level(logging.WARNING, logger='atlas1d.manifest'):
+        mf = manifest.Manifest(filename)
+    assert len(mf.entries) == 0
+    assert 'corrupted' in caplog.text
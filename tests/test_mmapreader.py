@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the memory-mapped reader of atlas1d.mmapreader against xarray,
+for the three netCDF classic formats
+"""
+
+import logging
+
+import numpy as np
+import pytest
+import xarray as xr
+
+netCDF4 = pytest.importorskip('netCDF4')
+
+import atlas1d.mmapreader as mmapreader
+
+_formats = {'NETCDF3_CLASSIC': b'CDF\x01', 'NETCDF3_64BIT_OFFSET': b'CDF\x02', 'NETCDF3_64BIT_DATA': b'CDF\x05'}
+
+def write_file(filein, fmt, nt=5, nlev=4, lsingle=False):
+    """
+    MUSC-like file with fixed and record variables, some of them with missing values.
+    If lsingle, the file has a single (unpadded) record variable of 2-byte integers.
+    """
+
+    with netCDF4.Dataset(filein, 'w', format=fmt) as nc:
+        nc.title = 'test'
+        nc.createDimension('time', None)
+        nc.createDimension('levf', nlev)
+
+        n = nc.createVariable('n', 'i2', ('time',))
+        n.missing_value = np.int16(-1)
+        n[:] = np.arange(nt, dtype=np.int16)
+        if lsingle:
+            return
+
+        time = nc.createVariable('time', 'f8', ('time',))
+        time.units = 'hours since 2000-01-01 00:00:00'
+        time.calendar = 'standard'
+        time[:] = np.arange(nt)*0.5
+
+        zf = nc.createVariable('zf', 'f8', ('levf',))
+        zf.units = 'm'
+        zf[:] = np.linspace(10., 1000., nlev)
+
+        ta = nc.createVariable('ta', 'f4', ('time','levf'), fill_value=np.float32(1.e20))
+        ta.long_name = 'Temperature'
+        ta.units = 'K'
+        data = 280. + np.arange(nt*nlev, dtype=np.float32).reshape(nt,nlev)
+        if nt > 1:
+            data[1,2] = 1.e20
+        ta[:] = data
+
+        ps = nc.createVariable('ps', 'f8', ('time',))
+        ps[:] = 1.e5 + np.arange(nt)
+
+@pytest.fixture(params=list(_formats.keys()))
+def classic_file(request, tmp_path):
+
+    filein = str(tmp_path / 'file.nc')
+    write_file(filein, request.param)
+
+    return filein, request.param
+
+def check_same(ds, ref):
+
+    assert list(ds.dims) == list(ref.dims)
+    assert ds.attrs == ref.attrs
+    assert sorted(ds.variables) == sorted(ref.variables)
+    for var in ref.variables:
+        assert ds[var].dims == ref[var].dims, var
+        assert ds[var].attrs == ref[var].attrs, var
+        np.testing.assert_array_equal(ds[var].values, ref[var].values)
+
+def test_header(classic_file):
+
+    filein, fmt = classic_file
+
+    assert mmapreader.is_classic(filein)
+    with open(filein, 'rb') as f:
+        assert f.read(4) == _formats[fmt]
+
+def test_open_dataset(classic_file):
+
+    filein, fmt = classic_file
+
+    ds = mmapreader.open_dataset(filein)
+    with xr.open_dataset(filein, use_cftime=True) as ref:
+        check_same(ds, ref)
+
+    # Missing values are NaN
+    assert np.isnan(ds['ta'].values[1,2])
+    assert np.sum(np.isnan(ds['ta'].values)) == 1
+
+    # Variables without missing values are read-only views on the file
+    assert not(ds['zf'].values.flags.writeable)
+    assert not(ds['ps'].values.flags.writeable)
+
+    ds.close()
+
+def test_single_record_variable(tmp_path):
+
+    for fmt in _formats:
+        filein = str(tmp_path / '{0}.nc'.format(fmt))
+        write_file(filein, fmt, nt=7, lsingle=True)
+
+        ds = mmapreader.open_dataset(filein)
+        with xr.open_dataset(filein, use_cftime=True) as ref:
+            check_same(ds, ref)
+        ds.close()
+
+def test_no_record(tmp_path):
+
+    filein = str(tmp_path / 'file.nc')
+    write_file(filein, 'NETCDF3_64BIT_DATA', nt=0)
+
+    ds = mmapreader.open_dataset(filein)
+    assert ds.sizes['time'] == 0
+    assert ds['ta'].shape == (0, 4)
+    ds.close()
+
+def test_netcdf4_not_supported(tmp_path):
+
+    filein = str(tmp_path / 'file.nc')
+    write_file(filein, 'NETCDF4')
+
+    assert not(mmapreader.is_classic(filein))
+    with pytest.raises(mmapreader.NotSupported):
+        mmapreader.open_dataset(filein)
+
+    assert not(mmapreader.is_classic(str(tmp_path / 'missing.nc')))
+
+def test_lazy(classic_file, monkeypatch):
+
+    filein, _ = classic_file
+
+    viewed = []
+    view = mmapreader._File.view
+    monkeypatch.setattr(mmapreader._File, 'view', lambda self, var: viewed.append(var) or view(self, var))
+
+    # Only the time axis is read when opening
+    ds = mmapreader.open_dataset(filein)
+    assert viewed == ['time']
+
+    # Only the parts read with missing values are copied
+    assert not(ds['ta'][0].values.flags.writeable)
+    assert not(ds['ta'].isel(time=slice(2,None)).values.flags.writeable)
+    ta = ds['ta'][1].values
+    assert ta.flags.writeable and np.isnan(ta[2])
+    np.testing.assert_array_equal(ds['ta'].values[:,0], 280. + 4.*np.arange(5))
+
+    ds.close()
+
+def test_close(classic_file, caplog):
+
+    filein, _ = classic_file
+
+    ds = mmapreader.open_dataset(filein)
+    ds['ta'].values
+
+    with caplog.at_level(logging.WARNING, logger='atlas1d.mmapreader'):
+        ds.close()
+    assert caplog.text == ''
+
+    with pytest.raises(ValueError):
+        ds['zf'].values
+
+def test_close_while_used(classic_file, caplog):
+
+    filein, _ = classic_file
+
+    ds = mmapreader.open_dataset(filein)
+    zf = ds['zf'].values
+
+    # Data still used: the file is unmapped when they are released
+    with caplog.at_level(logging.WARNING, logger='atlas1d.mmapreader'):
+        ds.close()
+    assert 'still used' in caplog.text
+    np.testing.assert_allclose(zf, np.linspace(10., 1000., 4))
+
+def test_musc_file():
+
+    import os
+    filein = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'ARMCU_REF_arp632.galbs_CMIP6_L91_300s_klevel.nc')
+    if not(os.path.exists(filein)):
+        pytest.skip('Test file not available')
+
+    ds = mmapreader.open_dataset(filein)
+    with xr.open_dataset(filein, use_cftime=True) as ref:
+        for var in ['time','zf','zh','theta','ps']:
+            if var in ref.variables:
+                np.testing.assert_array_equal(ds[var].values, ref[var].values)
+    ds.close()
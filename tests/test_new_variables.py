@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the derivers of variables of atlas1d.new_variables
+"""
+
+import gc
+import weakref
+
+import numpy as np
+import xarray as xr
+
+import atlas1d.new_variables as new_variables
+
+def dataset():
+
+    return xr.Dataset({'ua': (('time','levf'), np.full((3,4), 3.)), 'va': (('time','levf'), np.full((3,4), 4.))})
+
+def test_shared_deriver():
+
+    ds = dataset()
+
+    deriver = new_variables.get_deriver(ds)
+    assert new_variables.get_deriver(ds) is deriver
+    assert not(new_variables.get_deriver(dataset()) is deriver)
+
+    # Intermediate variables are computed once
+    wind = new_variables.get_windspeed(ds)
+    np.testing.assert_allclose(wind.values, 5.)
+    assert new_variables.get_windspeed(ds) is wind
+
+def test_deriver_released_with_dataset():
+
+    ds = dataset()
+    deriver = weakref.ref(new_variables.get_deriver(ds))
+    wind = weakref.ref(new_variables.get_windspeed(ds))
+
+    del ds
+    gc.collect()
+    assert deriver() is None
+    assert wind() is None
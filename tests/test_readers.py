@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the readers of atlas1d.readers: all backends give the variables
+of a file as decoded by xarray
+"""
+
+import numpy as np
+import pytest
+import xarray as xr
+import cftime
+
+netCDF4 = pytest.importorskip('netCDF4')
+
+import atlas1d.constants as cc
+import atlas1d.readers as readers
+import atlas1d.mmapreader as mmapreader
+
+from tests.test_mmapreader import write_file
+
+_units = 'hours since 2000-01-01 00:00:0.0'
+
+@pytest.fixture
+def filein(tmp_path):
+
+    filein = str(tmp_path / 'file.nc')
+    write_file(filein, 'NETCDF3_64BIT_OFFSET')
+
+    return filein
+
+@pytest.fixture(params=['xarray','mmap','netcdf4'])
+def reader(request, filein):
+
+    if request.param == 'xarray':
+        return readers.as_reader(xr.open_dataset(filein, use_cftime=True))
+    elif request.param == 'mmap':
+        return readers.as_reader(mmapreader.open_dataset(filein))
+
+    return readers.NetCDF4Reader(filein)
+
+@pytest.fixture
+def ref(filein):
+
+    with xr.open_dataset(filein, use_cftime=True) as ds:
+        yield ds.load()
+
+def test_metadata(reader, ref):
+
+    assert sorted(reader.variables()) == sorted(ref.variables)
+    assert 'ta' in reader and not('ua' in reader)
+    for var in ref.variables:
+        assert tuple(reader.dims(var)) == ref[var].dims
+        assert tuple(reader.shape(var)) == ref[var].shape
+        assert dict(reader.attrs(var)) == dict(ref[var].attrs)
+
+    with pytest.raises(KeyError):
+        reader.dims('ua')
+
+def test_time(reader, ref):
+
+    assert list(reader.time()) == list(ref['time'].values)
+
+    tt = reader.numeric_time(_units)
+    np.testing.assert_allclose(tt, np.arange(5)*0.5)
+    np.testing.assert_allclose(tt, cftime.date2num(ref['time'].values, _units))
+    # Computed once and shared
+    assert reader.numeric_time(_units) is tt
+    assert not(tt.flags.writeable)
+
+def test_read(reader, ref):
+
+    for var in ['ta','ps','zf']:
+        data = reader.read(var)
+        assert data.dtype == np.float32
+        np.testing.assert_array_equal(data, ref[var].values.astype(np.float32))
+
+    # Integers without missing values may not be converted to floats as by xarray
+    np.testing.assert_array_equal(reader.read('n'), ref['n'].values)
+
+    # Time and level slices
+    np.testing.assert_array_equal(reader.read('ta',it=slice(1,4),ilev=slice(0,2)), ref['ta'].values[1:4,0:2].astype(np.float32))
+    np.testing.assert_array_equal(reader.read('ps',it=slice(2,None)), ref['ps'].values[2:].astype(np.float32))
+    np.testing.assert_array_equal(reader.read('zf',it=slice(2,None),ilev=slice(1,3)), ref['zf'].values[1:3].astype(np.float32))
+    assert np.isnan(reader.read('ta')[1,2])
+
+def test_to_dataset(reader, ref):
+
+    indexers = {'time': slice(1,4), 'levf': slice(1,3)}
+    ds = reader.to_dataset(['ta','ps','zf','ua'],indexers=indexers)
+
+    assert sorted(ds.data_vars) == ['ps','ta','zf']
+    expected = ref.isel(indexers)
+    for var in ['ta','ps','zf']:
+        np.testing.assert_array_equal(ds[var].values, expected[var].values)
+        assert ds[var].dims == expected[var].dims
+    assert list(ds['ta']['time'].values) == list(expected['time'].values)
+
+    da = reader.dataarray('ta')
+    assert list(da['time'].values) == list(ref['time'].values)
+    np.testing.assert_array_equal(da.values, ref['ta'].values)
+
+def test_shared_state(filein):
+
+    ds = xr.open_dataset(filein, use_cftime=True)
+
+    # Readers of the same dataset share what they compute
+    tt = readers.as_reader(ds).numeric_time(_units)
+    assert readers.as_reader(ds).numeric_time(_units) is tt
+
+    other = xr.open_dataset(filein, use_cftime=True)
+    assert not(readers.as_reader(other).numeric_time(_units) is tt)
+
+def test_to_float32():
+
+    data = np.array([1., cc.missing, 3.])
+    out = readers.to_float32(data)
+    assert out.dtype == np.float32
+    assert np.isnan(out[1]) and out[2] == 3.
+
+    ints = np.arange(3)
+    assert readers.to_float32(ints) is ints
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the time windows and level ranges of atlas1d.readplan, on small
+synthetic MUSC files
+"""
+
+import datetime
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import atlas1d.readers as readers
+import atlas1d.readplan as readplan
+
+from atlas1d.Dataset import Dataset
+from atlas1d.Diagnostic import Diagnostic
+
+def write_levels(filein, nt=11, nlev=10, lupward=True, lfull=True, zorog=50.):
+    """
+    MUSC-like file with nt hourly times since 2000-01-01 and nlev full levels:
+    half levels every 100 m above the ground height zorog (1000 hPa at the
+    ground, 50 hPa less every 100 m), full levels in the middle of them,
+    ordered upward or downward. If not(lfull), there are only half levels.
+    """
+
+    zhalf = zorog + 100.*np.arange(nlev+1)
+    zfull = 0.5*(zhalf[1:] + zhalf[:-1])
+    phalf = 100.*(1000. - 0.5*(zhalf - zorog))
+    pfull = 0.5*(phalf[1:] + phalf[:-1])
+    if not(lupward):
+        zhalf, zfull, phalf, pfull = zhalf[::-1], zfull[::-1], phalf[::-1], pfull[::-1]
+
+    variables = {'zhalf': (('time','levh'), np.tile(zhalf, (nt,1)), {'units': 'm'}),
+                 'phalf': (('time','levh'), np.tile(phalf, (nt,1)), {'units': 'Pa'}),
+                 'theta': (('time','levf'), 300. + np.zeros((nt,nlev)), {'units': 'K'})}
+    if lfull:
+        variables['zfull'] = (('time','levf'), np.tile(zfull, (nt,1)), {'units': 'm'})
+        variables['pfull'] = (('time','levf'), np.tile(pfull, (nt,1)), {'units': 'Pa'})
+
+    ds = xr.Dataset(variables, coords={'time': ('time', np.arange(nt, dtype=np.float64), {'units': 'hours since 2000-01-01 00:00:00', 'calendar': 'standard'})})
+    ds.to_netcdf(filein, format='NETCDF3_64BIT')
+
+    return filein
+
+def open_reader(filein):
+
+    return readers.as_reader(xr.open_dataset(filein, use_cftime=True))
+
+def t(hours):
+
+    return datetime.datetime(2000,1,1) + datetime.timedelta(hours=hours)
+
+@pytest.fixture
+def rd(tmp_path):
+
+    return open_reader(write_levels(str(tmp_path / 'up.nc')))
+
+@pytest.fixture
+def rd_down(tmp_path):
+
+    return open_reader(write_levels(str(tmp_path / 'down.nc'), lupward=False))
+
+def test_time_index(rd):
+
+    # One time step of margin, unless a bound is a time of the dataset
+    assert readplan.time_index(rd, [(t(2), t(4))]) == {'time': slice(2,5)}
+    assert readplan.time_index(rd, [(t(2.5), t(3.5))]) == {'time': slice(2,5)}
+    assert readplan.time_index(rd, [(t(2.5), None)]) == {'time': slice(2,11)}
+    assert readplan.time_index(rd, [(None, t(3.5))]) == {'time': slice(0,5)}
+    assert readplan.time_index(rd, ['first']) == {'time': slice(0,1)}
+
+def test_time_index_union(rd):
+
+    assert readplan.time_index(rd, [(t(2), t(4)), (t(7.5), t(8))]) == {'time': slice(2,9)}
+    assert readplan.time_index(rd, [(t(2), t(4)), 'first']) == {'time': slice(0,5)}
+
+    # Whole axis
+    assert readplan.time_index(rd, [(t(2), t(4)), (None, None)]) == {}
+    assert readplan.time_index(rd, [(t(-5), t(20))]) == {}
+    # Windows (almost) outside the dataset are read whole, as they are plotted
+    assert readplan.time_index(rd, [(t(-5), t(-3))]) == {}
+
+def test_level_index_upward(rd):
+
+    # Ground side kept: heights are relative to the ground
+    assert readplan.level_index(rd, [('zhalf','km',0.2,0.45)]) == {'levf': slice(0,6), 'levh': slice(0,7)}
+    assert readplan.level_index(rd, [('zfull','m',200.,450.)]) == {'levf': slice(0,6), 'levh': slice(0,7)}
+    # Nothing above the top
+    assert readplan.level_index(rd, [('zfull','km',None,0.45)]) == {'levf': slice(0,6), 'levh': slice(0,7)}
+    assert readplan.level_index(rd, [('zfull','km',0.2,None)]) == {}
+
+def test_level_index_downward(rd_down):
+
+    assert readplan.level_index(rd_down, [('zhalf','km',0.2,0.45)]) == {'levf': slice(4,10), 'levh': slice(4,11)}
+    assert readplan.level_index(rd_down, [('zfull','km',0.2,None)]) == {}
+    assert readplan.level_index(rd_down, [('zfull','km',None,0.45)]) == {'levf': slice(4,10), 'levh': slice(4,11)}
+
+def test_level_index_pressure(rd, rd_down):
+
+    # Pressure axes are given from the ground (ymin > ymax)
+    expected = {'levf': slice(0,6), 'levh': slice(0,7)}
+    assert readplan.level_index(rd, [('pfull','hPa',900.,800.)]) == expected
+    assert readplan.level_index(rd, [('pfull','hPa',800.,900.)]) == expected
+    assert readplan.level_index(rd, [('phalf','Pa',90000.,80000.)]) == expected
+
+    assert readplan.level_index(rd_down, [('pfull','hPa',900.,800.)]) == {'levf': slice(4,10), 'levh': slice(4,11)}
+
+def test_level_index_union(rd, rd_down):
+
+    ranges = [('zfull','km',0.2,0.3), ('zfull','km',0.6,0.7)]
+    assert readplan.level_index(rd_down, ranges) == {'levf': slice(1,10), 'levh': slice(1,11)}
+    assert readplan.level_index(rd, ranges) == {'levf': slice(0,9), 'levh': slice(0,10)}
+
+    # All levels
+    assert readplan.level_index(rd, ranges + [None,]) == {}
+    assert readplan.level_index(rd, []) == {}
+    # Range outside levels
+    assert readplan.level_index(rd, [('zfull','km',5.,6.)]) == {}
+
+def test_level_index_half_levels_only(tmp_path):
+
+    rd = open_reader(write_levels(str(tmp_path / 'half.nc'), lfull=False))
+
+    # Without full levels, the levels of data are unknown: all are read
+    assert readplan.level_index(rd, [('zhalf','km',0.2,0.45)]) == {}
+    assert readplan.level_index(rd, [('phalf','hPa',900.,800.)]) == {}
+
+def test_plan(tmp_path):
+
+    dat = Dataset(name='SCM', case='ARMCU', subcase='REF', ncfile=str(tmp_path / 'up.nc'), line='k')
+    ref = Dataset(name='LES', case='ARMCU', subcase='REF', ncfile=str(tmp_path / 'les.nc'), line='k')
+
+    diags = [Diagnostic(diag_type='plot2D', variable='theta', plot_details={'tmin': t(2), 'tmax': t(4), 'ymin': 0., 'ymax': 0.45}),
+             Diagnostic(diag_type='plotAvgP', variable='theta', plot_details={'tmin': t(7), 'tmax': t(8), 'ymin': 0., 'ymax': 1., 'levunits': 'km', 'init': True}),
+             Diagnostic(diag_type='plotTS', variable='theta', plot_details={'tmin': t(2), 'tmax': t(4), 'ymin': 290., 'ymax': 310.})]
+
+    plan = readplan.plan(diags, [dat, ref])
+    derived, variables, windows, ranges = plan['SCM']
+    assert derived == [] and variables[0] == 'theta'
+    assert windows == [(t(2), t(4)), (t(7), t(8)), 'first']
+    # Bounds of values of time series are not levels
+    assert ranges == [('zhalf','km',0.,0.45), ('zfull','km',0.,1.)]
+
+    # A whole time axis or all levels are the only window or range
+    diags.append(Diagnostic(diag_type='plotInstP', variable='theta', plot_details={}))
+    _, _, windows, ranges = readplan.plan(diags, [dat,])['SCM']
+    assert windows == [(None, None)] and ranges == [None,]
+
+    # References of biases are read whole
+    diags = [Diagnostic(diag_type='plot2D', variable='theta', plot_details={'tmin': t(2), 'tmax': t(4), 'ymin': 0., 'ymax': 0.45,
+                                                                           'lbias': True, 'refdataset': 'LES'})]
+    plan = readplan.plan(diags, [dat, ref])
+    assert plan['SCM'][2:] == ([(t(2), t(4))], [('zhalf','km',0.,0.45)])
+    assert plan['LES'][2:] == ([(None, None)], [None,])
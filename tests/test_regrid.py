@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the vertical regridding of atlas1d.regrid against np.interp
+applied to each column
+"""
+
+import numpy as np
+import pytest
+
+import atlas1d.regrid as regrid
+
+def interp_loop(data, src, tgt):
+    """
+    Loop version: np.interp for each column, NaN outside source levels
+    and in columns with missing source levels
+    """
+
+    lead = np.broadcast_shapes(data.shape[:-1], src.shape[:-1], tgt.shape[:-1])
+    data = np.broadcast_to(data, lead + data.shape[-1:]).reshape((-1,data.shape[-1]))
+    src = np.broadcast_to(src, lead + src.shape[-1:]).reshape((-1,src.shape[-1]))
+    tgt = np.broadcast_to(tgt, lead + tgt.shape[-1:]).reshape((-1,tgt.shape[-1]))
+
+    out = np.zeros(tgt.shape)
+    for i in range(tgt.shape[0]):
+        x = src[i]
+        y = data[i]
+        if np.any(np.isnan(x)):
+            out[i] = np.nan
+            continue
+        if x[0] > x[-1]:
+            x = x[::-1]
+            y = y[::-1]
+        out[i] = np.interp(tgt[i], x, y, left=np.nan, right=np.nan)
+
+    return out.reshape(lead + tgt.shape[-1:])
+
+def columns(nt=20, nlev=30, seed=0):
+    """
+    Time-varying heights increasing with levels, and a variable on them
+    """
+
+    rng = np.random.default_rng(seed)
+    z = np.cumsum(rng.uniform(10., 200., (nt,nlev)), axis=-1)
+    data = np.sin(z/1000.) + rng.normal(0., 0.1, (nt,nlev))
+
+    return z, data
+
+def test_identical_grids():
+
+    z, data = columns()
+
+    # Exact passthrough, whatever the rounding of interpolation
+    np.testing.assert_array_equal(regrid.interpolate(data, z, z.copy()), data)
+    np.testing.assert_array_equal(regrid.interpolate(data, z[0], z[0].copy()), data)
+    np.testing.assert_array_equal(regrid.bias(data, z, data, z), np.zeros(data.shape))
+
+    out = regrid.interpolate(data, z, z)
+    assert not(out is data)
+
+@pytest.mark.parametrize('lreverse', [False, True])
+def test_against_loop(lreverse):
+
+    z, data = columns()
+    ztgt = np.linspace(-100., z.max()+100., 45)
+    if lreverse:
+        z = z[:,::-1]
+        data = data[:,::-1]
+
+    # Time-varying source levels, fixed source levels, time-varying target levels
+    np.testing.assert_allclose(regrid.interpolate(data, z, ztgt), interp_loop(data, z, ztgt), rtol=1.e-6, atol=1.e-6)
+    np.testing.assert_allclose(regrid.interpolate(data, z[0], ztgt), interp_loop(data, z[0], ztgt), rtol=1.e-6, atol=1.e-6)
+    np.testing.assert_allclose(regrid.interpolate(data, z[0], z[::-1]), interp_loop(data, z[0], z[::-1]), rtol=1.e-6, atol=1.e-6)
+
+def test_pressure_levels():
+
+    # Pressure decreases with height: levels ordered downward
+    z, data = columns()
+    p = 101325.*np.exp(-z/8000.)
+    ptgt = np.linspace(105000., 40000., 60)
+
+    out = regrid.interpolate(data, p, ptgt)
+    np.testing.assert_allclose(out, interp_loop(data, p, ptgt), rtol=1.e-6, atol=1.e-6)
+    # Below the lowest level
+    assert np.all(np.isnan(out[:,0]))
+
+def test_outside_source_levels():
+
+    z = np.array([100., 200., 400.])
+    data = np.array([1., 2., 4.])
+
+    out = regrid.interpolate(data, z, np.array([50., 100., 150., 400., 450.]))
+    np.testing.assert_allclose(out, [np.nan, 1., 1.5, 4., np.nan])
+
+    # Same for levels ordered downward
+    out = regrid.interpolate(data[::-1], z[::-1], np.array([450., 300., 50.]))
+    np.testing.assert_allclose(out, [np.nan, 3., np.nan])
+
+def test_missing_levels():
+
+    z, data = columns()
+    ztgt = np.linspace(0., z.max(), 40)
+
+    # Missing source levels only affect their column, whatever their position
+    zmiss = z.copy()
+    zmiss[3,5] = np.nan
+    zmiss[0,0] = np.nan
+    out = regrid.interpolate(data, zmiss, ztgt)
+    np.testing.assert_allclose(out, interp_loop(data, zmiss, ztgt), rtol=1.e-6, atol=1.e-6)
+    assert np.all(np.isnan(out[3])) and np.all(np.isnan(out[0]))
+    assert np.all(np.isfinite(out[1,2:10]))
+
+    # Same with levels ordered downward
+    out = regrid.interpolate(data[:,::-1], zmiss[:,::-1], ztgt)
+    np.testing.assert_allclose(out, interp_loop(data[:,::-1], zmiss[:,::-1], ztgt), rtol=1.e-6, atol=1.e-6)
+
+    # Missing target levels are NaN
+    tmiss = ztgt.copy()
+    tmiss[7] = np.nan
+    out = regrid.interpolate(data, z, tmiss)
+    assert np.all(np.isnan(out[:,7]))
+    np.testing.assert_allclose(np.delete(out, 7, axis=-1), np.delete(interp_loop(data, z, ztgt), 7, axis=-1), rtol=1.e-6, atol=1.e-6)
+
+def test_missing_data():
+
+    z = np.array([100., 200., 400., 800.])
+    data = np.array([1., np.nan, 4., 8.])
+
+    out = regrid.interpolate(data, z, np.array([150., 300., 600.]))
+    assert np.isnan(out[0]) and np.isnan(out[1])
+    np.testing.assert_allclose(out[2], 6.)
+
+def test_weights_cache():
+
+    z, _ = columns()
+    ztgt = np.linspace(0., 1000., 10)
+
+    weights = regrid.get_weights(z, ztgt)
+    assert regrid.get_weights(z.copy(), ztgt.copy()) is weights
+
+    for k in range(regrid._maxsize+5):
+        regrid.get_weights(z, ztgt + k)
+    assert len(regrid._weights) <= regrid._maxsize
+
+def test_single_level():
+
+    with pytest.raises(ValueError):
+        regrid.get_weights(np.array([100.]), np.array([100., 200.]))
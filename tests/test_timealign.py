@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the time alignment of atlas1d.timealign against loops over
+target times
+"""
+
+import numpy as np
+import pytest
+
+import atlas1d.timealign as timealign
+
+def align_loop(data, src, tgt, mode):
+    """
+    Loop version over target times, NaN outside source times
+    (and for cells without source value in mean mode)
+    """
+
+    out = np.zeros((len(tgt),) + data.shape[1:])
+    for it, t in enumerate(tgt):
+        if mode == 'mean':
+            t0 = t - (tgt[1]-tgt[0])/2. if it == 0 else (tgt[it-1]+t)/2.
+            t1 = t + (tgt[-1]-tgt[-2])/2. if it == len(tgt)-1 else (t+tgt[it+1])/2.
+            ind = (src >= t0) & (src < t1)
+            values = data[ind]
+            n = np.sum(~np.isnan(values), axis=0)
+            out[it] = np.where(n > 0, np.nansum(values, axis=0)/np.maximum(n, 1), np.nan)
+        elif mode == 'nearest':
+            dt0 = (src[1]-src[0])/2.
+            dt1 = (src[-1]-src[-2])/2.
+            if t < src[0]-dt0 or t > src[-1]+dt1:
+                out[it] = np.nan
+            else:
+                dist = np.abs(src - t)
+                out[it] = data[len(src) - 1 - np.argmin(dist[::-1])]
+        else:
+            if t < src[0] or t > src[-1]:
+                out[it] = np.nan
+            else:
+                i = min(np.searchsorted(src, t, side='right') - 1, len(src)-2)
+                w = (t - src[i])/(src[i+1] - src[i])
+                out[it] = data[i] + w*(data[i+1] - data[i])
+
+    return out
+
+def times(nt=200, nlev=10, seed=0):
+    """
+    Target times every 300 s, source times every 10 min (shifted, without tie
+    for nearest times, and shorter) and data at source times, in hours
+    """
+
+    tgt = np.arange(nt)*300./3600.
+    src = np.arange(int(0.9*nt)//2)*600./3600. + 0.2
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((len(src), nlev))
+
+    return data, src, tgt
+
+@pytest.mark.parametrize('mode', ['nearest','linear'])
+def test_against_loop(mode):
+
+    data, src, tgt = times()
+
+    out = timealign.align(data, src, tgt, mode)
+    np.testing.assert_allclose(out, align_loop(data, src, tgt, mode), rtol=1.e-10, atol=1.e-12)
+    # Targets before and after the source times
+    assert np.all(np.isnan(out[0])) and np.all(np.isnan(out[-1]))
+    assert not(np.any(np.isnan(out[10:-30])))
+
+def test_mean_against_loop():
+
+    data, src, tgt = times()
+
+    # Fine source on coarse target for block means
+    tgt = tgt[::4]
+    np.testing.assert_allclose(timealign.align(data, src, tgt, 'mean'), align_loop(data, src, tgt, 'mean'), rtol=1.e-10, atol=1.e-12)
+
+def test_mean_empty_cells():
+
+    # Source coarser than the target: some cells have no source time
+    data, src, tgt = times()
+    out = timealign.align(data, src, tgt, 'mean')
+    expected = align_loop(data, src, tgt, 'mean')
+
+    np.testing.assert_allclose(out, expected, rtol=1.e-10, atol=1.e-12)
+    empty = np.all(np.isnan(expected), axis=-1)
+    assert np.any(empty) and np.any(~empty)
+    assert np.all(np.isnan(out[empty]))
+
+def test_mean_missing_values():
+
+    data, src, tgt = times()
+    tgt = tgt[::4]
+    data[5,3] = np.nan
+    data[:,4] = np.nan
+
+    # Missing values are ignored, cells with missing values only are NaN
+    out = timealign.align(data, src, tgt, 'mean')
+    np.testing.assert_allclose(out, align_loop(data, src, tgt, 'mean'), rtol=1.e-10, atol=1.e-12)
+    assert not(np.any(np.isnan(out[1:-10,3])))
+    assert np.all(np.isnan(out[:,4]))
+
+@pytest.mark.parametrize('mode', ['nearest','linear'])
+def test_single_source_time(mode):
+
+    data = np.array([[1., 2.]])
+    src = np.array([3.])
+    tgt = np.array([2., 3., 4.])
+
+    out = timealign.align(data, src, tgt, mode)
+    np.testing.assert_array_equal(out[1], [1., 2.])
+    assert np.all(np.isnan(out[[0,2]]))
+
+    np.testing.assert_array_equal(timealign.align(data, src, tgt, mode, lextrapolate=True), np.tile([1., 2.], (3,1)))
+
+def test_single_target_time():
+
+    data, src, _ = times()
+
+    # The cell of a single target time covers all the source times
+    np.testing.assert_allclose(timealign.align(data, src, [1.], 'mean')[0], np.mean(data, axis=0))
+    np.testing.assert_allclose(timealign.align(data, src, [src[3]], 'nearest')[0], data[3])
+
+def test_extrapolate():
+
+    data, src, tgt = times()
+
+    out = timealign.align(data, src, tgt, 'nearest', lextrapolate=True)
+    np.testing.assert_array_equal(out[0], data[0])
+    np.testing.assert_array_equal(out[-1], data[-1])
+
+def test_dtype():
+
+    data, src, tgt = times()
+
+    assert timealign.align(data.astype(np.float32), src, tgt, 'linear').dtype == np.float32
+    assert timealign.align(data.astype(np.float32), src, tgt[::4], 'mean').dtype == np.float32
+    assert timealign.align(np.ones((len(src),2), dtype=int), src, tgt, 'nearest').dtype == np.float64
+
+def test_errors():
+
+    data, src, tgt = times()
+
+    with pytest.raises(ValueError):
+        timealign.align(data, src, tgt, 'cubic')
+    with pytest.raises(ValueError):
+        timealign.align(data[:-1], src, tgt, 'linear')
+    with pytest.raises(ValueError):
+        timealign.get_map([], tgt, 'nearest')
+
+@pytest.mark.parametrize('mode', ['nearest','linear','mean'])
+def test_apply_at(mode):
+
+    data, src, tgt = times()
+    data[5,3] = np.nan
+    tmap = timealign.get_map(src, tgt, mode)
+
+    # Same values as for all target times, from the source times needed only
+    for lextrapolate in [False, True] if not(mode == 'mean') else [False,]:
+        out = tmap.apply(data, lextrapolate=lextrapolate)
+        for k in range(len(tgt)):
+            isrc = tmap.sources(k)
+            assert isrc.stop - isrc.start <= (2 if mode == 'linear' else len(src))
+            np.testing.assert_allclose(tmap.apply_at(data[isrc], k, lextrapolate=lextrapolate), out[k], rtol=1.e-10, atol=1.e-12)
+
+    assert tmap.apply_at(data[tmap.sources(50)].astype(np.float32), 50).dtype == np.float32
+    with pytest.raises(ValueError):
+        tmap.apply_at(data, 50)
+
+def test_maps_cache():
+
+    _, src, tgt = times()
+
+    tmap = timealign.get_map(src, tgt, 'linear')
+    assert timealign.get_map(src.copy(), tgt.copy(), 'linear') is tmap
+    assert not(timealign.get_map(src, tgt, 'nearest') is tmap)
+
+    for k in range(timealign._maxsize+5):
+        timealign.get_map(src, tgt + k, 'linear')
+    assert len(timealign._maps) <= timealign._maxsize
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the time axes of atlas1d.timeaxis: ticks against those of the
+former get_time_labels of plotMUSC, intervals and time slices
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+import cftime
+
+import atlas1d.timeaxis as timeaxis
+
+from tests.test_readplan import write_levels, open_reader
+
+def get_time_labels_old(tmin, tmax, tunits, dtlabel):
+    """
+    Time ticks as computed by plotMUSC before atlas1d.timeaxis
+    """
+
+    tt = []
+    tlabels = []
+
+    if dtlabel in ['1h','2h','3h','6h']:
+        tmin0 = datetime(tmin.year,tmin.month,tmin.day,tmin.hour)
+        t0 = tmin0 + timedelta(hours=0)
+        while t0 <= tmax:
+            if t0 >= tmin:
+                tt.append(cftime.date2num(t0, tunits))
+                tlabels.append('{0}'.format(t0.hour))
+            t0 = t0 + timedelta(hours=int(dtlabel[:-1]))
+
+    elif dtlabel == '10d':
+        tmin0 = datetime(tmin.year,tmin.month,tmin.day,tmin.hour)
+        t0 = tmin0 + timedelta(hours=0)
+        while t0 <= tmax:
+            if t0 >= tmin:
+                tt.append(cftime.date2num(t0, tunits))
+                tlabels.append('{0}/{1}'.format(t0.month,t0.day))
+            if t0.day == 1:
+                t0 = cftime.datetime(t0.year,t0.month,10,0)
+            elif t0.day == 10:
+                t0 = cftime.datetime(t0.year,t0.month,20,0)
+            elif t0.day == 20:
+                if t0.month == 12:
+                    t0 = cftime.datetime(t0.year+1,1,1,0)
+                else:
+                    t0 = cftime.datetime(t0.year,t0.month+1,1,0)
+            else:
+                t0 = t0 + timedelta(days=10)
+
+    return tt, tlabels
+
+_windows = {'1h':  [(datetime(1997,6,21,11,30), datetime(1997,6,22,2)), (datetime(1997,6,21,11), datetime(1997,6,21,23,59))],
+            '2h':  [(datetime(1997,6,21,11,30), datetime(1997,6,22,2)), (datetime(2004,2,28,22), datetime(2004,3,1,5))],
+            '3h':  [(datetime(1997,6,21,11,30), datetime(1997,6,22,2)), (datetime(1999,12,31,17,45), datetime(2000,1,1,12))],
+            '6h':  [(datetime(1997,6,21,11,30), datetime(1997,6,24,2)), (datetime(2004,2,27,23), datetime(2004,3,2))],
+            '10d': [(datetime(2000,1,3,6), datetime(2000,4,15)), (datetime(1999,11,20), datetime(2000,3,2)), (datetime(2001,1,1), datetime(2001,2,28))]}
+
+@pytest.mark.parametrize('calendar', [None,'standard','gregorian','proleptic_gregorian'])
+@pytest.mark.parametrize('dtlabel', list(_windows.keys()))
+def test_baseline(dtlabel, calendar):
+
+    for tmin, tmax in _windows[dtlabel]:
+        tunits = timeaxis.time_units(tmin)
+        tt_old, labels_old = get_time_labels_old(tmin, tmax, tunits, dtlabel)
+        assert len(tt_old) > 1
+
+        # Bounds as python datetimes (atlas config) or as cftime datetimes (time axis of a dataset)
+        if calendar is not None:
+            tmin = cftime.datetime(*tmin.timetuple()[:6], calendar=calendar)
+            tmax = cftime.datetime(*tmax.timetuple()[:6], calendar=calendar)
+        tt, labels = timeaxis.get_ticks(tmin, tmax, tunits, dtlabel)
+
+        np.testing.assert_allclose(tt, tt_old, rtol=0., atol=1.e-9)
+        assert list(labels) == labels_old
+
+def check_ticks(tmin, tmax, dtlabel, tt, labels):
+
+    ticks = timeaxis.get_ticks(tmin, tmax, timeaxis.time_units(tmin), dtlabel)
+    np.testing.assert_allclose(ticks[0], tt, rtol=0., atol=1.e-9)
+    assert ticks[1] == tuple(labels)
+
+def test_intervals():
+
+    check_ticks(datetime(1997,6,21,11,40), datetime(1997,6,21,13,10), '30min', [1./3., 5./6., 4./3.], ['12:00','12:30','13:00'])
+    check_ticks(datetime(1997,6,21,11,30), datetime(1997,6,23), '12h', [11.5, 23.5, 35.5], ['23','11','23'])
+    check_ticks(datetime(1997,6,21,11,30), datetime(1997,6,24), '1d', [12.5, 36.5, 60.5], ['6/22','6/23','6/24'])
+    check_ticks(datetime(2000,1,15), datetime(2000,4,1), '1mon', [408., 1104., 1848.], ['2/2000','3/2000','4/2000'])
+    check_ticks(datetime(2000,1,1), datetime(2000,12,31), '3mon', [0., 2184., 4368., 6576.], ['1/2000','4/2000','7/2000','10/2000'])
+
+def test_360_day():
+
+    def date(*args):
+        return cftime.datetime(*args, calendar='360_day')
+
+    check_ticks(date(2000,2,29), date(2000,3,2), '1d', [0., 24., 48., 72.], ['2/29','2/30','3/1','3/2'])
+    check_ticks(date(2000,1,15), date(2000,4,1), '1mon', [384., 1104., 1824.], ['2/2000','3/2000','4/2000'])
+    check_ticks(date(2000,1,25,6), date(2000,3,1), '10d', [0., 240., 480., 720.], ['1/25','2/5','2/15','2/25'])
+    check_ticks(date(2000,2,30,22), date(2000,3,1,2), '2h', [0., 2., 4.], ['22','0','2'])
+
+def test_parse_interval():
+
+    assert timeaxis.parse_interval('30min') == (30,'min')
+    assert timeaxis.parse_interval('h') == (1,'h')
+    assert timeaxis.parse_interval(' 12 h') == (12,'h')
+    assert timeaxis.parse_interval('3mon') == (3,'mon')
+
+    for dtlabel in ['0h','5y','','h3']:
+        with pytest.raises(NotImplementedError):
+            timeaxis.parse_interval(dtlabel)
+    with pytest.raises(NotImplementedError):
+        timeaxis.get_ticks(datetime(2000,1,1), datetime(2000,1,2), 'hours since 2000-01-01 00:00:0.0', '1y')
+
+def test_ticks_cache():
+
+    tmin = datetime(1997,6,21,11,30)
+    tmax = datetime(1997,6,22,2)
+    tunits = timeaxis.time_units(tmin)
+
+    ticks = timeaxis.get_ticks(tmin, tmax, tunits, '1h')
+    assert timeaxis.get_ticks(tmin, tmax, tunits, '1h') is ticks
+    assert not(ticks[0].flags.writeable)
+
+    for k in range(timeaxis._maxsize+5):
+        timeaxis.get_ticks(tmin, tmax + timedelta(hours=k), tunits, '1h')
+    assert len(timeaxis._ticks) <= timeaxis._maxsize
+
+    # Same dates in other calendars
+    tunits = timeaxis.time_units(datetime(2000,1,15))
+    ticks = timeaxis.get_ticks(datetime(2000,1,15), datetime(2000,4,1), tunits, '1mon')
+    ticks_360 = timeaxis.get_ticks(cftime.datetime(2000,1,15,calendar='360_day'), cftime.datetime(2000,4,1,calendar='360_day'), tunits, '1mon')
+    assert ticks[0][0] == 408. and ticks_360[0][0] == 384.
+
+def t(hours):
+
+    return datetime(2000,1,1) + timedelta(hours=hours)
+
+def test_time_slice(tmp_path):
+
+    rd = open_reader(write_levels(str(tmp_path / 'file.nc')))
+
+    # One time step of margin, unless a bound is a time of the dataset
+    assert timeaxis.time_slice(rd, t(2), t(4)) == slice(2,5)
+    assert timeaxis.time_slice(rd, t(2.5), t(3.5)) == slice(2,5)
+    assert timeaxis.time_slice(rd, t(2.5), None) == slice(2,11)
+    assert timeaxis.time_slice(rd, None, t(0.5)) == slice(0,2)
+    assert timeaxis.time_slice(rd, t(-3), t(30)) == slice(0,11)
+
+    # All times for windows (almost) empty or outside the dataset
+    assert timeaxis.time_slice(rd) == slice(None)
+    assert timeaxis.time_slice(rd, t(20), t(30)) == slice(None)
+    assert timeaxis.time_slice(rd, t(3), t(2)) == slice(None)
+
+    rd = open_reader(write_levels(str(tmp_path / 'single.nc'), nt=1))
+    assert timeaxis.time_slice(rd, t(0), t(1)) == slice(None)
+
+def test_time_window(tmp_path):
+
+    rd = open_reader(write_levels(str(tmp_path / 'file.nc')))
+
+    # Bounds included, without margin
+    assert timeaxis.time_window(rd, t(2), t(4)) == slice(2,5)
+    assert timeaxis.time_window(rd, t(2.5), t(3.5)) == slice(3,4)
+
+    # Latest time in case of a tie
+    assert timeaxis.time_nearest(rd, t(2.4)) == 2
+    assert timeaxis.time_nearest(rd, t(2.5)) == 3
+    assert timeaxis.time_nearest(rd, t(50)) == 10
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) Météo France (2014-)
+# This software is governed by the CeCILL-C license under French law.
+# http://www.cecill.info
+
+"""
+Tests of the vertical coordinates of atlas1d.vertical, on small synthetic
+MUSC files
+"""
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import atlas1d.readers as readers
+import atlas1d.readplan as readplan
+import atlas1d.vertical as vertical
+
+from atlas1d.Dataset import Dataset
+
+from tests.test_readplan import write_levels, open_reader
+
+def test_heights(tmp_path):
+
+    vc = vertical.get_vertical(open_reader(write_levels(str(tmp_path / 'up.nc'))))
+
+    # Heights above the ground (lowest half level), in m or km
+    assert vc.zorog == 50.
+    np.testing.assert_allclose(vc.height('zhalf')[0], 100.*np.arange(11))
+    np.testing.assert_allclose(vc.height('zfull')[0], 50. + 100.*np.arange(10))
+    np.testing.assert_allclose(vc.level('zfull',units='km')[0], 0.05 + 0.1*np.arange(10))
+    np.testing.assert_allclose(vc.pressure('phalf',units='hPa')[0], 1000. - 50.*np.arange(11))
+    assert not(vc.level('zfull',units='km').flags.writeable)
+    assert vc.level('zfull',units='km') is vc.level('zfull',units='km')
+
+    with pytest.raises(NotImplementedError):
+        vc.level('zfull',units='hPa')
+
+def test_zorog_attribute(tmp_path):
+
+    filein = write_levels(str(tmp_path / 'up.nc'))
+
+    # Levels above the ground only: the ground height is taken from their attribute
+    with xr.open_dataset(filein, use_cftime=True) as ds:
+        ds = ds.isel(levf=slice(3,None), levh=slice(3,None)).load()
+    ds['zhalf'].attrs[vertical.zorog_attribute] = 50.
+    vc = vertical.get_vertical(readers.as_reader(ds))
+    np.testing.assert_allclose(vc.height('zhalf')[0], 100.*np.arange(3,11))
+
+    # Same for the datasets loaded by the read planner
+    dat = Dataset(name='SCM', case='ARMCU', subcase='REF', ncfile=filein, line='k')
+    plan = {'SCM': ([], ['theta','zfull','zhalf'], [(None, None)], [('zfull','km',0.,0.3)])}
+    store = readplan.load([dat,], plan)
+    assert store['SCM'].sizes['levf'] < 10
+    assert store['SCM']['zhalf'].attrs[vertical.zorog_attribute] == 50.
+    vc = vertical.get_vertical(readers.as_reader(store['SCM']))
+    np.testing.assert_allclose(vc.height('zhalf')[0], 100.*np.arange(store['SCM'].sizes['levh']))
+
+def test_name(tmp_path):
+
+    vc = vertical.get_vertical(open_reader(write_levels(str(tmp_path / 'up.nc'))))
+
+    assert vc.name('zfull') == 'zfull' and vc.name('phalf') == 'phalf'
+    # Levels at the other side of layers for data on nlev levels
+    assert vc.name('zfull',nlev=11) == 'zhalf'
+    assert vc.name('zhalf',nlev=10) == 'zfull'
+    assert vc.name('pfull',nlev=10) == 'pfull'
+    assert vc.name('zhalf',nlev=12) == 'zfull'
+
+    with pytest.raises(NotImplementedError):
+        vc.name('height')
+
+def test_name_fallback(tmp_path):
+
+    # Only full levels: used for half levels
+    ds = xr.open_dataset(write_levels(str(tmp_path / 'up.nc')), use_cftime=True)
+    vc = vertical.get_vertical(readers.as_reader(ds[['zfull','theta']]))
+
+    assert vc.name('zhalf') == 'zfull'
+    assert vc.name('zhalf',nlev=11) == 'zfull'
+    assert vc.zorog == 100.
+    with pytest.raises(KeyError):
+        vc.name('pfull')
+
+    # Only half levels: not used for full levels
+    vc = vertical.get_vertical(open_reader(write_levels(str(tmp_path / 'half.nc'), lfull=False)))
+    assert vc.name('zhalf',nlev=10) == 'zhalf'
+    with pytest.raises(KeyError):
+        vc.name('zfull',nlev=11)
+
+def test_ordering(tmp_path):
+
+    vc = vertical.get_vertical(open_reader(write_levels(str(tmp_path / 'up.nc'))))
+    assert vc.lupward('zfull') and vc.lupward('pfull') and vc.lupward('zhalf',nlev=10)
+    assert vc.ltime_invariant('zfull')
+
+    vc = vertical.get_vertical(open_reader(write_levels(str(tmp_path / 'down.nc'), lupward=False)))
+    assert not(vc.lupward('zfull')) and not(vc.lupward('phalf'))
+    # Heights stay above the lowest level
+    assert vc.zorog == 50.
+    np.testing.assert_allclose(vc.height('zhalf')[0], 100.*np.arange(11)[::-1])
+
+def test_level_slice():
+
+    zfull = 0.05 + 0.1*np.arange(10)
+    zhalf = 0.1*np.arange(11)
+
+    # Data on levels
+    assert vertical.level_slice(zfull, 10, 0.2, 0.45) == (slice(1,6), slice(1,6))
+    assert vertical.level_slice(zfull[::-1], 10, 0.2, 0.45) == (slice(4,9), slice(4,9))
+    assert vertical.level_slice(zfull, 10, None, 0.3) == (slice(0,4), slice(0,4))
+    assert vertical.level_slice(zfull, 10, 0.7, None) == (slice(6,10), slice(6,10))
+
+    # Cells bounded by half levels: one level more than data
+    assert vertical.level_slice(zhalf, 10, 0.2, 0.45) == (slice(1,5), slice(1,6))
+    assert vertical.level_slice(zhalf, 10, 0.2, 0.2) == (slice(1,3), slice(1,4))
+    assert vertical.level_slice(zhalf, 10, 0.75, None) == (slice(7,10), slice(7,11))
+    assert vertical.level_slice(zhalf, 10, 1., None) == (slice(9,10), slice(9,11))
+
+    # Pressure axes (ymin > ymax)
+    p = 1000. - 50.*np.arange(11)
+    assert vertical.level_slice(p, 10, 900., 800.) == vertical.level_slice(p, 10, 800., 900.) == (slice(1,5), slice(1,6))
+
+    # Levels varying in time: union over times
+    level = np.array([zfull, zfull + 0.2])
+    assert vertical.level_slice(level, 10, 0.2, 0.45) == (slice(0,6), slice(0,6))
+
+def test_level_slice_all():
+
+    zfull = 0.05 + 0.1*np.arange(10)
+
+    assert vertical.level_slice(zfull, 10) == (slice(None), slice(None))
+    # Levels not at data levels nor bounding them
+    assert vertical.level_slice(zfull, 8, 0.2, 0.45) == (slice(None), slice(None))
+    # No level within the range
+    assert vertical.level_slice(zfull, 10, 0.21, 0.24) == (slice(None), slice(None))
+    assert vertical.level_slice(zfull, 10, 2., 3.) == (slice(None), slice(None))